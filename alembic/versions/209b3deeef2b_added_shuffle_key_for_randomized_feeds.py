@@ -0,0 +1,35 @@
+"""added shuffle key for randomized feeds
+
+Revision ID: 209b3deeef2b
+Revises: 3d050f5f7e0b
+Create Date: 2026-10-17 11:40:27.502114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '209b3deeef2b'
+down_revision: Union[str, None] = '3d050f5f7e0b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('prompts', sa.Column('shuffle_key', sa.Integer(), nullable=True))
+
+    # Give existing prompts a random position on the shuffle ring
+    op.execute("UPDATE prompts SET shuffle_key = floor(random() * 2147483647)::integer")
+    op.alter_column('prompts', 'shuffle_key', nullable=False)
+
+    op.create_index('ix_prompts_prompt_type_shuffle_key', 'prompts', ['prompt_type', 'shuffle_key', 'id'], unique=False)
+    op.create_index('ix_prompts_account_address_shuffle_key', 'prompts', ['account_address', 'shuffle_key', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_prompts_account_address_shuffle_key', table_name='prompts')
+    op.drop_index('ix_prompts_prompt_type_shuffle_key', table_name='prompts')
+    op.drop_column('prompts', 'shuffle_key')
@@ -0,0 +1,31 @@
+"""made prompt created_at not null
+
+Revision ID: 58616f8b3e79
+Revises: f4a2c7e1d9b3
+Create Date: 2026-10-17 23:12:40.184502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '58616f8b3e79'
+down_revision: Union[str, None] = 'f4a2c7e1d9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset cursors compare (created_at, id); a NULL matches nothing, so undated prompts sort as the oldest
+    op.execute(
+        "UPDATE prompts SET created_at = COALESCE((SELECT min(created_at) FROM prompts), now()) "
+        "WHERE created_at IS NULL"
+    )
+    op.alter_column('prompts', 'created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    op.alter_column('prompts', 'created_at', existing_type=sa.DateTime(), nullable=True)
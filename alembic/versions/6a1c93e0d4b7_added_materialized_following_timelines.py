@@ -0,0 +1,59 @@
+"""added materialized following timelines
+
+Revision ID: 6a1c93e0d4b7
+Revises: 209b3deeef2b
+Create Date: 2026-10-17 13:05:42.918306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a1c93e0d4b7'
+down_revision: Union[str, None] = '209b3deeef2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('timeline_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_account', sa.String(), nullable=False),
+    sa.Column('creator_account', sa.String(), nullable=False),
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_account', 'prompt_id', name='uq_timeline_entries_user_account_prompt_id')
+    )
+    op.create_index(op.f('ix_timeline_entries_id'), 'timeline_entries', ['id'], unique=False)
+    op.create_index('ix_timeline_entries_user_account_created_at', 'timeline_entries', ['user_account', 'created_at', 'prompt_id'], unique=False)
+    op.create_index('ix_timeline_entries_user_account_creator_account', 'timeline_entries', ['user_account', 'creator_account'], unique=False)
+
+    # Build the existing timelines from current follows, keeping the newest 1000 entries per follower
+    op.execute("""
+        INSERT INTO timeline_entries (user_account, creator_account, prompt_id, created_at)
+        SELECT user_account, creator_account, prompt_id, created_at FROM (
+            SELECT
+                follows.follower_account AS user_account,
+                prompts.account_address AS creator_account,
+                prompts.id AS prompt_id,
+                COALESCE(prompts.created_at, now()) AS created_at,
+                row_number() OVER (
+                    PARTITION BY follows.follower_account ORDER BY prompts.created_at DESC, prompts.id DESC
+                ) AS position
+            FROM (SELECT DISTINCT follower_account, creator_account FROM follows) AS follows
+            JOIN prompts ON prompts.account_address = follows.creator_account
+        ) AS entries
+        WHERE position <= 1000
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_timeline_entries_user_account_creator_account', table_name='timeline_entries')
+    op.drop_index('ix_timeline_entries_user_account_created_at', table_name='timeline_entries')
+    op.drop_index(op.f('ix_timeline_entries_id'), table_name='timeline_entries')
+    op.drop_table('timeline_entries')
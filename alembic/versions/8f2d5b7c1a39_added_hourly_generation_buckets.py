@@ -0,0 +1,37 @@
+"""added hourly generation buckets
+
+Revision ID: 8f2d5b7c1a39
+Revises: 6a1c93e0d4b7
+Create Date: 2026-10-17 14:21:08.337150
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d5b7c1a39'
+down_revision: Union[str, None] = '6a1c93e0d4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('generation_buckets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_account', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('generations', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_account', 'bucket_start', name='uq_generation_buckets_user_account_bucket_start')
+    )
+    op.create_index(op.f('ix_generation_buckets_id'), 'generation_buckets', ['id'], unique=False)
+    op.create_index(op.f('ix_generation_buckets_bucket_start'), 'generation_buckets', ['bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generation_buckets_bucket_start'), table_name='generation_buckets')
+    op.drop_index(op.f('ix_generation_buckets_id'), table_name='generation_buckets')
+    op.drop_table('generation_buckets')
@@ -0,0 +1,52 @@
+"""added unique constraints on likes and follows
+
+Revision ID: b7e4c1d9a2f6
+Revises: 8f2d5b7c1a39
+Create Date: 2026-10-17 16:02:44.918273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4c1d9a2f6'
+down_revision: Union[str, None] = '8f2d5b7c1a39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Remove duplicate likes and follows left by concurrent requests, keeping the oldest row of each
+    op.execute(
+        """
+        DELETE FROM post_likes WHERE id NOT IN (
+            SELECT min(id) FROM post_likes GROUP BY prompt_id, user_account
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM follows WHERE id NOT IN (
+            SELECT min(id) FROM follows GROUP BY follower_account, creator_account
+        )
+        """
+    )
+
+    # The duplicates were counted in the denormalized counter
+    op.execute(
+        """
+        UPDATE prompts SET
+            likes_count = (SELECT count(*) FROM post_likes WHERE post_likes.prompt_id = prompts.id)
+        """
+    )
+
+    op.create_unique_constraint('uq_post_likes_prompt_id_user_account', 'post_likes', ['prompt_id', 'user_account'])
+    op.create_unique_constraint('uq_follows_follower_account_creator_account', 'follows', ['follower_account', 'creator_account'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_follows_follower_account_creator_account', 'follows', type_='unique')
+    op.drop_constraint('uq_post_likes_prompt_id_user_account', 'post_likes', type_='unique')
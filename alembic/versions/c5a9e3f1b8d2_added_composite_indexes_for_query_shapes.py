@@ -0,0 +1,78 @@
+"""added composite indexes for query shapes
+
+Revision ID: c5a9e3f1b8d2
+Revises: b7e4c1d9a2f6
+Create Date: 2026-10-17 16:48:12.604519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a9e3f1b8d2'
+down_revision: Union[str, None] = 'b7e4c1d9a2f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Indexes matching the filters and sort keys the routes actually use. Btree indexes
+# are scanned backwards for the newest/most-liked-first listings, so they stay ascending.
+# post_likes lookups by prompt_id are served by uq_post_likes_prompt_id_user_account.
+NEW_INDEXES = [
+    # get-public-prompts, get-premium-prompts and the `recent` filter
+    ('ix_prompts_prompt_type_created_at', 'prompts', ['prompt_type', 'created_at', 'id']),
+    # filter-public-prompts
+    ('ix_prompts_prompt_type_prompt_tag_public_created_at', 'prompts', ['prompt_type', 'prompt_tag', 'public', 'created_at', 'id']),
+    # the `trending` filter
+    ('ix_prompts_prompt_type_likes_count', 'prompts', ['prompt_type', 'likes_count', 'id']),
+    # creator feeds and timeline backfill
+    ('ix_prompts_account_address_created_at', 'prompts', ['account_address', 'created_at', 'id']),
+    # latest comments for a prompt
+    ('ix_post_comments_prompt_id_created_at', 'post_comments', ['prompt_id', 'created_at']),
+]
+
+# Single-column indexes no query filters or sorts by, or that a composite above (or a
+# unique constraint) already covers. Each one slowed down every insert and update.
+UNUSED_INDEXES = [
+    ('ix_prompts_public', 'prompts', ['public']),
+    ('ix_prompts_grant_access', 'prompts', ['grant_access']),
+    ('ix_prompts_prompt_type', 'prompts', ['prompt_type']),
+    ('ix_prompts_prompt_tag', 'prompts', ['prompt_tag']),
+    ('ix_prompts_account_address', 'prompts', ['account_address']),
+    ('ix_prompts_post_name', 'prompts', ['post_name']),
+    ('ix_prompts_max_supply', 'prompts', ['max_supply']),
+    ('ix_prompts_prompt_nft_price', 'prompts', ['prompt_nft_price']),
+    ('ix_prompts_collection_name', 'prompts', ['collection_name']),
+    ('ix_prompts_cid', 'prompts', ['cid']),
+    ('ix_prompts_chain', 'prompts', ['chain']),
+    ('ix_prompts_ai_model', 'prompts', ['ai_model']),
+    ('ix_prompts_video_url', 'prompts', ['video_url']),
+    ('ix_follows_follower_account', 'follows', ['follower_account']),
+    # Leaderboards are ranked in sorted sets, not by SQL ORDER BY
+    ('ix_user_stats_xp', 'user_stats', ['xp']),
+    ('ix_user_stats_streak_days', 'user_stats', ['streak_days']),
+    ('ix_user_stats_total_generations', 'user_stats', ['total_generations']),
+    ('ix_user_stats_last_generation', 'user_stats', ['last_generation']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY builds and drops do not lock writes, but cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in NEW_INDEXES:
+            # A failed concurrent build leaves an invalid index behind; rebuild it on a rerun
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        for name, table, columns in UNUSED_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in UNUSED_INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True, postgresql_concurrently=True)
+        for name, table, columns in NEW_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
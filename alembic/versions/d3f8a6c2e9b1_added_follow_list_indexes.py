@@ -0,0 +1,50 @@
+"""added indexes for paginated follow lists
+
+Revision ID: d3f8a6c2e9b1
+Revises: c5a9e3f1b8d2
+Create Date: 2026-10-17 17:31:05.227164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f8a6c2e9b1'
+down_revision: Union[str, None] = 'c5a9e3f1b8d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+NEW_INDEXES = [
+    # creator-followers, newest follow first
+    ('ix_follows_creator_account_id', 'follows', ['creator_account', 'id']),
+    # user-following, newest follow first
+    ('ix_follows_follower_account_id', 'follows', ['follower_account', 'id']),
+    # top prompts per creator on follow lists
+    ('ix_prompts_account_address_likes_count', 'prompts', ['account_address', 'likes_count', 'id']),
+]
+
+# Covered by ix_follows_creator_account_id
+UNUSED_INDEXES = [
+    ('ix_follows_creator_account', 'follows', ['creator_account']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in NEW_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        for name, table, columns in UNUSED_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in UNUSED_INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True, postgresql_concurrently=True)
+        for name, table, columns in NEW_INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
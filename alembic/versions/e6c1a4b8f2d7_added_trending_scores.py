@@ -0,0 +1,79 @@
+"""added trending scores and prompt activity buckets
+
+Revision ID: e6c1a4b8f2d7
+Revises: d3f8a6c2e9b1
+Create Date: 2026-10-17 18:12:47.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c1a4b8f2d7'
+down_revision: Union[str, None] = 'd3f8a6c2e9b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('prompts', sa.Column('trending_score', sa.Float(), server_default='0', nullable=False))
+    op.create_table('prompt_activity_buckets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('prompt_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('likes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('comments', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('scored_likes', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('scored_comments', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['prompt_id'], ['prompts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('prompt_id', 'bucket_start', name='uq_prompt_activity_buckets_prompt_id_bucket_start')
+    )
+    op.create_index(op.f('ix_prompt_activity_buckets_id'), 'prompt_activity_buckets', ['id'], unique=False)
+    op.create_index(op.f('ix_prompt_activity_buckets_bucket_start'), 'prompt_activity_buckets', ['bucket_start'], unique=False)
+    op.create_index(
+        'ix_prompt_activity_buckets_unscored', 'prompt_activity_buckets', ['id'], unique=False,
+        postgresql_where=sa.text('likes <> scored_likes OR comments <> scored_comments'),
+    )
+
+    # Bucket the last week of likes and comments; the first refresh scores them
+    op.execute(
+        """
+        INSERT INTO prompt_activity_buckets (prompt_id, bucket_start, likes, comments)
+        SELECT prompt_id, bucket_start, sum(likes), sum(comments)
+        FROM (
+            SELECT prompt_id, date_trunc('hour', created_at) AS bucket_start, 1 AS likes, 0 AS comments
+            FROM post_likes WHERE created_at >= (now() AT TIME ZONE 'utc') - interval '7 days'
+            UNION ALL
+            SELECT prompt_id, date_trunc('hour', created_at), 0, 1
+            FROM post_comments WHERE created_at >= (now() AT TIME ZONE 'utc') - interval '7 days'
+        ) AS activity
+        GROUP BY prompt_id, bucket_start
+        """
+    )
+
+    # Trending pages read this index instead of ordering by likes_count
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_prompts_prompt_type_trending_score', table_name='prompts', if_exists=True, postgresql_concurrently=True)
+        op.create_index(
+            'ix_prompts_prompt_type_trending_score', 'prompts', ['prompt_type', 'trending_score', 'id'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.drop_index('ix_prompts_prompt_type_likes_count', table_name='prompts', if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_prompts_prompt_type_likes_count', 'prompts', ['prompt_type', 'likes_count', 'id'],
+            unique=False, if_not_exists=True, postgresql_concurrently=True,
+        )
+        op.drop_index('ix_prompts_prompt_type_trending_score', table_name='prompts', if_exists=True, postgresql_concurrently=True)
+    op.drop_index('ix_prompt_activity_buckets_unscored', table_name='prompt_activity_buckets')
+    op.drop_index(op.f('ix_prompt_activity_buckets_bucket_start'), table_name='prompt_activity_buckets')
+    op.drop_index(op.f('ix_prompt_activity_buckets_id'), table_name='prompt_activity_buckets')
+    op.drop_table('prompt_activity_buckets')
+    op.drop_column('prompts', 'trending_score')
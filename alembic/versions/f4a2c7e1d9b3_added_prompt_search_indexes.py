@@ -0,0 +1,55 @@
+"""added prompt search indexes
+
+Revision ID: f4a2c7e1d9b3
+Revises: e6c1a4b8f2d7
+Create Date: 2026-10-17 21:04:19.318552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a2c7e1d9b3'
+down_revision: Union[str, None] = 'e6c1a4b8f2d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Must stay identical to app.prompts.models.SEARCH_DOCUMENT, or searches cannot use the index
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english'::regconfig, coalesce(post_name, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(collection_name, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(prompt, '')), 'C')"
+)
+
+TRIGRAM_INDEXES = [
+    ('ix_prompts_post_name_trgm', 'post_name'),
+    ('ix_prompts_collection_name_trgm', 'collection_name'),
+]
+
+
+def upgrade() -> None:
+    # Trigram similarity and the `%` operator
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_prompts_search_document', table_name='prompts', if_exists=True, postgresql_concurrently=True)
+        op.create_index(
+            'ix_prompts_search_document', 'prompts', [sa.text(f"({SEARCH_DOCUMENT})")], unique=False,
+            postgresql_using='gin', postgresql_concurrently=True,
+        )
+        for name, column in TRIGRAM_INDEXES:
+            op.drop_index(name, table_name='prompts', if_exists=True, postgresql_concurrently=True)
+            op.create_index(
+                name, 'prompts', [column], unique=False,
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}, postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, column in TRIGRAM_INDEXES:
+            op.drop_index(name, table_name='prompts', if_exists=True, postgresql_concurrently=True)
+        op.drop_index('ix_prompts_search_document', table_name='prompts', if_exists=True, postgresql_concurrently=True)
@@ -1,10 +1,45 @@
+import time
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+from fastapi.concurrency import run_in_threadpool
 import requests
 
-from app.core.constants import BASE_URL, API_KEY, REDIS_URL
+from app.core.constants import (
+    API_KEY, BASE_URL, BROKER_CONNECT_TIMEOUT_SECONDS, BROKER_RETRY_AFTER_SECONDS, REDIS_URL,
+)
+from app.core.database import get_session_with_ctx_manager
+from app.core.metrics import celery_inline_runs, record_task_duration
+from app.prompts.services import (
+    rebuild_trending_scores, reconcile_prompt_counters, refresh_trending_scores, reshuffle_prompts,
+)
+from app.socialfeed.services import backfill_timeline, fan_out_prompt, trim_timelines
+from app.leaderboard.services import compact_generation_buckets
+from app.prompts.autocomplete import publish_snapshot
 
 # Create a Celery app
 celery_app = Celery('tasks', broker=REDIS_URL)  
+# Publishing fails fast instead of retrying the connection (about 6s), so routes can run the task inline.
+# Workers and beat pass their own retry settings when connecting, so they still wait for the broker.
+celery_app.conf.broker_transport_options = {
+    'max_retries': 0,
+    'socket_connect_timeout': BROKER_CONNECT_TIMEOUT_SECONDS,
+}
+
+# Time every task run for /metrics
+_task_started = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_timer(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        record_task_duration(task.name, state or "UNKNOWN", time.perf_counter() - started)
+
 
 # Defining the task that will call the endpoint
 @celery_app.task
@@ -20,11 +55,156 @@ def finalize_challenges():
     except requests.exceptions.RequestException as e:
         print(f"Error finalizing challenges: {e}")
 
+
+# Repair any drift in the denormalized like/comment counters on prompts
+@celery_app.task(name='tasks.reconcile_prompt_counters')
+def reconcile_prompt_counters_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            repaired = reconcile_prompt_counters(db)
+        print(f"Reconciled like/comment counters for {repaired} prompts")
+    except Exception as e:
+        print(f"Error reconciling prompt counters: {e}")
+
+# Rotate the pre-shuffled order used by the randomized feeds
+@celery_app.task(name='tasks.reshuffle_prompts')
+def reshuffle_prompts_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            reshuffled = reshuffle_prompts(db)
+        print(f"Reshuffled {reshuffled} prompts")
+    except Exception as e:
+        print(f"Error reshuffling prompts: {e}")
+
+# Fold new likes and comments into the prompts' trending scores
+@celery_app.task(name='tasks.refresh_trending_scores')
+def refresh_trending_scores_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            updated = refresh_trending_scores(db)
+        print(f"Refreshed trending scores of {updated} prompts")
+    except Exception as e:
+        print(f"Error refreshing trending scores: {e}")
+
+# Recompute every trending score, e.g. after changing TRENDING_HALF_LIFE_HOURS (run manually)
+@celery_app.task(name='tasks.rebuild_trending_scores')
+def rebuild_trending_scores_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            scored = rebuild_trending_scores(db)
+        print(f"Rebuilt trending scores of {scored} prompts")
+    except Exception as e:
+        print(f"Error rebuilding trending scores: {e}")
+
+# Recompute autocomplete popularity and share it with the API workers through Redis
+@celery_app.task(name='tasks.publish_autocomplete_snapshot')
+def publish_autocomplete_snapshot_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            published = publish_snapshot(db)
+        print(f"Published {published} autocomplete values")
+    except Exception as e:
+        print(f"Error publishing the autocomplete snapshot: {e}")
+
+# Push a new prompt into its creator's followers' timelines
+@celery_app.task(name='tasks.fan_out_prompt')
+def fan_out_prompt_task(prompt_id: int):
+    try:
+        with get_session_with_ctx_manager() as db:
+            written = fan_out_prompt(prompt_id, db)
+        print(f"Fanned out prompt {prompt_id} to {written} timelines")
+    except Exception as e:
+        print(f"Error fanning out prompt {prompt_id}: {e}")
+
+# Fill a follower's timeline with a newly followed creator's recent prompts
+@celery_app.task(name='tasks.backfill_timeline')
+def backfill_timeline_task(follower_account: str, creator_account: str):
+    try:
+        with get_session_with_ctx_manager() as db:
+            added = backfill_timeline(follower_account, creator_account, db)
+        print(f"Backfilled {added} timeline entries for {follower_account}")
+    except Exception as e:
+        print(f"Error backfilling timeline for {follower_account}: {e}")
+
+# Cap every timeline at TIMELINE_MAX_ENTRIES entries
+@celery_app.task(name='tasks.trim_timelines')
+def trim_timelines_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            removed = trim_timelines(db)
+        print(f"Trimmed {removed} timeline entries")
+    except Exception as e:
+        print(f"Error trimming timelines: {e}")
+
+# Drop hourly generation buckets that are past the 24h leaderboard window
+@celery_app.task(name='tasks.compact_generation_buckets')
+def compact_generation_buckets_task():
+    try:
+        with get_session_with_ctx_manager() as db:
+            removed = compact_generation_buckets(db)
+        print(f"Compacted {removed} generation buckets")
+    except Exception as e:
+        print(f"Error compacting generation buckets: {e}")
+
+
+# Until this time.monotonic() value, routes skip the broker that was just unreachable
+_broker_down_until = 0.0
+
+
+async def enqueue(task, *args):
+    """
+    Queue a task from a route without blocking the event loop. If the broker is
+    unreachable, the task runs in a worker thread instead so the work is not lost,
+    and for BROKER_RETRY_AFTER_SECONDS later tasks run inline without trying it.
+    Inline runs are counted in `celery_inline_runs_total`.
+    """
+    global _broker_down_until
+    if time.monotonic() < _broker_down_until:
+        reason = "broker_down"
+    else:
+        try:
+            await run_in_threadpool(task.apply_async, args, retry=False)
+            return
+        except Exception as e:
+            # Reported once per window; the counter shows how many tasks ran inline
+            print(f"Broker unreachable, running tasks inline for {BROKER_RETRY_AFTER_SECONDS}s: {e}")
+            _broker_down_until = time.monotonic() + BROKER_RETRY_AFTER_SECONDS
+            reason = "publish_failed"
+
+    celery_inline_runs.inc(task=task.name, reason=reason)
+    started = time.perf_counter()
+    await run_in_threadpool(task, *args)
+    record_task_duration(task.name, "INLINE", time.perf_counter() - started)
+
 # Schedule the task to run every 30 minutes
 celery_app.conf.beat_schedule = {
     'finalize-challenges-every-30-minutes': {
         'task': 'tasks.finalize_challenges',
         'schedule': 30 * 60,  # 30 minutes in seconds
     },
+    'reconcile-prompt-counters-every-hour': {
+        'task': 'tasks.reconcile_prompt_counters',
+        'schedule': 60 * 60,  # 1 hour in seconds
+    },
+    'reshuffle-prompts-every-day': {
+        'task': 'tasks.reshuffle_prompts',
+        'schedule': 24 * 60 * 60,  # 1 day in seconds
+    },
+    'compact-generation-buckets-every-hour': {
+        'task': 'tasks.compact_generation_buckets',
+        'schedule': 60 * 60,  # 1 hour in seconds
+    },
+    'refresh-trending-scores-every-5-minutes': {
+        'task': 'tasks.refresh_trending_scores',
+        'schedule': 5 * 60,  # 5 minutes in seconds
+    },
+    'publish-autocomplete-snapshot-every-10-minutes': {
+        'task': 'tasks.publish_autocomplete_snapshot',
+        'schedule': 10 * 60,  # 10 minutes in seconds
+    },
+    'trim-timelines-every-day': {
+        'task': 'tasks.trim_timelines',
+        'schedule': 24 * 60 * 60,  # 1 day in seconds
+    },
 }
 
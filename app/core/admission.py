@@ -0,0 +1,85 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app.core.constants import DB_ADMISSION_RETRY_AFTER_SECONDS
+from app.core.metrics import admission_rejected, admission_wait, register_limiter
+
+
+class AdmissionLimiter:
+    """
+    Per-worker bound on the requests using one database engine.
+
+    Up to `limit` requests hold a slot at once. Up to `max_queue` more wait, first
+    come first served, at most `timeout` seconds for one. Everything beyond that is
+    shed with 503 and Retry-After instead of piling up on the connection pool.
+    """
+
+    def __init__(self, label: str, limit: int, max_queue: int, timeout: float):
+        self.label = label
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        register_limiter(label, self)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait((waiter,), timeout=self.timeout)
+        except BaseException:
+            # Cancelled while queued: pass on a slot handed over in the meantime
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            admission_wait.observe(time.perf_counter() - started, engine=self.label)
+
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            self._shed("timeout")
+
+    def release(self):
+        # A freed slot goes straight to the longest waiter, so in_flight stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _shed(self, reason: str):
+        admission_rejected.inc(engine=self.label, reason=reason)
+        detail = {
+            "info": "Too many requests waiting for the database, retry later",
+            "error": reason,
+        }
+        raise HTTPException(
+            status_code=503, detail=detail, headers={"Retry-After": str(DB_ADMISSION_RETRY_AFTER_SECONDS)}
+        )
@@ -0,0 +1,387 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from typing import Callable, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.constants import (
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_STALE_SECONDS, RESPONSE_CACHE_TTL,
+    SINGLE_FLIGHT_LOCK_SECONDS, SINGLE_FLIGHT_REDIS_LOCK,
+)
+from app.core.database import AsyncSessionLocal, primary_admission
+from app.core.metrics import record_cache
+from app.core.redis_client import get_redis, get_sync_redis
+
+# Other workers drop their in-process entries for the tags published here
+INVALIDATION_CHANNEL = "cache:invalidate"
+# How often a worker waiting on another worker's computation checks for the result
+LOCK_POLL_SECONDS = 0.05
+# Deletes a lock only if the caller still holds it (KEYS[1] = lock, ARGV[1] = token)
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class TTLCache:
+    """In-process LRU cache whose entries expire after a TTL and can be dropped by tag."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._keys_by_tag = defaultdict(set)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value, tags: Iterable[str], ttl: int):
+        self._discard(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._keys_by_tag[tag].add(key)
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in list(self._keys_by_tag.pop(tag, ())):
+                self._discard(key)
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+class ResponseCache:
+    """
+    Two-tier cache for read endpoints: an in-process TTLCache in front of Redis.
+
+    Entries carry tags (e.g. `prompts:public`, `prompt:42`). Invalidating a tag
+    deletes its entries from Redis and publishes the tag so every worker drops its
+    in-process copies too. Without Redis only the in-process tier is used.
+
+    Misses are single-flight: concurrent callers for a key share one computation,
+    and with SINGLE_FLIGHT_REDIS_LOCK one worker computes while the others wait for
+    its result. Expired entries are kept for RESPONSE_CACHE_STALE_SECONDS and served
+    while a single background refresh recomputes them.
+    """
+
+    def __init__(self, maxsize: int):
+        self.local = TTLCache(maxsize)
+        self._in_flight = {}  # key -> (asyncio.Task computing it, whether callers wait for it)
+        self._sequence = 0  # Bumped by every invalidation
+        self._tag_versions = {}  # tag -> sequence of its last invalidation, while a computation may need it
+        self._computing = Counter()  # sequence at which each running computation started -> count
+
+    async def get(self, key: str) -> Optional[dict]:
+        """The cached entry, `{"value", "fresh_until"}`, fresh or stale."""
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        client = await get_redis()
+        if client is None:
+            return None
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                payload, ttl = await pipe.execute()
+        except Exception as e:
+            print(f"Error reading cache entry {key}: {e}")
+            return None
+        if payload is None:
+            return None
+        stored = json.loads(payload)
+        entry = {"value": stored["value"], "fresh_until": stored["fresh_until"]}
+        if ttl > 0:
+            self.local.set(key, entry, stored["tags"], ttl)
+        return entry
+
+    async def get_many(self, keys: list) -> list:
+        """Entries for `keys` in order (None where missing), with one Redis round trip for local misses."""
+        entries = [self.local.get(key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        client = await get_redis()
+        if client is None or not missing:
+            return entries
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for i in missing:
+                    pipe.get(keys[i])
+                    pipe.ttl(keys[i])
+                results = await pipe.execute()
+        except Exception as e:
+            print(f"Error reading cache entries: {e}")
+            return entries
+        for i, payload, ttl in zip(missing, results[::2], results[1::2]):
+            if payload is None:
+                continue
+            stored = json.loads(payload)
+            entries[i] = {"value": stored["value"], "fresh_until": stored["fresh_until"]}
+            if ttl > 0:
+                self.local.set(keys[i], entries[i], stored["tags"], ttl)
+        return entries
+
+    async def set(self, key: str, value, tags: Iterable[str], ttl: int):
+        await self.set_many([(key, value, tags)], ttl)
+
+    async def set_many(self, items: list, ttl: int):
+        """Store `(key, value, tags)` items with one Redis round trip."""
+        stored = []
+        # Kept past freshness so it can be served stale while being recomputed
+        lifetime = ttl + RESPONSE_CACHE_STALE_SECONDS
+        for key, value, tags in items:
+            tags = list(tags)
+            entry = {"value": value, "fresh_until": time.time() + ttl}
+            self.local.set(key, entry, tags, lifetime)
+            stored.append((key, entry, tags))
+        client = await get_redis()
+        if client is None or not stored:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key, entry, tags in stored:
+                    pipe.set(key, json.dumps({**entry, "tags": tags}), ex=lifetime)
+                    for tag in tags:
+                        pipe.sadd(f"cache:tag:{tag}", key)
+                        pipe.expire(f"cache:tag:{tag}", lifetime)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error writing cache entries: {e}")
+
+    async def invalidate(self, *tags: str):
+        self._invalidated(tags)
+        client = await get_redis()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.smembers(f"cache:tag:{tag}")
+                members = await pipe.execute()
+            keys = set().union(*members)
+            async with client.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.delete(*keys)
+                pipe.delete(*(f"cache:tag:{tag}" for tag in tags))
+                pipe.publish(INVALIDATION_CHANNEL, json.dumps(tags))
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error invalidating cache tags {tags}: {e}")
+
+    def _invalidated(self, tags: Iterable[str]):
+        tags = list(tags)
+        self.local.invalidate(tags)
+        # Only computations already running can still store a value from before this
+        if self._computing:
+            self._sequence += 1
+            for tag in tags:
+                self._tag_versions[tag] = self._sequence
+
+    def invalidate_sync(self, *tags: str):
+        """`invalidate` for Celery workers and other sync code, which keep no in-process tier."""
+        client = get_sync_redis()
+        if client is None:
+            return
+        try:
+            with client.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.smembers(f"cache:tag:{tag}")
+                members = pipe.execute()
+            keys = set().union(*members)
+            with client.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.delete(*keys)
+                pipe.delete(*(f"cache:tag:{tag}" for tag in tags))
+                pipe.publish(INVALIDATION_CHANNEL, json.dumps(tags))
+                pipe.execute()
+        except Exception as e:
+            print(f"Error invalidating cache tags {tags}: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable, tags: Callable, ttl: int) -> tuple:
+        """
+        The value for `key` and whether it came from the cache. On a miss `compute()`
+        runs once for all concurrent callers and its result is stored under `tags(value)`.
+        """
+        entry = await self.get(key)
+        if entry is not None:
+            if entry["fresh_until"] <= time.time() and key not in self._in_flight:
+                self._start(key, compute, tags, ttl, wait=False)
+            return entry["value"], True
+
+        # A background refresh gives up when another worker holds the lock, so a miss only joins a waiting computation
+        task, wait = self._in_flight.get(key, (None, False))
+        if not wait:
+            task = self._start(key, compute, tags, ttl, wait=True)
+        # Shielded so one caller disconnecting does not cancel the others' computation
+        return await asyncio.shield(task), False
+
+    def _start(self, key: str, compute: Callable, tags: Callable, ttl: int, wait: bool) -> asyncio.Task:
+        task = asyncio.ensure_future(self._compute(key, compute, tags, ttl, wait))
+        self._in_flight[key] = (task, wait)
+
+        def done(finished):
+            if self._in_flight.get(key, (None,))[0] is finished:
+                del self._in_flight[key]
+            # Background refreshes have no caller to report to
+            if not wait and not finished.cancelled() and finished.exception() is not None:
+                print(f"Error refreshing cache entry {key}: {finished.exception()}")
+
+        task.add_done_callback(done)
+        return task
+
+    async def _compute(self, key: str, compute: Callable, tags: Callable, ttl: int, wait: bool):
+        acquired, token = await self._lock(key)
+        if not acquired:
+            # Another worker is computing it; a refresh leaves it to them, a miss waits for their result
+            if not wait:
+                return None
+            entry = await self._wait_for(key)
+            if entry is not None:
+                return entry["value"]
+
+        started = self._sequence
+        self._computing[started] += 1
+        try:
+            value = await compute()
+            value_tags = list(tags(value))
+            # A write to one of its tags during the computation may have made this result stale already
+            if all(self._tag_versions.get(tag, 0) <= started for tag in value_tags):
+                await self.set(key, value, value_tags, ttl)
+            return value
+        finally:
+            self._finished_computing(started)
+            if token is not None:
+                await self._unlock(key, token)
+
+    def _finished_computing(self, started: int):
+        self._computing[started] -= 1
+        if not self._computing[started]:
+            del self._computing[started]
+        # Versions no running computation started before are never compared again
+        oldest = min(self._computing, default=None)
+        if oldest is None:
+            self._tag_versions.clear()
+        elif self._tag_versions:
+            self._tag_versions = {tag: version for tag, version in self._tag_versions.items() if version > oldest}
+
+    async def _lock(self, key: str) -> tuple:
+        """`(acquired, token)`; always acquired when cross-worker locking is off or Redis is down."""
+        client = await get_redis() if SINGLE_FLIGHT_REDIS_LOCK else None
+        if client is None:
+            return True, None
+        token = uuid.uuid4().hex
+        try:
+            if await client.set(f"lock:{key}", token, nx=True, ex=SINGLE_FLIGHT_LOCK_SECONDS):
+                return True, token
+            return False, None
+        except Exception as e:
+            print(f"Error locking cache entry {key}: {e}")
+            return True, None
+
+    async def _unlock(self, key: str, token: str):
+        client = await get_redis()
+        try:
+            await client.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except Exception as e:
+            print(f"Error unlocking cache entry {key}: {e}")
+
+    async def _wait_for(self, key: str) -> Optional[dict]:
+        """Poll for the entry another worker is computing; None if it gives up or fails."""
+        client = await get_redis()
+        deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            entry = await self.get(key)
+            if entry is not None:
+                return entry
+            try:
+                if not await client.exists(f"lock:{key}"):
+                    return await self.get(key)
+            except Exception:
+                return None
+        return None
+
+    async def listen_for_invalidations(self):
+        """Drop in-process entries for tags invalidated by other workers (run for the app's lifetime)."""
+        client = await get_redis()
+        if client is None:
+            return
+        pubsub = client.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self._invalidated(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await pubsub.aclose()
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def cache_key(namespace: str, params: dict) -> str:
+    digest = hashlib.sha1(json.dumps(jsonable_encoder(params), sort_keys=True).encode()).hexdigest()
+    return f"cache:{namespace}:{digest}"
+
+
+def cached(namespace: str, tags: Callable[[dict, dict], Iterable[str]], ttl: Optional[int] = None):
+    """
+    Cache a read route's response per parameter set.
+
+    `tags(response, params)` names the tags the response is invalidated by; writes call
+    `response_cache.invalidate` with those tags instead of relying on short TTLs.
+    The route's `AsyncSession` parameters are dropped from its signature, so a request
+    that is answered from the cache neither opens a session nor takes an admission
+    slot. A computation can outlive the request that started it (it is shared, or
+    refreshes in the background), so it waits for its own slot on the primary and
+    runs on its own session.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        session_names = [
+            name for name, parameter in signature.parameters.items() if parameter.annotation is AsyncSession
+        ]
+
+        @functools.wraps(func)
+        async def wrapper(*args, **params):
+            key = cache_key(namespace, params)
+
+            async def compute():
+                async with primary_admission.admit():
+                    async with AsyncSessionLocal() as db:
+                        sessions = {name: db for name in session_names}
+                        return jsonable_encoder(await func(*args, **params, **sessions))
+
+            value, hit = await response_cache.get_or_compute(
+                key, compute, lambda value: tags(value, params), ttl or RESPONSE_CACHE_TTL
+            )
+            record_cache(namespace, hit=hit)
+            return value
+
+        wrapper.__signature__ = signature.replace(
+            parameters=[parameter for name, parameter in signature.parameters.items() if name not in session_names]
+        )
+        return wrapper
+    return decorator
@@ -7,4 +7,98 @@ load_dotenv()
 SQLALCHEMY_DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL")
 BASE_URL = os.getenv("BASE_URL")
 API_KEY= os.getenv("API_KEY")
-REDIS_URL = os.getenv("REDIS_URL")
\ No newline at end of file
+REDIS_URL = os.getenv("REDIS_URL")
+# Seconds a route waits to reach the Celery broker before running the task inline instead
+BROKER_CONNECT_TIMEOUT_SECONDS = float(os.getenv("BROKER_CONNECT_TIMEOUT_SECONDS", 1))
+# Seconds routes run tasks inline without retrying the broker after it was unreachable
+BROKER_RETRY_AFTER_SECONDS = float(os.getenv("BROKER_RETRY_AFTER_SECONDS", 30))
+# Read replica for GET requests; unset sends every query to the primary
+SQLALCHEMY_REPLICA_URL = os.getenv("SQLALCHEMY_REPLICA_URL")
+# Seconds an account's GET requests keep reading from the primary after it writes; should exceed the replica lag
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+# Connections the API may hold on the database in total: Postgres' max_connections minus
+# what Celery, migrations and admin sessions need
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", 80))
+# API worker processes sharing the budget (uvicorn's --workers also defaults to this)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+# Async pool size per worker (and per replica); derived from the budget unless set
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 0)) or max(1, DB_CONNECTION_BUDGET // WEB_CONCURRENCY)
+# Pool size of the sync engine used by Celery tasks and scripts, per process
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", 5))
+# Seconds to wait for a pooled connection before the query fails
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 5))
+# Requests using the database at once per worker and engine; defaults to 3/4 of the pool,
+# leaving connections for cache refills and background flushers, which are not admitted
+DB_MAX_IN_FLIGHT = int(os.getenv("DB_MAX_IN_FLIGHT", 0)) or max(1, DB_POOL_SIZE * 3 // 4)
+# Requests that may queue for a slot per worker and engine; later ones get 503 at once
+DB_ADMISSION_QUEUE_SIZE = int(os.getenv("DB_ADMISSION_QUEUE_SIZE", 0)) or 2 * DB_MAX_IN_FLIGHT
+# Seconds a queued request waits for a slot before it gets 503
+DB_ADMISSION_TIMEOUT_SECONDS = float(os.getenv("DB_ADMISSION_TIMEOUT_SECONDS", 1))
+# Retry-After sent with those 503 responses, in seconds
+DB_ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("DB_ADMISSION_RETRY_AFTER_SECONDS", 1))
+
+# Creators with more followers than this are not fanned out on write; their prompts are pulled at read time
+FANOUT_FOLLOWER_LIMIT = int(os.getenv("FANOUT_FOLLOWER_LIMIT", 10000))
+# Maximum number of entries kept per materialized timeline
+TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", 1000))
+# Hourly generation buckets older than this are deleted; must exceed the 24h leaderboard window
+GENERATION_BUCKET_RETENTION_HOURS = int(os.getenv("GENERATION_BUCKET_RETENTION_HOURS", 48))
+
+# Adds X-DB-* query stats headers to every response; keep off in production
+DEV_MODE = os.getenv("DEV_MODE", "false").lower() == "true"
+# Requests running more SQL statements than this are logged (0 disables the check)
+QUERY_COUNT_THRESHOLD = int(os.getenv("QUERY_COUNT_THRESHOLD", 30))
+# "log" to only report requests over the threshold, "raise" to fail them (for tests and CI)
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log")
+# A statement repeated this many times within one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 5))
+
+# Seconds a cached read response lives; writes invalidate affected entries before then
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 300))
+# Largest page_size the list endpoints accept
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
+
+# Most users `/leaderboard/rank` returns on either side of the requested one
+MAX_RANK_RADIUS = int(os.getenv("MAX_RANK_RADIUS", 50))
+# Seconds a cached leaderboard page lives; the rolling 24h board also moves with the clock
+LEADERBOARD_CACHE_TTL = int(os.getenv("LEADERBOARD_CACHE_TTL", 60))
+# Maximum responses kept in each worker's in-process cache tier
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+# Seconds an expired cached response may still be served while one worker recomputes it
+RESPONSE_CACHE_STALE_SECONDS = int(os.getenv("RESPONSE_CACHE_STALE_SECONDS", 60))
+# Coordinate cache recomputation across workers with a Redis lock, not only within a worker
+SINGLE_FLIGHT_REDIS_LOCK = os.getenv("SINGLE_FLIGHT_REDIS_LOCK", "true").lower() == "true"
+# Seconds a worker may hold the recompute lock; others wait at most this long before computing themselves
+SINGLE_FLIGHT_LOCK_SECONDS = int(os.getenv("SINGLE_FLIGHT_LOCK_SECONDS", 10))
+
+# Acknowledge likes from Redis and insert them in batches in the background (needs Redis)
+LIKE_WRITE_BEHIND = os.getenv("LIKE_WRITE_BEHIND", "false").lower() == "true"
+# Seconds between flushes of buffered likes to the database
+LIKE_FLUSH_INTERVAL_SECONDS = float(os.getenv("LIKE_FLUSH_INTERVAL_SECONDS", 1))
+# Maximum buffered likes inserted per statement
+LIKE_FLUSH_BATCH_SIZE = int(os.getenv("LIKE_FLUSH_BATCH_SIZE", 500))
+# Seconds a prompt's cached like count and likers stay in Redis after its last like
+LIKE_CACHE_SECONDS = int(os.getenv("LIKE_CACHE_SECONDS", 3600))
+
+# Seconds each prompt's top comments stay cached for the feeds (0 disables the cache)
+TOP_COMMENTS_CACHE_SECONDS = int(os.getenv("TOP_COMMENTS_CACHE_SECONDS", 300))
+
+# Seconds each creator's top prompts stay cached for the follow lists (0 disables the cache)
+TOP_PROMPTS_CACHE_SECONDS = int(os.getenv("TOP_PROMPTS_CACHE_SECONDS", 300))
+
+# Hours for a like or comment to lose half its weight in the `trending` premium filter
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 24))
+
+# Hourly like/comment buckets kept for rebuilding trending scores
+TRENDING_BUCKET_RETENTION_HOURS = int(os.getenv("TRENDING_BUCKET_RETENTION_HOURS", 7 * 24))
+
+# Buffer generations in-process and count each account's burst with one write (off by default)
+USER_STATS_COALESCE = os.getenv("USER_STATS_COALESCE", "false").lower() == "true"
+# Seconds between flushes of buffered generations to user_stats
+USER_STATS_FLUSH_INTERVAL_SECONDS = float(os.getenv("USER_STATS_FLUSH_INTERVAL_SECONDS", 1))
+
+# Seconds between reloads of each worker's autocomplete index from the Redis snapshot
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", 60))
+# Seconds between rebuilds of each worker's autocomplete index from the database, when there is no snapshot
+AUTOCOMPLETE_DB_RELOAD_SECONDS = int(os.getenv("AUTOCOMPLETE_DB_RELOAD_SECONDS", 3600))
@@ -1,22 +1,32 @@
-from sqlalchemy import AsyncAdaptedQueuePool
+from sqlalchemy import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import Session
 
 from sqlalchemy import create_engine
-from contextlib import contextmanager
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import Request
 
-from app.core.constants import SQLALCHEMY_DATABASE_URL
+from app.core.admission import AdmissionLimiter
+from app.core.constants import (
+    DB_ADMISSION_QUEUE_SIZE, DB_ADMISSION_TIMEOUT_SECONDS, DB_MAX_IN_FLIGHT, DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS,
+    DB_SYNC_POOL_SIZE, SQLALCHEMY_DATABASE_URL, SQLALCHEMY_REPLICA_URL,
+)
+from app.core.metrics import TimedCheckoutMixin, register_engine
+from app.core.query_stats import instrument_engine
+from app.core.replica import ACCOUNT_PARAMS, wrote_recently
 
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
 
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_size=1000,  # Adjust based on your app's concurrency requirements
-    max_overflow=500,  # Allows for extra connections in times of high demand
-    pool_timeout=120,  # Reduces wait time for a connection
+# Shared pool settings for the sync engine (Celery, scripts) and the async engines (routes).
+# Pool sizes are set per engine: the async pools split DB_CONNECTION_BUDGET between the workers.
+ENGINE_OPTIONS = dict(
+    max_overflow=0,  # pool_size is a hard cap, so workers x pool_size stays within the budget
+    pool_timeout=DB_POOL_TIMEOUT_SECONDS,  # Fail fast instead of hanging on an exhausted pool
     pool_recycle=36000,  # Recycles connections every 1 hours
     # echo_pool='debug',  # Logs pool checkouts/checkins (remove in production)
     pool_pre_ping=True,
@@ -25,6 +35,67 @@ engine = create_engine(
 )
 
 
+def get_async_database_url(database_url: str):
+    """
+    Swap the driver of the configured database URL for its asyncio counterpart:
+    asyncpg for Postgres and aiosqlite for the local SQLite stand-in.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend == "postgresql":
+        # asyncpg does not understand libpq's `sslmode`, it takes `ssl` instead
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+# Pools that record checkout wait times for /metrics
+class TimedQueuePool(TimedCheckoutMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+class TimedReplicaQueuePool(TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_label = "replica"
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=TimedQueuePool, pool_size=DB_SYNC_POOL_SIZE, **ENGINE_OPTIONS)
+
+# aiosqlite defaults to NullPool, so the pool class is set explicitly to keep both backends pooled
+async_engine = create_async_engine(
+    get_async_database_url(SQLALCHEMY_DATABASE_URL),
+    poolclass=TimedAsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    **ENGINE_OPTIONS,
+)
+
+# Per-request query counting for both engines (see app/core/query_stats.py)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+register_engine("sync", engine)
+register_engine("async", async_engine.sync_engine)
+
+# Optional read replica, only used through `get_async_session` and `ReadSessionLocal`
+replica_async_engine = None
+if SQLALCHEMY_REPLICA_URL:
+    replica_async_engine = create_async_engine(
+        get_async_database_url(SQLALCHEMY_REPLICA_URL),
+        poolclass=TimedReplicaQueuePool,
+        pool_size=DB_POOL_SIZE,
+        **ENGINE_OPTIONS,
+    )
+    instrument_engine(replica_async_engine.sync_engine)
+    register_engine("replica", replica_async_engine.sync_engine)
+
+
 def get_session():
     with Session(engine) as session:
         yield session
@@ -32,6 +103,68 @@ def get_session():
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False so ORM objects can still be read after `await db.commit()`
+# without triggering an implicit (and in asyncio, illegal) lazy refresh.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# Sessions on the replica, or on the primary when no replica is configured. Only for
+# reads that tolerate replica lag; writes and reads that must see them use AsyncSessionLocal.
+ReplicaSessionLocal = None
+if replica_async_engine is not None:
+    ReplicaSessionLocal = async_sessionmaker(replica_async_engine, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = ReplicaSessionLocal or AsyncSessionLocal
+
+# Requests queue here for a database slot, and are shed with 503, before they wait on a pool
+primary_admission = AdmissionLimiter("async", DB_MAX_IN_FLIGHT, DB_ADMISSION_QUEUE_SIZE, DB_ADMISSION_TIMEOUT_SECONDS)
+replica_admission = None
+if replica_async_engine is not None:
+    replica_admission = AdmissionLimiter("replica", DB_MAX_IN_FLIGHT, DB_ADMISSION_QUEUE_SIZE, DB_ADMISSION_TIMEOUT_SECONDS)
+
+
+@asynccontextmanager
+async def request_session(request: Request):
+    """
+    Session for `request`. GET requests read from the replica unless an account named in
+    their query (see ACCOUNT_PARAMS) wrote within READ_YOUR_WRITES_SECONDS; every other
+    request uses the primary.
+
+    The request first waits for a slot on that engine's admission limiter, which
+    answers 503 with Retry-After when the worker already has too much database work.
+    """
+    session_factory, admission = AsyncSessionLocal, primary_admission
+    if ReplicaSessionLocal is not None and request.method == "GET":
+        accounts = [account for name in ACCOUNT_PARAMS for account in request.query_params.getlist(name)]
+        if not await wrote_recently(accounts):
+            session_factory, admission = ReplicaSessionLocal, replica_admission
+    async with admission.admit():
+        async with session_factory() as session:
+            yield session
+
+
+async def get_async_session(request: Request):
+    """Route dependency for `request_session`."""
+    async with request_session(request) as session:
+        yield session
+
+
+def is_replica_session(db: AsyncSession) -> bool:
+    return replica_async_engine is not None and db.bind is replica_async_engine
+
+
+@asynccontextmanager
+async def primary_session(db: AsyncSession):
+    """
+    `db` if it is on the primary, otherwise a new primary session. For reads whose
+    results are cached and shared: filled from a lagging replica, an entry invalidated
+    by a write could be cached again without it.
+    """
+    if not is_replica_session(db):
+        yield db
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
+
 
 def get_db():
     db = SessionLocal()
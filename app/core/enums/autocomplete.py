@@ -0,0 +1,6 @@
+from enum import Enum
+
+class AutocompleteField(str, Enum):
+    POST_NAME = "post_name"
+    COLLECTION_NAME = "collection_name"
+    CREATOR = "creator"
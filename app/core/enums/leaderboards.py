@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class LeaderboardType(str, Enum):
+    XP = "xp"
+    STREAKS = "streaks"
+    GENERATIONS = "generations"
+    GENERATIONS_24H = "generations-24h"
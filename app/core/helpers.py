@@ -1,4 +1,165 @@
+import base64
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
 
-def paginate(query, page: int, page_size: int):
+from fastapi import HTTPException
+from sqlalchemy import Boolean, DateTime, Integer, case, func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def paginate(db: AsyncSession, stmt, page: int, page_size: int):
     """Simple pagination utility."""
-    return query.offset((page - 1) * page_size).limit(page_size).all()
\ No newline at end of file
+    result = await db.execute(stmt.offset((page - 1) * page_size).limit(page_size))
+    return result.scalars().all()
+
+
+async def count(db: AsyncSession, stmt) -> int:
+    """Count the rows a select statement would return."""
+    result = await db.execute(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    return result.scalar_one()
+
+
+def insert_for(db, table):
+    """
+    Build an INSERT for the session's dialect, so callers can use
+    `on_conflict_do_nothing`/`on_conflict_do_update` on Postgres and SQLite alike.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+class Page(NamedTuple):
+    items: list
+    total: Optional[int]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(values) -> str:
+    """Encode the sort-key values of the last row of a page into an opaque cursor."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by) -> list:
+    """
+    Decode a cursor produced by `encode_cursor` back into values for the `order_by` columns
+    (or bare column types). Raises a 400 if the cursor is malformed or was issued for a
+    different ordering.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(payload, list) or len(payload) != len(order_by):
+            raise ValueError("cursor does not match the sort order")
+        return [
+            datetime.fromisoformat(value) if isinstance(getattr(column, "type", column), DateTime) else value
+            for column, value in zip(order_by, payload)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+async def paginate_keyset(
+    db: AsyncSession,
+    stmt,
+    order_by,
+    page_size: int,
+    after: Optional[list] = None,
+    page: int = 1,
+    include_total: Optional[bool] = None,
+) -> Page:
+    """
+    Paginate `stmt` in descending `order_by` order (the last column must be unique, e.g. the id).
+
+    When `after` (decoded cursor values) is given, rows are fetched with a keyset
+    predicate so every page costs the same; otherwise the legacy `page` offset is used.
+    Both modes return a `next_cursor` for the following page. The total is only
+    counted when asked for, and by default only for offset pages.
+    """
+    if include_total is None:
+        include_total = after is None
+    total = await count(db, stmt) if include_total else None
+    # An empty page, as the offset `paginate` gave, rather than slicing with a bad size
+    if page_size < 1:
+        return Page(items=[], total=total, next_cursor=None)
+
+    if after is not None:
+        stmt = stmt.filter(tuple_(*order_by) < tuple_(*after))
+    else:
+        stmt = stmt.offset(max(page - 1, 0) * page_size)
+
+    # Fetch one extra row to know whether there is a next page
+    result = await db.execute(stmt.order_by(*[column.desc() for column in order_by]).limit(page_size + 1))
+    items = result.scalars().all()
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column in order_by])
+
+    return Page(items=items, total=total, next_cursor=next_cursor)
+
+
+# Cursor layout for `paginate_rotation`: ring start, wrapped flag, shuffle key, id
+ROTATION_CURSOR = (Integer(), Boolean(), Integer(), Integer())
+
+
+async def paginate_rotation(
+    db: AsyncSession,
+    stmt,
+    shuffle_key,
+    id_column,
+    start: int,
+    page_size: int,
+    after: Optional[list] = None,
+    page: int = 1,
+    include_total: Optional[bool] = None,
+) -> Page:
+    """
+    Paginate `stmt` in a stable pseudo-random order: rows are read around the ring of
+    precomputed `shuffle_key` values beginning at `start` (keys >= start ascending,
+    then wrapping around to keys < start).
+
+    With `after` (decoded `ROTATION_CURSOR` values) or on the first page, a page is at
+    most two index range scans. Later `page` numbers apply an offset to the same order.
+    The cursor carries `start`, so a session keeps its order even if the caller's
+    default start changes between requests.
+    """
+    if after is not None:
+        start = after[0]
+    if include_total is None:
+        include_total = after is None
+    total = await count(db, stmt) if include_total else None
+    if page_size < 1:
+        return Page(items=[], total=total, next_cursor=None)
+
+    order = (shuffle_key, id_column)
+    if after is None and page > 1:
+        ring_position = case((shuffle_key >= start, 0), else_=1)
+        result = await db.execute(
+            stmt.order_by(ring_position, *order).offset((page - 1) * page_size).limit(page_size + 1)
+        )
+        items = result.scalars().all()
+    else:
+        items = []
+        resume_wrapped = bool(after[1]) if after is not None else False
+        for wrapped in (False, True):
+            if wrapped < resume_wrapped:
+                continue
+            segment = stmt.filter(shuffle_key < start if wrapped else shuffle_key >= start)
+            if after is not None and wrapped == resume_wrapped:
+                segment = segment.filter(tuple_(*order) > tuple_(after[2], after[3]))
+            result = await db.execute(segment.order_by(*order).limit(page_size + 1 - len(items)))
+            items += result.scalars().all()
+            if len(items) > page_size:
+                break
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last_key = getattr(items[-1], shuffle_key.key)
+        next_cursor = encode_cursor([start, last_key < start, last_key, getattr(items[-1], id_column.key)])
+
+    return Page(items=items, total=total, next_cursor=next_cursor)
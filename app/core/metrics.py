@@ -0,0 +1,304 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from fastapi import Request
+
+from app.core.redis_client import get_sync_redis
+
+# Latency buckets in seconds, shared by request, pool-wait and task histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """A named metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self):
+        """Yield `(suffix, labels, value)` for every series."""
+        return iter(())
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield "", self._labels(key), value
+
+
+class Gauge(Metric):
+    """A gauge whose series are read from `collect` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), collect: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self):
+        if self.collect is None:
+            return
+        for labels, value in self.collect():
+            yield "", labels, value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # labels -> [per-bucket counts (not cumulative), sum, count]
+        self._series = {}
+        # Extra series merged in at scrape time, e.g. from other processes
+        self.external = None
+
+    def bucket_index(self, value: float) -> int:
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                return i
+        return len(self.buckets) - 1
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            series[0][self.bucket_index(value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _all_series(self) -> dict:
+        merged = {key: [list(counts), total, count] for key, (counts, total, count) in list(self._series.items())}
+        for key, (counts, total, count) in (self.external or {}).items():
+            series = merged.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+        return merged
+
+    def samples(self):
+        for key, (counts, total, count) in self._all_series().items():
+            labels = self._labels(key)
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", {**labels, "le": _format_value(upper)}, cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+REGISTRY: list = []
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- HTTP ---------------------------------------------------------------------
+
+http_requests = Counter("http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+http_request_errors = Counter("http_request_errors_total", "HTTP requests that failed with a 5xx or an unhandled error.", ("method", "route"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Record latency, status and errors per route template (unmatched paths share one label)."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_request_duration.observe(time.perf_counter() - started, method=request.method, route=route)
+        http_requests.inc(method=request.method, route=route, status=status)
+        if status >= 500:
+            http_request_errors.inc(method=request.method, route=route)
+
+
+# --- Connection pools -----------------------------------------------------------
+
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("engine",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0),
+)
+_engines = {}
+
+
+class TimedCheckoutMixin:
+    """Pool mixin that records how long each connection checkout waits."""
+
+    metrics_label = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started, engine=self.metrics_label)
+
+
+def register_engine(label: str, engine):
+    """Export `engine`'s pool size and usage (read from the live pool on every scrape)."""
+    _engines[label] = engine
+
+
+def _pool_stat(method: str):
+    def collect():
+        for label, engine in list(_engines.items()):
+            stat = getattr(engine.pool, method, None)
+            if stat is not None:
+                yield {"engine": label}, stat()
+    return collect
+
+
+Gauge("db_pool_size", "Configured pool size.", ("engine",), collect=_pool_stat("size"))
+Gauge("db_pool_checked_out", "Connections currently in use.", ("engine",), collect=_pool_stat("checkedout"))
+Gauge("db_pool_checked_in", "Idle connections in the pool.", ("engine",), collect=_pool_stat("checkedin"))
+Gauge("db_pool_overflow", "Connections open beyond pool_size (negative while the pool is not full).", ("engine",), collect=_pool_stat("overflow"))
+
+
+# --- Admission control ------------------------------------------------------------
+
+admission_wait = Histogram(
+    "db_admission_wait_seconds", "Time requests queued for a database slot (see app/core/admission.py).", ("engine",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+admission_rejected = Counter("db_admission_rejected_total", "Requests shed with 503 because no database slot was free.", ("engine", "reason"))
+_limiters = {}
+
+
+def register_limiter(label: str, limiter):
+    """Export `limiter`'s in-flight and queued requests (read on every scrape)."""
+    _limiters[label] = limiter
+
+
+def _limiter_stat(attribute: str):
+    def collect():
+        for label, limiter in list(_limiters.items()):
+            yield {"engine": label}, getattr(limiter, attribute)
+    return collect
+
+
+Gauge("db_admission_in_flight", "Requests holding a database slot.", ("engine",), collect=_limiter_stat("in_flight"))
+Gauge("db_admission_queued", "Requests waiting for a database slot.", ("engine",), collect=_limiter_stat("queued"))
+
+
+# --- Celery -----------------------------------------------------------------------
+
+celery_task_duration = Histogram("celery_task_duration_seconds", "Celery task run time.", ("task", "state"))
+celery_inline_runs = Counter(
+    "celery_inline_runs_total", "Tasks run inside the API because the broker could not take them.", ("task", "reason")
+)
+
+# Workers run in other processes, so task timings are pooled in Redis when it is available
+CELERY_METRICS_KEY = "metrics:celery_task_duration"
+
+
+def record_task_duration(task_name: str, state: str, seconds: float):
+    """Record a task run, in Redis if reachable so the API's /metrics sees every worker."""
+    client = get_sync_redis()
+    if client is None:
+        celery_task_duration.observe(seconds, task=task_name, state=state)
+        return
+    prefix = f"{task_name}|{state}"
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hincrby(CELERY_METRICS_KEY, f"{prefix}|{celery_task_duration.bucket_index(seconds)}", 1)
+        pipe.hincrbyfloat(CELERY_METRICS_KEY, f"{prefix}|sum", seconds)
+        pipe.hincrby(CELERY_METRICS_KEY, f"{prefix}|count", 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error recording task metrics: {e}")
+        celery_task_duration.observe(seconds, task=task_name, state=state)
+
+
+async def load_task_durations(client):
+    """Merge the task timings workers pooled in Redis into `celery_task_duration`."""
+    series = {}
+    for field, value in (await client.hgetall(CELERY_METRICS_KEY)).items():
+        task_name, state, part = field.rsplit("|", 2)
+        entry = series.setdefault((task_name, state), [[0] * len(celery_task_duration.buckets), 0.0, 0])
+        if part == "sum":
+            entry[1] = float(value)
+        elif part == "count":
+            entry[2] = int(value)
+        else:
+            entry[0][int(part)] = int(value)
+    celery_task_duration.external = series
+
+
+# --- Feeds ---------------------------------------------------------------------------
+
+feed_stage_duration = Histogram("feed_stage_duration_seconds", "Time spent in each stage of building a feed page.", ("feed", "stage"))
+
+
+# --- Caches -------------------------------------------------------------------------
+
+cache_requests = Counter("cache_requests_total", "Cache lookups by outcome.", ("cache", "result"))
+
+
+def record_cache(cache_name: str, hit: bool):
+    cache_requests.inc(cache=cache_name, result="hit" if hit else "miss")
+
+
+def _cache_hit_ratios():
+    caches = {labels["cache"] for _, labels, _ in cache_requests.samples()}
+    for cache_name in sorted(caches):
+        hits = cache_requests.value(cache=cache_name, result="hit")
+        total = hits + cache_requests.value(cache=cache_name, result="miss")
+        yield {"cache": cache_name}, hits / total if total else 0
+
+
+Gauge("cache_hit_ratio", "Share of cache lookups served from the cache since startup.", ("cache",), collect=_cache_hit_ratios)
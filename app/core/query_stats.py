@@ -0,0 +1,146 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event
+
+from app.core.constants import DEV_MODE, N_PLUS_ONE_THRESHOLD, QUERY_BUDGET_MODE, QUERY_COUNT_THRESHOLD
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (when QUERY_BUDGET_MODE is "raise") for a request over QUERY_COUNT_THRESHOLD queries."""
+
+
+class RequestQueryStats:
+    """The SQL a single request ran: how many statements, how long they took, and which repeat."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+
+    def repeated(self) -> dict:
+        """Fingerprints run at least N_PLUS_ONE_THRESHOLD times, the signature of an N+1 loop."""
+        return {
+            fingerprint: times
+            for fingerprint, times in self.fingerprints.items()
+            if times >= N_PLUS_ONE_THRESHOLD
+        }
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("query_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)\s*\)")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a statement so the same query with different parameters compares equal."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _LITERALS.sub("?", statement)
+    return _PLACEHOLDER_LISTS.sub("(...)", statement)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    started = conn.info["query_start_time"].pop()
+    stats.count += 1
+    stats.db_time += time.perf_counter() - started
+    stats.fingerprints[fingerprint(statement)] += 1
+
+
+def instrument_engine(engine):
+    """Count the statements `engine` runs on behalf of the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RouteQueryStats:
+    """Running per-route totals for the metrics endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.over_budget = 0
+        self.repeated = Counter()
+
+    def add(self, stats: RequestQueryStats):
+        self.requests += 1
+        self.queries += stats.count
+        self.max_queries = max(self.max_queries, stats.count)
+        self.db_time += stats.db_time
+        if QUERY_COUNT_THRESHOLD and stats.count > QUERY_COUNT_THRESHOLD:
+            self.over_budget += 1
+        self.repeated.update(stats.repeated().keys())
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": round(self.queries / self.requests, 2),
+            "max_queries": self.max_queries,
+            "avg_db_time_ms": round(self.db_time * 1000 / self.requests, 2),
+            "over_budget_requests": self.over_budget,
+            # Statements that repeated within a request, and in how many requests they did
+            "repeated_statements": dict(self.repeated.most_common(5)),
+        }
+
+
+route_query_stats: dict = {}
+
+
+async def query_stats_middleware(request: Request, call_next):
+    """
+    Record the SQL each request runs. Totals are kept per route for
+    `/metrics/queries`; in DEV_MODE they are also returned as `X-DB-*` headers.
+    Requests over QUERY_COUNT_THRESHOLD queries are logged, or fail when
+    QUERY_BUDGET_MODE is "raise" so tests catch the regression.
+    """
+    stats = RequestQueryStats()
+    token = _current_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None)
+    if route_path is not None:
+        route_query_stats.setdefault(f"{request.method} {route_path}", RouteQueryStats()).add(stats)
+
+    repeated = stats.repeated()
+    if QUERY_COUNT_THRESHOLD and stats.count > QUERY_COUNT_THRESHOLD:
+        message = f"{request.method} {request.url.path} ran {stats.count} queries (threshold {QUERY_COUNT_THRESHOLD})"
+        if repeated:
+            message += "; repeated: " + "; ".join(f"{times}x {statement[:120]}" for statement, times in repeated.items())
+        if QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+        print(f"Query budget exceeded: {message}")
+
+    if DEV_MODE:
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+        response.headers["X-DB-Repeated-Queries"] = str(sum(repeated.values()))
+
+    return response
+
+
+def get_query_metrics() -> dict:
+    """Per-route query aggregates, busiest routes first."""
+    return {
+        route: stats.as_dict()
+        for route, stats in sorted(route_query_stats.items(), key=lambda item: item[1].queries, reverse=True)
+    }
@@ -0,0 +1,54 @@
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.constants import REDIS_URL
+
+_client: Optional[aioredis.Redis] = None
+_checked = False
+_sync_client: Optional[redis.Redis] = None
+_sync_checked = False
+
+
+async def get_redis() -> Optional[aioredis.Redis]:
+    """
+    Shared asyncio Redis client, or None when REDIS_URL is unset or Redis cannot be
+    reached. Reachability is checked once per process; callers fall back to their
+    in-process implementations when this returns None.
+    """
+    global _client, _checked
+    if not _checked:
+        _checked = True
+        if REDIS_URL:
+            try:
+                client = aioredis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=1)
+                await client.ping()
+                _client = client
+            except Exception as e:
+                print(f"Redis unavailable, using in-process fallbacks: {e}")
+    return _client
+
+
+async def close_redis():
+    """Close the shared client on shutdown."""
+    global _client, _checked
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _checked = False
+
+
+def get_sync_redis() -> Optional[redis.Redis]:
+    """Blocking counterpart of `get_redis` for Celery workers and other sync code."""
+    global _sync_client, _sync_checked
+    if not _sync_checked:
+        _sync_checked = True
+        if REDIS_URL:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=1)
+                client.ping()
+                _sync_client = client
+            except Exception as e:
+                print(f"Redis unavailable, using in-process fallbacks: {e}")
+    return _sync_client
@@ -0,0 +1,62 @@
+import time
+from typing import Iterable
+
+from app.core.constants import READ_YOUR_WRITES_SECONDS
+from app.core.redis_client import get_redis
+
+# Query parameters naming the account a GET request reads for
+ACCOUNT_PARAMS = ("user_account", "viewer_account", "account_address", "follower_account", "creator_account")
+
+# account -> monotonic deadline of its marker, used when Redis is unavailable
+_recent_writes = {}
+
+
+def _marker_key(account: str) -> str:
+    return f"replica:wrote:{account}"
+
+
+async def mark_recent_write(*accounts: str):
+    """
+    Route GET requests naming any of `accounts` to the primary for READ_YOUR_WRITES_SECONDS,
+    so an account sees its own write before the replica has replayed it. Call after committing.
+    """
+    accounts = [account for account in accounts if account]
+    if not accounts or READ_YOUR_WRITES_SECONDS <= 0:
+        return
+
+    client = await get_redis()
+    if client is not None:
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for account in accounts:
+                    pipe.set(_marker_key(account), 1, ex=READ_YOUR_WRITES_SECONDS)
+                await pipe.execute()
+            return
+        except Exception as e:
+            print(f"Error marking recent writes for {accounts}: {e}")
+
+    now = time.monotonic()
+    for account, deadline in list(_recent_writes.items()):
+        if deadline <= now:
+            del _recent_writes[account]
+    for account in accounts:
+        _recent_writes[account] = now + READ_YOUR_WRITES_SECONDS
+
+
+async def wrote_recently(accounts: Iterable[str]) -> bool:
+    """Whether any of `accounts` has an unexpired marker from `mark_recent_write`."""
+    accounts = [account for account in accounts if account]
+    if not accounts:
+        return False
+
+    client = await get_redis()
+    if client is not None:
+        try:
+            return await client.exists(*(_marker_key(account) for account in accounts)) > 0
+        except Exception as e:
+            # Without the markers the primary is the only safe choice
+            print(f"Error checking recent writes for {accounts}: {e}")
+            return True
+
+    now = time.monotonic()
+    return any(_recent_writes.get(account, 0) > now for account in accounts)
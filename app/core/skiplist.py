@@ -0,0 +1,127 @@
+import random
+from typing import Iterator, Optional
+
+
+class _Node:
+    __slots__ = ("key", "forward", "span")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.forward = [None] * level
+        # span[i]: how many positions forward[i] skips, so ranks can be summed on the way down
+        self.span = [0] * level
+
+
+class SkipList:
+    """
+    Indexable skip list of unique, comparable keys kept in ascending order.
+
+    Works like a Redis sorted set's skip list: insert, remove, rank lookup and
+    access by position are O(log n) on average, and reading `count` keys from a
+    position is O(log n + count).
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key) -> None:
+        """Insert `key`, which must not already be in the list."""
+        update = [self._head] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                self._head.span[i] = self._length
+            self._level = level
+
+        new_node = _Node(key, level)
+        for i in range(level):
+            new_node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new_node
+            new_node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = (rank[0] - rank[i]) + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+
+        self._length += 1
+
+    def remove(self, key) -> bool:
+        """Remove `key`; returns False if it was not in the list."""
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        node = node.forward[0]
+        if node is None or node.key != key:
+            return False
+
+        for i in range(self._level):
+            if update[i].forward[i] is node:
+                update[i].span[i] += node.span[i] - 1
+                update[i].forward[i] = node.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+
+        self._length -= 1
+        return True
+
+    def rank(self, key) -> Optional[int]:
+        """0-based position of `key`, or None if it is not in the list."""
+        traversed = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if node is not self._head and node.key == key:
+                return traversed - 1
+        return None
+
+    def _node_at(self, index: int) -> Optional[_Node]:
+        target = index + 1
+        traversed = 0
+        node = self._head
+        for i in reversed(range(self._level)):
+            while node.forward[i] is not None and traversed + node.span[i] <= target:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if traversed == target:
+                return node
+        return None
+
+    def slice(self, start: int, count: int) -> Iterator:
+        """Yield up to `count` keys beginning at position `start`."""
+        if start < 0 or count <= 0:
+            return
+        node = self._node_at(start)
+        while node is not None and count > 0:
+            yield node.key
+            node = node.forward[0]
+            count -= 1
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
 from app.core.database import Base  # Assuming you have a Base model class
 
 class UserStats(Base):
@@ -6,7 +6,20 @@ class UserStats(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_account = Column(String, unique=True, nullable=False)
-    xp = Column(Integer, default=0, index=True)  # Initialize XP to 0
-    total_generations = Column(Integer, default=0, index=True)  # Initialize total_generations to 0
-    streak_days = Column(Integer, default=0, index=True)  # Initialize streak_days to 0
-    last_generation = Column(DateTime, nullable=True, index=True)  # Can be null initially
\ No newline at end of file
+    xp = Column(Integer, default=0)  # Initialize XP to 0
+    total_generations = Column(Integer, default=0)  # Initialize total_generations to 0
+    streak_days = Column(Integer, default=0)  # Initialize streak_days to 0
+    last_generation = Column(DateTime, nullable=True)  # Can be null initially
+
+
+class GenerationBucket(Base):
+    """Number of generations a user made within one clock hour."""
+    __tablename__ = 'generation_buckets'
+    __table_args__ = (
+        UniqueConstraint('user_account', 'bucket_start', name='uq_generation_buckets_user_account_bucket_start'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_account = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False, index=True)  # Start of the hour (UTC)
+    generations = Column(Integer, nullable=False, default=0, server_default='0')
@@ -1,26 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-from app.core.database import get_session
-from app.core.helpers import paginate
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.core.helpers import encode_cursor
+from app.core.cache import cached
+from app.core.constants import LEADERBOARD_CACHE_TTL, MAX_PAGE_SIZE, MAX_RANK_RADIUS
+from app.core.enums.leaderboards import LeaderboardType
 from . import schemas, services, models
 import random
 
 router = APIRouter()
 
 @router.get("/generations-24h/")
-def leaderboard_generations_24h(page: int = 1, page_size: int = 10, db: Session = Depends(get_session)):
+@cached("leaderboard-generations-24h", services.leaderboard_cache_tags, ttl=LEADERBOARD_CACHE_TTL)
+async def leaderboard_generations_24h(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+):
     """
     Leaderboard based on the number of generations in the last 24 hours with pagination.
+    `total_generations` is each user's count over the rolling window, at hourly granularity.
+    Pass the returned `next_cursor` as `cursor` to continue from the previous page.
     """
-    try:
-        last_24_hours = datetime.utcnow() - timedelta(hours=24)
+    start = services.page_start(page, page_size, cursor)
 
-        query = db.query(models.UserStats).filter(models.UserStats.last_generation >= last_24_hours).order_by(models.UserStats.total_generations.desc())
-        total_count = query.count()
-        users = paginate(query, page, page_size)
+    try:
+        entries, total = await services.get_leaderboard_page(LeaderboardType.GENERATIONS_24H, start, page_size)
 
-        results = [{"user_account": user.user_account, "total_generations": user.total_generations} for user in users]
+        results = [{"user_account": user_account, "total_generations": score} for user_account, score in entries]
+        next_cursor = encode_cursor([start + page_size]) if start + page_size < total else None
 
         # Add 10 dummy entries with random wallet addresses
         for _ in range(10):
@@ -33,9 +41,10 @@ def leaderboard_generations_24h(page: int = 1, page_size: int = 10, db: Session
 
         return {
             "results": results,
-            "total": total_count + 10,  # Adjust total count
+            "total": total + 10 if include_total is not False else None,  # Adjust total count
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         detail = {
@@ -47,16 +56,24 @@ def leaderboard_generations_24h(page: int = 1, page_size: int = 10, db: Session
 
 
 @router.get("/streaks/")
-def leaderboard_streaks(page: int = 1, page_size: int = 10, db: Session = Depends(get_session)):
+@cached("leaderboard-streaks", services.leaderboard_cache_tags, ttl=LEADERBOARD_CACHE_TTL)
+async def leaderboard_streaks(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+):
     """
     Leaderboard based on the number of consecutive days with generations, with pagination.
+    Pass the returned `next_cursor` as `cursor` to continue from the previous page.
     """
+    start = services.page_start(page, page_size, cursor)
+
     try:
-        query = db.query(models.UserStats).order_by(models.UserStats.streak_days.desc())
-        total_count = query.count()
-        users = paginate(query, page, page_size)
+        entries, total = await services.get_leaderboard_page(LeaderboardType.STREAKS, start, page_size)
 
-        results = [{"user_account": user.user_account, "streak_days": user.streak_days} for user in users]
+        results = [{"user_account": user_account, "streak_days": score} for user_account, score in entries]
+        next_cursor = encode_cursor([start + page_size]) if start + page_size < total else None
 
         # Add 10 dummy entries with random wallet addresses
         for _ in range(10):
@@ -69,9 +86,10 @@ def leaderboard_streaks(page: int = 1, page_size: int = 10, db: Session = Depend
 
         return {
             "results": results,
-            "total": total_count + 10,  # Adjust total count
+            "total": total + 10 if include_total is not False else None,  # Adjust total count
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         detail = {
@@ -83,16 +101,24 @@ def leaderboard_streaks(page: int = 1, page_size: int = 10, db: Session = Depend
 
 
 @router.get("/xp/")
-def leaderboard_xp(page: int = 1, page_size: int = 10, db: Session = Depends(get_session)):
+@cached("leaderboard-xp", services.leaderboard_cache_tags, ttl=LEADERBOARD_CACHE_TTL)
+async def leaderboard_xp(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+):
     """
     Leaderboard based on XP with pagination.
+    Pass the returned `next_cursor` as `cursor` to continue from the previous page.
     """
+    start = services.page_start(page, page_size, cursor)
+
     try:
-        query = db.query(models.UserStats).order_by(models.UserStats.xp.desc())
-        total_count = query.count()
-        users = paginate(query, page, page_size)
+        entries, total = await services.get_leaderboard_page(LeaderboardType.XP, start, page_size)
 
-        results = [{"user_account": user.user_account, "xp": user.xp} for user in users]
+        results = [{"user_account": user_account, "xp": score} for user_account, score in entries]
+        next_cursor = encode_cursor([start + page_size]) if start + page_size < total else None
 
         # Add 10 dummy entries with random wallet addresses
         for _ in range(10):
@@ -105,13 +131,40 @@ def leaderboard_xp(page: int = 1, page_size: int = 10, db: Session = Depends(get
 
         return {
             "results": results,
-            "total": total_count + 10,  # Adjust total count
+            "total": total + 10 if include_total is not False else None,  # Adjust total count
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         detail = {
             "info": "Failed to get leaderboard based on XP",
             "error": str(e),
         }
-        raise HTTPException(status_code=500, detail=detail)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=detail)
+
+
+@router.get("/rank/")
+async def leaderboard_rank(
+    user_account: str, board: LeaderboardType = LeaderboardType.XP, radius: int = Query(5, ge=0, le=MAX_RANK_RADIUS)
+):
+    """
+    A user's position on a leaderboard together with the users ranked around them.
+
+    - **user_account**: The account to look up.
+    - **board**: Which leaderboard to rank on (xp, streaks, generations or generations-24h).
+    - **radius**: How many users to return above and below the user.
+    """
+    try:
+        position = await services.get_rank_with_neighbors(board, user_account, radius)
+    except Exception as e:
+        detail = {
+            "info": "Failed to get leaderboard rank",
+            "error": str(e),
+        }
+        raise HTTPException(status_code=500, detail=detail)
+
+    if position is None:
+        raise HTTPException(status_code=404, detail="User is not on this leaderboard")
+
+    return {"board": board, "user_account": user_account, **position}
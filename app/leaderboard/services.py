@@ -1,4 +1,373 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.core.constants import GENERATION_BUCKET_RETENTION_HOURS
+from app.core.database import AsyncSessionLocal
+from app.core.enums.leaderboards import LeaderboardType
+from app.core.helpers import decode_cursor, insert_for
+from app.core.redis_client import get_redis
+from app.core.skiplist import SkipList
 from . import models, schemas
 
+# The `user_stats` column each leaderboard ranks by
+BOARD_COLUMNS = {
+    LeaderboardType.XP: models.UserStats.xp,
+    LeaderboardType.STREAKS: models.UserStats.streak_days,
+    LeaderboardType.GENERATIONS: models.UserStats.total_generations,
+}
+
+LOAD_BATCH_SIZE = 5000
+# How long one worker holds a rebuild of the rolling board, and keeps its half-built copy if it dies
+REBUILD_KEY_SECONDS = 3600
+
+# The rolling generations board sums the hourly buckets of the last WINDOW_HOURS hours
+WINDOW_HOURS = 24
+# Marks the newest hourly bucket already subtracted from the rolling board
+WINDOW_MARKER = "generations-24h:expired-through"
+
+# Cursor layout for leaderboard pages: the position to resume from. Sorted sets
+# index by position in O(log n), so offsets stay cheap on deep pages.
+RANK_CURSOR = (Integer(),)
+
+# Response cache tag for leaderboard pages. Scores change on every generation, so the
+# pages are left to expire after LEADERBOARD_CACHE_TTL instead of being invalidated
+LEADERBOARDS_TAG = "leaderboards"
+
+
+def leaderboard_cache_tags(response: dict, params: dict) -> list:
+    return [LEADERBOARDS_TAG]
+
+
+def board_key(board: LeaderboardType) -> str:
+    return f"leaderboard:{board.value}"
+
+
+class RedisLeaderboardStore:
+    """Leaderboards kept in Redis sorted sets, shared by every worker."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def set_scores(self, user_account: str, scores: dict):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for board, score in scores.items():
+                pipe.zadd(board_key(board), {user_account: score})
+            await pipe.execute()
+
+    async def increment(self, board: LeaderboardType, entries: list):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_account, amount in entries:
+                pipe.zincrby(board_key(board), amount, user_account)
+            await pipe.execute()
+
+    async def prune(self, board: LeaderboardType):
+        await self.client.zremrangebyscore(board_key(board), "-inf", 0)
+
+    async def load(self, board: LeaderboardType, entries: list):
+        for i in range(0, len(entries), LOAD_BATCH_SIZE):
+            await self.client.zadd(board_key(board), dict(entries[i:i + LOAD_BATCH_SIZE]))
+
+    async def replace(self, board: LeaderboardType, entries: list):
+        """Build the board under a temporary key and rename it over the live one."""
+        staging = f"{board_key(board)}:rebuild:{uuid.uuid4().hex}"
+        for i in range(0, len(entries), LOAD_BATCH_SIZE):
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.zadd(staging, dict(entries[i:i + LOAD_BATCH_SIZE]))
+                pipe.expire(staging, REBUILD_KEY_SECONDS)
+                await pipe.execute()
+        async with self.client.pipeline(transaction=True) as pipe:
+            if entries:
+                # RENAME carries the staging key's TTL over
+                pipe.rename(staging, board_key(board))
+                pipe.persist(board_key(board))
+            else:
+                pipe.delete(board_key(board))
+            await pipe.execute()
+
+    async def size(self, board: LeaderboardType) -> int:
+        return await self.client.zcard(board_key(board))
+
+    async def top(self, board: LeaderboardType, start: int, count: int) -> list:
+        # ZREVRANGE's stop is inclusive and counts back from the end when negative
+        if count < 1:
+            return []
+        entries = await self.client.zrevrange(board_key(board), start, start + count - 1, withscores=True)
+        return [(user_account, int(score)) for user_account, score in entries]
+
+    async def rank(self, board: LeaderboardType, user_account: str) -> Optional[tuple]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(board_key(board), user_account)
+            pipe.zscore(board_key(board), user_account)
+            rank, score = await pipe.execute()
+        return None if rank is None else (rank, int(score))
+
+    async def get_marker(self, name: str) -> Optional[str]:
+        return await self.client.get(f"leaderboard:marker:{name}")
+
+    async def set_marker(self, name: str, value: str):
+        await self.client.set(f"leaderboard:marker:{name}", value)
+
+    async def claim(self, name: str, ttl: int) -> bool:
+        """True for exactly one caller across all workers until `ttl` seconds pass."""
+        return bool(await self.client.set(f"leaderboard:claim:{name}", 1, nx=True, ex=ttl))
+
+
+class MemoryLeaderboardStore:
+    """
+    In-process stand-in for `RedisLeaderboardStore` when Redis is not configured.
+
+    Each board is a member -> score dict plus a skip list of `(score, member)` in
+    ascending order; reads index it from the end, which matches the order (and tie
+    breaking) of Redis' ZREVRANGE. Boards are per process, so with several workers
+    each only sees its own writes on top of the startup load.
+    """
+
+    def __init__(self):
+        self._boards = defaultdict(lambda: ({}, SkipList()))
+        self._markers = {}
+        self._claims = set()
+
+    def _set(self, board: LeaderboardType, user_account: str, score: int):
+        scores, ranking = self._boards[board]
+        previous = scores.get(user_account)
+        if previous == score:
+            return
+        if previous is not None:
+            ranking.remove((previous, user_account))
+        scores[user_account] = score
+        ranking.insert((score, user_account))
+
+    async def set_scores(self, user_account: str, scores: dict):
+        for board, score in scores.items():
+            self._set(board, user_account, score)
+
+    async def increment(self, board: LeaderboardType, entries: list):
+        scores = self._boards[board][0]
+        for user_account, amount in entries:
+            self._set(board, user_account, scores.get(user_account, 0) + amount)
+
+    async def prune(self, board: LeaderboardType):
+        scores, ranking = self._boards[board]
+        emptied = []
+        for score, user_account in ranking.slice(0, len(ranking)):
+            if score > 0:
+                break
+            emptied.append((score, user_account))
+        for score, user_account in emptied:
+            ranking.remove((score, user_account))
+            del scores[user_account]
+
+    async def load(self, board: LeaderboardType, entries: list):
+        for user_account, score in entries:
+            self._set(board, user_account, score)
+
+    async def replace(self, board: LeaderboardType, entries: list):
+        self._boards.pop(board, None)
+        await self.load(board, entries)
+
+    async def size(self, board: LeaderboardType) -> int:
+        return len(self._boards[board][1])
+
+    async def top(self, board: LeaderboardType, start: int, count: int) -> list:
+        ranking = self._boards[board][1]
+        stop = len(ranking) - start
+        first = max(stop - count, 0)
+        entries = list(ranking.slice(first, stop - first))
+        return [(user_account, score) for score, user_account in reversed(entries)]
+
+    async def rank(self, board: LeaderboardType, user_account: str) -> Optional[tuple]:
+        scores, ranking = self._boards[board]
+        score = scores.get(user_account)
+        if score is None:
+            return None
+        return len(ranking) - 1 - ranking.rank((score, user_account)), score
+
+    async def get_marker(self, name: str) -> Optional[str]:
+        return self._markers.get(name)
+
+    async def set_marker(self, name: str, value: str):
+        self._markers[name] = value
+
+    async def claim(self, name: str, ttl: int) -> bool:
+        if name in self._claims:
+            return False
+        self._claims.add(name)
+        return True
+
+
+_memory_store = MemoryLeaderboardStore()
+
+
+async def get_leaderboard_store():
+    """The Redis-backed store when Redis is reachable, otherwise the in-process one."""
+    client = await get_redis()
+    return RedisLeaderboardStore(client) if client is not None else _memory_store
+
+
+def current_hour() -> datetime:
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+
+async def add_generations_to_buckets(generations: dict, db: AsyncSession):
+    """
+    Count `{user_account: generations}` in each user's bucket for the current hour,
+    with one statement (committed by the caller).
+    """
+    if not generations:
+        return
+    stmt = insert_for(db, models.GenerationBucket).values([
+        {"user_account": user_account, "bucket_start": current_hour(), "generations": count}
+        for user_account, count in generations.items()
+    ])
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['user_account', 'bucket_start'],
+            set_={'generations': models.GenerationBucket.generations + stmt.excluded.generations},
+        )
+    )
+
+
+async def record_user_stats(user_stat: models.UserStats, generations: int = 1):
+    """Push a user's current stats into the leaderboards after `generations` new generations."""
+    store = await get_leaderboard_store()
+    await store.set_scores(
+        user_stat.user_account,
+        {board: getattr(user_stat, column.key) or 0 for board, column in BOARD_COLUMNS.items()},
+    )
+    await store.increment(LeaderboardType.GENERATIONS_24H, [(user_stat.user_account, generations)])
+
+
+_window_checked_hour = None
+
+
+async def advance_generations_window():
+    """
+    Slide the rolling 24h board forward to the current hour.
+
+    Every hourly bucket that has left the window since the last check is subtracted
+    from the board, each exactly once across workers, and users left with nothing
+    are dropped. The board is rebuilt from the buckets instead if it was never
+    loaded or is more than a window behind; one worker claims the rebuild and swaps
+    the new board in whole. Only the first call each hour in a process does any work.
+    """
+    global _window_checked_hour
+    hour = current_hour()
+    if _window_checked_hour == hour:
+        return
+
+    board = LeaderboardType.GENERATIONS_24H
+    newest_expired = hour - timedelta(hours=WINDOW_HOURS)
+    store = await get_leaderboard_store()
+    marker = await store.get_marker(WINDOW_MARKER)
+    expired_through = datetime.fromisoformat(marker) if marker else None
+
+    async with AsyncSessionLocal() as db:
+        if expired_through is None or newest_expired - expired_through > timedelta(hours=WINDOW_HOURS):
+            if not await store.claim(f"{WINDOW_MARKER}:rebuild:{newest_expired.isoformat()}", REBUILD_KEY_SECONDS):
+                # Another worker is rebuilding it for this hour and sets the marker when done
+                _window_checked_hour = hour
+                return
+            result = await db.execute(
+                select(models.GenerationBucket.user_account, func.sum(models.GenerationBucket.generations))
+                .filter(models.GenerationBucket.bucket_start > newest_expired)
+                .group_by(models.GenerationBucket.user_account)
+            )
+            await store.replace(board, [(user_account, int(total)) for user_account, total in result.all()])
+        else:
+            bucket_start = expired_through + timedelta(hours=1)
+            while bucket_start <= newest_expired:
+                if await store.claim(f"{WINDOW_MARKER}:{bucket_start.isoformat()}", GENERATION_BUCKET_RETENTION_HOURS * 3600):
+                    result = await db.execute(
+                        select(models.GenerationBucket.user_account, models.GenerationBucket.generations)
+                        .filter(models.GenerationBucket.bucket_start == bucket_start)
+                    )
+                    await store.increment(board, [(user_account, -generations) for user_account, generations in result.all()])
+                bucket_start += timedelta(hours=1)
+            await store.prune(board)
+
+    if expired_through is None or newest_expired > expired_through:
+        await store.set_marker(WINDOW_MARKER, newest_expired.isoformat())
+    _window_checked_hour = hour
+
+
+def compact_generation_buckets(db: Session) -> int:
+    """
+    Delete hourly generation buckets older than GENERATION_BUCKET_RETENTION_HOURS.
+    Returns the number of buckets removed.
+    """
+    cutoff = current_hour() - timedelta(hours=GENERATION_BUCKET_RETENTION_HOURS)
+    result = db.execute(
+        delete(models.GenerationBucket)
+        .where(models.GenerationBucket.bucket_start < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount
+
+
+async def warm_leaderboards(db: AsyncSession):
+    """
+    Load the leaderboards from `user_stats` when they are empty, e.g. on the first
+    start against a fresh Redis or on every start with the in-process store.
+    """
+    store = await get_leaderboard_store()
+    for board, column in BOARD_COLUMNS.items():
+        if await store.size(board):
+            continue
+        result = await db.execute(select(models.UserStats.user_account, column))
+        await store.load(board, [(user_account, score or 0) for user_account, score in result.all()])
+
+    await advance_generations_window()
+
+
+def page_start(page: int, page_size: int, cursor: Optional[str] = None) -> int:
+    """
+    The position a leaderboard page starts at: the one in `cursor`, else the `page`th
+    page's. Raises a 400 for a negative position, which the stores would count from the end.
+    """
+    start = decode_cursor(cursor, RANK_CURSOR)[0] if cursor else (page - 1) * page_size
+    if not isinstance(start, int) or isinstance(start, bool) or start < 0:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor" if cursor else "Invalid page")
+    return start
+
+
+async def get_leaderboard_page(board: LeaderboardType, start: int, count: int) -> tuple:
+    """`count` entries from position `start`, highest first, and the board size."""
+    if board == LeaderboardType.GENERATIONS_24H:
+        await advance_generations_window()
+    store = await get_leaderboard_store()
+    return await store.top(board, start, count), await store.size(board)
+
+
+async def get_rank_with_neighbors(board: LeaderboardType, user_account: str, radius: int) -> Optional[dict]:
+    """
+    A user's 1-based rank and score plus up to `radius` users on either side of them,
+    or None if the user is not on the board.
+    """
+    if board == LeaderboardType.GENERATIONS_24H:
+        await advance_generations_window()
+    store = await get_leaderboard_store()
+    position = await store.rank(board, user_account)
+    if position is None:
+        return None
+
+    rank, score = position
+    first = max(rank - radius, 0)
+    neighbors = await store.top(board, first, rank - first + radius + 1)
 
+    return {
+        "rank": rank + 1,
+        "score": score,
+        "total": await store.size(board),
+        "neighbors": [
+            {"rank": first + i + 1, "user_account": account, "score": value}
+            for i, (account, value) in enumerate(neighbors)
+        ],
+    }
@@ -1,5 +1,8 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from scalar_fastapi import get_scalar_api_reference
 
@@ -8,10 +11,60 @@ from app.prompts.routes import router as prompts_router
 from app.leaderboard.routes import router as leaderboard_router
 from app.marketplace.routes import router as marketplace_router
 from app.encrypt.routes import router as encrypt_router
+from app.core.database import ReadSessionLocal, async_engine, replica_async_engine
+from app.core.cache import response_cache
+from app.core.redis_client import close_redis, get_redis
+from app.core.metrics import load_task_durations, metrics_middleware, render_metrics
+from app.core.query_stats import get_query_metrics, query_stats_middleware
+from app.core.constants import LIKE_WRITE_BEHIND, USER_STATS_COALESCE
+from app.leaderboard.services import warm_leaderboards
+from app.prompts.autocomplete import load_autocomplete, run_autocomplete_refresher
+from app.socialfeed.services import flush_buffered_likes, flush_user_stats, run_like_flusher, run_user_stats_flusher
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fill the leaderboards from user_stats if this is a fresh Redis or the in-process fallback
+    try:
+        async with ReadSessionLocal() as db:
+            await warm_leaderboards(db)
+    except Exception as e:
+        print(f"Error warming leaderboards: {e}")
+    # Fill the autocomplete index from the Redis snapshot, or the database without one
+    try:
+        await load_autocomplete()
+    except Exception as e:
+        print(f"Error loading autocomplete: {e}")
+    # Drop this worker's cached responses when another worker invalidates them
+    invalidation_listener = asyncio.create_task(response_cache.listen_for_invalidations())
+    like_flusher = asyncio.create_task(run_like_flusher()) if LIKE_WRITE_BEHIND else None
+    user_stats_flusher = asyncio.create_task(run_user_stats_flusher()) if USER_STATS_COALESCE else None
+    autocomplete_refresher = asyncio.create_task(run_autocomplete_refresher())
+    yield
+    invalidation_listener.cancel()
+    autocomplete_refresher.cancel()
+    if like_flusher is not None:
+        like_flusher.cancel()
+        # Write what is buffered now; anything left stays in Redis for the next worker
+        try:
+            await flush_buffered_likes()
+        except Exception as e:
+            print(f"Error flushing buffered likes: {e}")
+    if user_stats_flusher is not None:
+        user_stats_flusher.cancel()
+        # Generations are buffered in-process, so count them before the worker exits
+        try:
+            await flush_user_stats()
+        except Exception as e:
+            print(f"Error flushing user stats: {e}")
+    await close_redis()
+    # Close pooled async connections so workers (and aiosqlite threads) shut down cleanly
+    await async_engine.dispose()
+    if replica_async_engine is not None:
+        await replica_async_engine.dispose()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/scalar", include_in_schema=False)
 async def scalar_html():
@@ -20,6 +73,9 @@ async def scalar_html():
         title=app.title,
     )
 
+app.middleware("http")(query_stats_middleware)
+app.middleware("http")(metrics_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -41,6 +97,30 @@ def read_root():
     return {"Hello": "Service is live"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus text-format metrics: request latency, counts and errors per route,
+    connection pool usage and checkout waits, Celery task durations and cache hit ratios.
+    """
+    client = await get_redis()
+    if client is not None:
+        try:
+            await load_task_durations(client)
+        except Exception as e:
+            print(f"Error loading task metrics: {e}")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/queries", include_in_schema=False)
+async def query_metrics():
+    """
+    SQL statements per route since startup: request and query counts, DB time,
+    requests over the query budget and the statements most often repeated (N+1 suspects).
+    """
+    return get_query_metrics()
+
+
 app.include_router(socialfeed_router, prefix="/socialfeed")
 app.include_router(prompts_router, prefix="/prompts")
 app.include_router(leaderboard_router, prefix="/leaderboard")
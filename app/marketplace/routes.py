@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 import random
-from app.core.database import get_session
+from app.core.database import get_async_session
 from . import schemas, services    
-from app.prompts import models
-from sqlalchemy import func, select, desc
-from app.socialfeed import models as socialfeed_models
-from app.core.helpers import paginate
+from app.prompts.services import (
+    PREMIUM_PROMPTS_TAG, PREMIUM_TRENDING_TAG, creator_cache_tag, listing_cache_tags, shuffle_start,
+)
+from app.prompts import autocomplete, models, search
+from sqlalchemy import select
+from app.core.helpers import ROTATION_CURSOR, decode_cursor, paginate_keyset, paginate_rotation
 from app.core.enums.premium_filters import PremiumPromptFilterType
-from app.socialfeed.services import update_user_stats
+from app.socialfeed.services import publish_user_stats, update_user_stats, with_viewer_flags
+from app.celery.celery import enqueue, fan_out_prompt_task
+from app.core.cache import cached, response_cache
+from app.core.constants import MAX_PAGE_SIZE
+from app.core.replica import mark_recent_write
 
 
 
@@ -18,7 +25,7 @@ router = APIRouter()
 
 
 @router.post("/add-premium-prompts/", response_model=schemas.PremiumPromptResponse)
-async def add_premium_prompt(premium_data: schemas.PremiumPromptCreate, db: Session = Depends(get_session)):
+async def add_premium_prompt(premium_data: schemas.PremiumPromptCreate, db: AsyncSession = Depends(get_async_session)):
     """
     Add a new premium prompt in the marketplace.
 
@@ -52,13 +59,25 @@ async def add_premium_prompt(premium_data: schemas.PremiumPromptCreate, db: Sess
         )
 
         db.add(new_premium_prompt)
-        db.commit()
-        db.refresh(new_premium_prompt)
 
-        # Update user stats (generation count and XP)
-        update_user_stats(new_premium_prompt.account_address, db)
-        likes_count = db.query(socialfeed_models.PostLike).filter(socialfeed_models.PostLike.prompt_id == new_premium_prompt.id).count()
-        comments_count = db.query(socialfeed_models.PostComment).filter(socialfeed_models.PostComment.prompt_id == new_premium_prompt.id).count()
+        # Count the generation and XP in the same transaction as the prompt
+        user_stats = await update_user_stats(new_premium_prompt.account_address, db)
+
+        await db.commit()
+        await db.refresh(new_premium_prompt)
+        # The creator reads from the primary until the replica has the prompt
+        await mark_recent_write(new_premium_prompt.account_address)
+        search.index_new_prompt(new_premium_prompt, db)
+        await autocomplete.add_prompt_completions(new_premium_prompt)
+
+        # Every cached premium listing, and the creator's top prompts, may now be missing the new prompt
+        await response_cache.invalidate(PREMIUM_PROMPTS_TAG, creator_cache_tag(new_premium_prompt.account_address))
+
+        # Push the prompt into the creator's followers' timelines
+        await enqueue(fan_out_prompt_task, new_premium_prompt.id)
+
+        # Update the leaderboards with the committed stats
+        await publish_user_stats(user_stats)
 
         # Return the response using the Pydantic model schema
         return schemas.PremiumPromptResponse(
@@ -74,8 +93,8 @@ async def add_premium_prompt(premium_data: schemas.PremiumPromptCreate, db: Sess
             collection_name=new_premium_prompt.collection_name,
             max_supply=new_premium_prompt.max_supply,
             prompt_nft_price=new_premium_prompt.prompt_nft_price,
-            likes=likes_count or 0,
-            comments=comments_count or 0,
+            likes=new_premium_prompt.likes_count,
+            comments=new_premium_prompt.comments_count,
             grant_access=new_premium_prompt.grant_access or False
         )
     except Exception as e:
@@ -91,22 +110,36 @@ async def add_premium_prompt(premium_data: schemas.PremiumPromptCreate, db: Sess
 
 
 @router.get("/get-premium-prompts/", response_model=schemas.PremiumPromptListResponse)
-async def get_premium_prompts(page: int = 1, page_size: int = 10, db: Session = Depends(get_session)):
+@with_viewer_flags(models.PromptTypeEnum.PREMIUM)
+@cached("get-premium-prompts", listing_cache_tags(PREMIUM_PROMPTS_TAG))
+async def get_premium_prompts(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
     """
-    Get all premium prompts.
+    Get all premium prompts, newest first.
+
+    - **page** / **page_size**: Offset pagination, kept for existing clients.
+    - **cursor**: `next_cursor` from the previous page; pages by keyset instead of offset.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
     """
+    after = decode_cursor(cursor, models.RECENT_FIRST) if cursor else None
+
     try:
         # Query for premium prompts and order by created_at in descending order
-        query = db.query(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PREMIUM).order_by(models.Prompt.created_at.desc())
+        query = select(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PREMIUM)
     
-        total_prompts = query.count()
-        paginated_prompts = query.offset((page - 1) * page_size).limit(page_size).all()
+        result_page = await paginate_keyset(
+            db, query, models.RECENT_FIRST, page_size, after=after, page=page, include_total=include_total
+        )
+        paginated_prompts = result_page.items
 
         prompts_with_counts = []
         for prompt in paginated_prompts:
-            likes_count = db.query(socialfeed_models.PostLike).filter(socialfeed_models.PostLike.prompt_id == prompt.id).count()
-            comments_count = db.query(socialfeed_models.PostComment).filter(socialfeed_models.PostComment.prompt_id == prompt.id).count()
-
             prompts_with_counts.append(
                 schemas.PremiumPromptResponse(
                     id=prompt.id,
@@ -121,8 +154,8 @@ async def get_premium_prompts(page: int = 1, page_size: int = 10, db: Session =
                     collection_name=prompt.collection_name,
                     max_supply=prompt.max_supply,
                     prompt_nft_price=prompt.prompt_nft_price,
-                    likes=likes_count or 0,
-                    comments=comments_count or 0,
+                    likes=prompt.likes_count,
+                    comments=prompt.comments_count,
                     grant_access=prompt.grant_access or False
                 )
             )
@@ -130,9 +163,10 @@ async def get_premium_prompts(page: int = 1, page_size: int = 10, db: Session =
         
         return schemas.PremiumPromptListResponse(
             prompts=prompts_with_counts,
-            total=total_prompts,
+            total=result_page.total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=result_page.next_cursor
         )
     except Exception as e:
         detail = {
@@ -160,46 +194,57 @@ async def get_premium_prompt_filters():
 
 
 
+def _filter_cache_tags(response: dict, params: dict) -> list:
+    # Trending pages are reordered whenever trending scores are refreshed
+    if params["filter_data"].filter_type == PremiumPromptFilterType.TRENDING:
+        return listing_cache_tags(PREMIUM_PROMPTS_TAG, PREMIUM_TRENDING_TAG)(response, params)
+    return listing_cache_tags(PREMIUM_PROMPTS_TAG)(response, params)
+
+
 @router.post("/filter-premium-prompts/", response_model=schemas.PremiumPromptListResponse)
-async def filter_premium_prompts(filter_data: schemas.PremiumPromptFilterRequest, db: Session = Depends(get_session)):
+@with_viewer_flags(models.PromptTypeEnum.PREMIUM)
+@cached("filter-premium-prompts", _filter_cache_tags)
+async def filter_premium_prompts(filter_data: schemas.PremiumPromptFilterRequest, db: AsyncSession = Depends(get_async_session)):
+    """
+    Filter premium prompts by `recent`, `popular` or `trending`.
+
+    Pages can be requested by `page` or by the `cursor` returned as `next_cursor`
+    on the previous page. `popular` is served in a shuffled order that stays stable
+    while paging and rotates daily. `trending` ranks prompts by recent likes and
+    comments, each losing half its weight every TRENDING_HALF_LIFE_HOURS.
+
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
+    """
+    order_by = models.RECENT_FIRST
+    if filter_data.filter_type == PremiumPromptFilterType.TRENDING:
+        order_by = models.TRENDING_FIRST
+    elif filter_data.filter_type == PremiumPromptFilterType.POPULAR:
+        order_by = ROTATION_CURSOR
+    after = decode_cursor(filter_data.cursor, order_by) if filter_data.cursor else None
+
     try:
-        query = db.query(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PREMIUM)
+        query = select(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PREMIUM)
 
         # Filter by `recent`, `popular`, or `trending`
         if filter_data.filter_type == PremiumPromptFilterType.RECENT:
             last_24_hours = datetime.utcnow() - timedelta(hours=24)
             query = query.filter(models.Prompt.created_at >= last_24_hours)
-        elif filter_data.filter_type == PremiumPromptFilterType.POPULAR:
-            query = query.order_by(func.random())
-        elif filter_data.filter_type == PremiumPromptFilterType.TRENDING:
-            query = query.outerjoin(socialfeed_models.PostLike).group_by(models.Prompt.id).order_by(func.count(socialfeed_models.PostLike.id).desc())
-
-        total_prompts = query.count()
-        paginated_prompts = query.offset((filter_data.page - 1) * filter_data.page_size).limit(filter_data.page_size).all()
-
-        prompt_ids = [prompt.id for prompt in paginated_prompts]
-
-        # Batch query for likes and comments count
-        likes_comments_data = (
-            db.query(
-                models.Prompt.id,
-                func.count(socialfeed_models.PostLike.id).label('likes_count'),
-                func.count(socialfeed_models.PostComment.id).label('comments_count')
-            )
-            .outerjoin(socialfeed_models.PostLike, socialfeed_models.PostLike.prompt_id == models.Prompt.id)
-            .outerjoin(socialfeed_models.PostComment, socialfeed_models.PostComment.prompt_id == models.Prompt.id)
-            .filter(models.Prompt.id.in_(prompt_ids))
-            .group_by(models.Prompt.id)
-            .all()
-        )
 
-        # Map likes and comments count by prompt ID, with index-based access
-        likes_comments_map = {lc[0]: {'likes_count': lc[1], 'comments_count': lc[2]} for lc in likes_comments_data}
+        if filter_data.filter_type == PremiumPromptFilterType.POPULAR:
+            result_page = await paginate_rotation(
+                db, query, models.Prompt.shuffle_key, models.Prompt.id, shuffle_start(PremiumPromptFilterType.POPULAR.value),
+                filter_data.page_size, after=after, page=filter_data.page, include_total=filter_data.include_total
+            )
+        else:
+            result_page = await paginate_keyset(
+                db, query, order_by, filter_data.page_size,
+                after=after, page=filter_data.page, include_total=filter_data.include_total
+            )
+        paginated_prompts = result_page.items
 
         # Prepare the response
         prompts_with_counts = []
         for prompt in paginated_prompts:
-            likes_comments = likes_comments_map.get(prompt.id, {'likes_count': 0, 'comments_count': 0})
             prompts_with_counts.append(
                 schemas.PremiumPromptResponse(
                     id=prompt.id,
@@ -214,17 +259,18 @@ async def filter_premium_prompts(filter_data: schemas.PremiumPromptFilterRequest
                     collection_name=prompt.collection_name,
                     max_supply=prompt.max_supply,
                     prompt_nft_price=prompt.prompt_nft_price,
-                    likes=likes_comments['likes_count'],
-                    comments=likes_comments['comments_count'],
+                    likes=prompt.likes_count,
+                    comments=prompt.comments_count,
                     grant_access=prompt.grant_access
                 )
             )
 
         return schemas.PremiumPromptListResponse(
             prompts=prompts_with_counts,
-            total=total_prompts,
+            total=result_page.total,
             page=filter_data.page,
-            page_size=filter_data.page_size
+            page_size=filter_data.page_size,
+            next_cursor=result_page.next_cursor
         )
     except Exception as e:
         detail = {
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional
+from app.core.constants import MAX_PAGE_SIZE
 from app.core.enums.tags import PromptTagEnum
 from app.core.enums.premium_filters import PremiumPromptFilterType
 
@@ -36,6 +37,8 @@ class PremiumPromptResponse(BaseModel):
     prompt_nft_price: float
     likes: Optional[int]
     comments: Optional[int]
+    user_liked: Optional[bool] = None  # Set when the listing is requested with a viewer_account
+    following_creator: Optional[bool] = None  # Set when the listing is requested with a viewer_account
 
     class Config:
         from_attributes = True
@@ -43,14 +46,17 @@ class PremiumPromptResponse(BaseModel):
 
 class PremiumPromptListResponse(BaseModel):
     prompts: list[PremiumPromptResponse]
-    total: int  # Total number of premium prompts
+    total: Optional[int] = None  # Total number of premium prompts, omitted for cursor pages unless requested
     page: int  # Current page number
     page_size: int  # Number of prompts per page
+    next_cursor: Optional[str] = None  # Cursor for the next page, None on the last page
 
     class Config:
         from_attributes = True
 
 class PremiumPromptFilterRequest(BaseModel):
     filter_type: Optional[PremiumPromptFilterType] = Field(None, description="Filter by 'recent', 'popular', or 'trending'")
-    page: Optional[int] = Field(1, description="Page number for pagination")
-    page_size: Optional[int] = Field(10, description="Number of premium prompts per page")
\ No newline at end of file
+    page: Optional[int] = Field(1, ge=1, description="Page number for pagination")
+    page_size: Optional[int] = Field(10, ge=1, le=MAX_PAGE_SIZE, description="Number of premium prompts per page")
+    cursor: Optional[str] = Field(None, description="Cursor from a previous page's `next_cursor`; takes precedence over `page`")
+    include_total: Optional[bool] = Field(None, description="Count the total; defaults to true for page-based and false for cursor-based requests")
\ No newline at end of file
@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.constants import AUTOCOMPLETE_DB_RELOAD_SECONDS, AUTOCOMPLETE_REFRESH_SECONDS
+from app.core.database import ReadSessionLocal
+from app.core.enums.autocomplete import AutocompleteField
+from app.core.redis_client import get_redis, get_sync_redis
+from .models import Prompt
+
+# Most completions returned for one prefix
+MAX_COMPLETIONS = 20
+# Prefixes matching at least this many values have their top completions memoized
+MEMO_MIN_MATCHES = 64
+
+FIELD_COLUMNS = {
+    AutocompleteField.POST_NAME: Prompt.post_name,
+    AutocompleteField.COLLECTION_NAME: Prompt.collection_name,
+    AutocompleteField.CREATOR: Prompt.account_address,
+}
+
+# The snapshot: one Redis hash per field (value -> popularity), plus when it was built
+SNAPSHOT_BUILT_AT_KEY = "autocomplete:built_at"
+
+
+def _snapshot_key(field: AutocompleteField) -> str:
+    return f"autocomplete:{field.value}"
+
+
+class PrefixIndex:
+    """
+    The values of one field in case-insensitive sorted order, with their popularity.
+    A prefix's matches are one contiguous range found by binary search. The most
+    popular of a large range are memoized until a value under that prefix is added.
+    """
+
+    def __init__(self):
+        self._keys = []  # casefolded values, sorted
+        self._values = []
+        self._popularity = []
+        self._memo = {}  # prefix -> [(value, popularity), ...], at most MAX_COMPLETIONS
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, popularity: dict):
+        """Replace the contents with `{value: popularity}`."""
+        entries = sorted((value.casefold(), value, score) for value, score in popularity.items() if value)
+        self._keys = [key for key, _, _ in entries]
+        self._values = [value for _, value, _ in entries]
+        self._popularity = [score for _, _, score in entries]
+        self._memo = {}
+
+    def add(self, value: str, popularity: int = 0):
+        """Insert `value` unless it is already indexed."""
+        if not value:
+            return
+        key = value.casefold()
+        position = bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key:
+            if self._values[position] == value:
+                return
+            position += 1
+        self._keys.insert(position, key)
+        self._values.insert(position, value)
+        self._popularity.insert(position, popularity)
+        # Only the prefixes of the new value can have a different top now
+        for end in range(len(key) + 1):
+            self._memo.pop(key[:end], None)
+
+    def complete(self, prefix: str, limit: int = 10) -> list:
+        """The `limit` most popular values starting with `prefix`, as `(value, popularity)`."""
+        key = prefix.casefold()
+        start = bisect_left(self._keys, key)
+        end = bisect_left(self._keys, key + "\U0010ffff", start)
+        if end - start < MEMO_MIN_MATCHES:
+            return self._top(start, end)[:limit]
+        top = self._memo.get(key)
+        if top is None:
+            top = self._memo[key] = self._top(start, end)
+        return top[:limit]
+
+    def _top(self, start: int, end: int) -> list:
+        # Ties go to the value that sorts first
+        positions = heapq.nlargest(
+            MAX_COMPLETIONS, range(start, end), key=lambda position: (self._popularity[position], -position)
+        )
+        return [(self._values[position], self._popularity[position]) for position in positions]
+
+
+# This worker's indexes, filled at startup and reloaded every AUTOCOMPLETE_REFRESH_SECONDS
+prefix_indexes = {field: PrefixIndex() for field in AutocompleteField}
+# When this worker last built its indexes from the database (time.monotonic())
+_db_loaded_at = None
+
+
+def _popularity_query(field: AutocompleteField):
+    # A value is as popular as the likes on all prompts carrying it
+    column = FIELD_COLUMNS[field]
+    return select(column, func.sum(Prompt.likes_count)).filter(column.isnot(None)).group_by(column)
+
+
+def build_snapshot(db: Session) -> dict:
+    """`{field: {value: popularity}}` for every field, read from the database."""
+    return {field: {value: int(score) for value, score in db.execute(_popularity_query(field))} for field in AutocompleteField}
+
+
+async def build_snapshot_async(db: AsyncSession) -> dict:
+    """`build_snapshot` for an async session."""
+    snapshot = {}
+    for field in AutocompleteField:
+        result = await db.execute(_popularity_query(field))
+        snapshot[field] = {value: int(score) for value, score in result.all()}
+    return snapshot
+
+
+def publish_snapshot(db: Session) -> int:
+    """
+    Rebuild the snapshot from the database and swap it into Redis, where every
+    worker picks it up on its next reload. Returns the number of values published.
+    """
+    client = get_sync_redis()
+    if client is None:
+        return 0
+    snapshot = build_snapshot(db)
+    with client.pipeline(transaction=True) as pipe:
+        for field, popularity in snapshot.items():
+            # Write aside and rename, so readers never see a half-written hash
+            staging_key = f"{_snapshot_key(field)}:staging"
+            pipe.delete(staging_key)
+            if popularity:
+                pipe.hset(staging_key, mapping=popularity)
+                pipe.rename(staging_key, _snapshot_key(field))
+            else:
+                pipe.delete(_snapshot_key(field))
+        pipe.set(SNAPSHOT_BUILT_AT_KEY, datetime.utcnow().isoformat())
+        pipe.execute()
+    return sum(len(popularity) for popularity in snapshot.values())
+
+
+async def _read_snapshot():
+    client = await get_redis()
+    if client is None:
+        return None
+    try:
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.exists(SNAPSHOT_BUILT_AT_KEY)
+            for field in AutocompleteField:
+                pipe.hgetall(_snapshot_key(field))
+            built, *hashes = await pipe.execute()
+    except Exception as e:
+        print(f"Error reading the autocomplete snapshot: {e}")
+        return None
+    if not built:
+        return None
+    return {
+        field: {value: int(score) for value, score in popularity.items()}
+        for field, popularity in zip(AutocompleteField, hashes)
+    }
+
+
+async def load_autocomplete():
+    """
+    Replace this worker's indexes with the Redis snapshot, or with a fresh build from
+    the database (the replica when configured) when there is no snapshot yet.
+
+    Without a snapshot the database build is only redone every
+    AUTOCOMPLETE_DB_RELOAD_SECONDS. In between, the indexes are kept and grow with
+    the prompts this worker adds; only popularity and other workers' prompts lag.
+    """
+    global _db_loaded_at
+    snapshot = await _read_snapshot()
+    if snapshot is None:
+        if _db_loaded_at is not None and time.monotonic() - _db_loaded_at < AUTOCOMPLETE_DB_RELOAD_SECONDS:
+            return
+        async with ReadSessionLocal() as db:
+            snapshot = await build_snapshot_async(db)
+        _db_loaded_at = time.monotonic()
+    for field, popularity in snapshot.items():
+        prefix_indexes[field].load(popularity)
+
+
+async def run_autocomplete_refresher():
+    """Reload the indexes every AUTOCOMPLETE_REFRESH_SECONDS (run for the app's lifetime)."""
+    try:
+        while True:
+            await asyncio.sleep(AUTOCOMPLETE_REFRESH_SECONDS)
+            try:
+                await load_autocomplete()
+            except Exception as e:
+                print(f"Error reloading autocomplete: {e}")
+    except asyncio.CancelledError:
+        pass
+
+
+async def add_prompt_completions(prompt: Prompt):
+    """
+    Make a new prompt's post name, collection and creator completable: at once in this
+    worker, and in the others on their next reload through the Redis snapshot.
+    """
+    values = {field: getattr(prompt, column.key) for field, column in FIELD_COLUMNS.items()}
+    for field, value in values.items():
+        prefix_indexes[field].add(value)
+
+    client = await get_redis()
+    if client is None:
+        return
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for field, value in values.items():
+                if value:
+                    pipe.hsetnx(_snapshot_key(field), value, 0)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Error adding prompt {prompt.id} to the autocomplete snapshot: {e}")
@@ -1,31 +1,110 @@
+import random
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, Enum, Float, DateTime
+from sqlalchemy import Column, String, Boolean, Integer, ForeignKey, Enum, Float, DateTime, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from app.core.database import Base  # Assuming you're using a Base class from SQLAlchemy setup
 from app.core.enums.tags import PromptTagEnum, PromptTypeEnum
 
 
+# Upper bound (exclusive) of `Prompt.shuffle_key`
+SHUFFLE_KEY_RANGE = 2**31 - 1
+
+
+def new_shuffle_key() -> int:
+    return random.randrange(SHUFFLE_KEY_RANGE)
+
+
+# Weighted full-text document of a prompt: post name (A), collection (B) and prompt text (C).
+# Search queries must use this exact expression for Postgres to use ix_prompts_search_document.
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english'::regconfig, coalesce(post_name, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(collection_name, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(prompt, '')), 'C')"
+)
+
+
+# Trending scores are kept relative to this instant (see app.prompts.services.trending_points)
+TRENDING_EPOCH = datetime(2024, 1, 1)
+
+
 class Prompt(Base):
     __tablename__ = 'prompts'
+    __table_args__ = (
+        # Serve the shuffled feeds and the `popular` filter as index range scans
+        Index('ix_prompts_prompt_type_shuffle_key', 'prompt_type', 'shuffle_key', 'id'),
+        Index('ix_prompts_account_address_shuffle_key', 'account_address', 'shuffle_key', 'id'),
+        # Listings filter by type (and tag/visibility) and read newest or trending first
+        Index('ix_prompts_prompt_type_created_at', 'prompt_type', 'created_at', 'id'),
+        Index('ix_prompts_prompt_type_prompt_tag_public_created_at', 'prompt_type', 'prompt_tag', 'public', 'created_at', 'id'),
+        Index('ix_prompts_prompt_type_trending_score', 'prompt_type', 'trending_score', 'id'),
+        Index('ix_prompts_account_address_created_at', 'account_address', 'created_at', 'id'),
+        # Each creator's most liked prompts, shown on follow lists
+        Index('ix_prompts_account_address_likes_count', 'account_address', 'likes_count', 'id'),
+        # /prompts/search: full-text matches plus fuzzy (trigram) name matches; Postgres only,
+        # other databases are searched in memory (see app.prompts.search)
+        Index('ix_prompts_search_document', text(f"({SEARCH_DOCUMENT})"), postgresql_using='gin').ddl_if(dialect='postgresql'),
+        Index(
+            'ix_prompts_post_name_trgm', 'post_name',
+            postgresql_using='gin', postgresql_ops={'post_name': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        Index(
+            'ix_prompts_collection_name_trgm', 'collection_name',
+            postgresql_using='gin', postgresql_ops={'collection_name': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     ipfs_image_url = Column(String, nullable=False)
     prompt = Column(String, nullable=False)
-    account_address = Column(String, nullable=False, index=True)
-    post_name = Column(String, nullable=False, index=True)
-    public = Column(Boolean, default=True, index=True)
-    cid = Column(String, nullable=True, index=True, default=None) # only relevant for PREMIUM prompts
-    prompt_tag = Column(Enum(PromptTagEnum), nullable=False, index=True)
-    chain = Column(String, nullable=True, index=True)
-    ai_model = Column(String, index=True, nullable=True)
-    prompt_type = Column(Enum(PromptTypeEnum), nullable=False, index=True)  # PUBLIC or PREMIUM
-    collection_name = Column(String, nullable=True, index=True)  # Only relevant for PREMIUM prompts
-    max_supply = Column(Integer, nullable=True, index=True)  # Only relevant for PREMIUM prompts
-    prompt_nft_price = Column(Float, nullable=True, index=True)  # Only relevant for PREMIUM prompts
-    grant_access = Column(Boolean, default=False, index=True) # Only relevant for PREMIUM prompts
-    video_url = Column(String, nullable=True, index=True) # Only premium promots
-    created_at = Column(DateTime, default=datetime.utcnow)
+    account_address = Column(String, nullable=False)
+    post_name = Column(String, nullable=False)
+    public = Column(Boolean, default=True)
+    cid = Column(String, nullable=True, default=None) # only relevant for PREMIUM prompts
+    prompt_tag = Column(Enum(PromptTagEnum), nullable=False)
+    chain = Column(String, nullable=True)
+    ai_model = Column(String, nullable=True)
+    prompt_type = Column(Enum(PromptTypeEnum), nullable=False)  # PUBLIC or PREMIUM
+    collection_name = Column(String, nullable=True)  # Only relevant for PREMIUM prompts
+    max_supply = Column(Integer, nullable=True)  # Only relevant for PREMIUM prompts
+    prompt_nft_price = Column(Float, nullable=True)  # Only relevant for PREMIUM prompts
+    grant_access = Column(Boolean, default=False) # Only relevant for PREMIUM prompts
+    video_url = Column(String, nullable=True) # Only premium promots
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    likes_count = Column(Integer, nullable=False, default=0, server_default='0')  # Maintained by like_prompt
+    comments_count = Column(Integer, nullable=False, default=0, server_default='0')  # Maintained by comment_prompt
+    shuffle_key = Column(Integer, nullable=False, default=new_shuffle_key)  # Random position for shuffled feeds, reshuffled by Celery beat
+    trending_score = Column(Float, nullable=False, default=0, server_default='0')  # Decayed activity, refreshed by Celery beat; 0 without activity
 
     # Relationships
     comments = relationship('PostComment', back_populates='prompt', cascade="all, delete-orphan")
-    likes = relationship('PostLike', back_populates='prompt', cascade="all, delete-orphan")
\ No newline at end of file
+    likes = relationship('PostLike', back_populates='prompt', cascade="all, delete-orphan")
+
+# Keyset sort key for prompt listings, newest first (id breaks created_at ties)
+RECENT_FIRST = (Prompt.created_at, Prompt.id)
+TRENDING_FIRST = (Prompt.trending_score, Prompt.id)
+SHUFFLED = (Prompt.shuffle_key, Prompt.id)
+
+
+class PromptActivityBucket(Base):
+    """
+    Likes and comments a prompt received within one clock hour. The `scored_*`
+    columns record how much of it is already in `Prompt.trending_score`.
+    """
+    __tablename__ = 'prompt_activity_buckets'
+    __table_args__ = (
+        UniqueConstraint('prompt_id', 'bucket_start', name='uq_prompt_activity_buckets_prompt_id_bucket_start'),
+        # Only buckets with activity not yet scored, so each refresh reads just those
+        Index(
+            'ix_prompt_activity_buckets_unscored', 'id',
+            postgresql_where=text('likes <> scored_likes OR comments <> scored_comments'),
+            sqlite_where=text('likes <> scored_likes OR comments <> scored_comments'),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    prompt_id = Column(Integer, ForeignKey('prompts.id', ondelete="CASCADE"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False, index=True)  # Start of the hour (UTC)
+    likes = Column(Integer, nullable=False, default=0, server_default='0')
+    comments = Column(Integer, nullable=False, default=0, server_default='0')
+    scored_likes = Column(Integer, nullable=False, default=0, server_default='0')
+    scored_comments = Column(Integer, nullable=False, default=0, server_default='0')
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.core.database import get_session
-from . import schemas, services, models
-from app.socialfeed import models as socialfeed_models
-from app.core.helpers import paginate
-from app.socialfeed.services import update_user_stats
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.database import get_async_session
+from . import autocomplete, schemas, search, services, models
+from app.core.helpers import decode_cursor, paginate_keyset
+from app.socialfeed.services import update_user_stats, with_viewer_flags
+from app.celery.celery import enqueue, fan_out_prompt_task
+from app.core.cache import cached, response_cache
+from app.core.constants import MAX_PAGE_SIZE
+from app.core.replica import mark_recent_write
+from app.core.enums.autocomplete import AutocompleteField
 
 
 
@@ -13,7 +18,7 @@ router = APIRouter()
 
 
 @router.post("/add-public-prompts/", response_model=schemas.PublicPromptResponse)
-async def add_public_prompt(public_data: schemas.PublicPromptCreate, db: Session = Depends(get_session)):
+async def add_public_prompt(public_data: schemas.PublicPromptCreate, db: AsyncSession = Depends(get_async_session)):
     """
     Add a new public prompt to the database.
     """
@@ -30,12 +35,20 @@ async def add_public_prompt(public_data: schemas.PublicPromptCreate, db: Session
         )
 
         db.add(new_prompt)
-        db.commit()
-        db.refresh(new_prompt)
+        await db.commit()
+        await db.refresh(new_prompt)
+        # The creator reads from the primary until the replica has the prompt
+        await mark_recent_write(new_prompt.account_address)
+        search.index_new_prompt(new_prompt, db)
+        await autocomplete.add_prompt_completions(new_prompt)
+
+        # Every cached public listing, and the creator's top prompts, may now be missing the new prompt
+        await response_cache.invalidate(
+            services.PUBLIC_PROMPTS_TAG, services.creator_cache_tag(new_prompt.account_address)
+        )
 
-        # Count likes and comments (initially they are 0 since it's a new prompt)
-        likes_count = db.query(socialfeed_models.PostLike).filter(socialfeed_models.PostLike.prompt_id == new_prompt.id).count()
-        comments_count = db.query(socialfeed_models.PostComment).filter(socialfeed_models.PostComment.prompt_id == new_prompt.id).count()
+        # Push the prompt into the creator's followers' timelines
+        await enqueue(fan_out_prompt_task, new_prompt.id)
 
         # Return the response
         return schemas.PublicPromptResponse(
@@ -46,8 +59,8 @@ async def add_public_prompt(public_data: schemas.PublicPromptCreate, db: Session
             post_name=new_prompt.post_name,
             public=new_prompt.public,
             prompt_tag=new_prompt.prompt_tag,
-            likes_count=likes_count,
-            comments_count=comments_count
+            likes_count=new_prompt.likes_count,
+            comments_count=new_prompt.comments_count
         )
     except Exception as e:
         detail = {
@@ -75,43 +88,37 @@ async def get_prompt_tags():
 
 
 @router.get("/get-public-prompts/", response_model=schemas.PublicPromptListResponse)
-async def get_public_prompts(page: int = 1, page_size: int = 10, db: Session = Depends(get_session)):
-    # Query for all public prompts, ordered by creation date
-    query = db.query(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PUBLIC).order_by(models.Prompt.created_at.desc())
-
-    # Get total count for pagination
-    total_prompts = query.count()
+@with_viewer_flags(models.PromptTypeEnum.PUBLIC)
+@cached("get-public-prompts", services.listing_cache_tags(services.PUBLIC_PROMPTS_TAG))
+async def get_public_prompts(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Get public prompts, newest first.
 
-    # Apply pagination
-    public_prompts = query.offset((page - 1) * page_size).limit(page_size).all()
+    - **page** / **page_size**: Offset pagination, kept for existing clients.
+    - **cursor**: `next_cursor` from the previous page; pages by keyset instead of offset.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
+    """
+    after = decode_cursor(cursor, models.RECENT_FIRST) if cursor else None
 
-    # Get all prompt IDs for bulk fetching likes and comments
-    prompt_ids = [prompt.id for prompt in public_prompts]
+    # Query for all public prompts, ordered by creation date
+    query = select(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PUBLIC)
 
-    # Fetch likes and comments in bulk for all prompts
-    likes_comments_data = (
-        db.query(
-            models.Prompt.id,
-            func.count(socialfeed_models.PostLike.id).label('likes_count'),
-            func.count(socialfeed_models.PostComment.id).label('comments_count')
-        )
-        .outerjoin(socialfeed_models.PostLike, socialfeed_models.PostLike.prompt_id == models.Prompt.id)
-        .outerjoin(socialfeed_models.PostComment, socialfeed_models.PostComment.prompt_id == models.Prompt.id)
-        .filter(models.Prompt.id.in_(prompt_ids))
-        .group_by(models.Prompt.id)
-        .all()
+    # Apply pagination
+    result_page = await paginate_keyset(
+        db, query, models.RECENT_FIRST, page_size, after=after, page=page, include_total=include_total
     )
+    public_prompts = result_page.items
 
-    # Create a mapping for likes and comments based on the fetched data
-    likes_comments_map = {lc[0]: lc for lc in likes_comments_data}
-
-    # Construct the response with counts
+    # Construct the response with the denormalized like and comment counters
     prompts_with_counts = []
     for prompt in public_prompts:
-        likes_comments = likes_comments_map.get(prompt.id, None)
-        likes_count = likes_comments.likes_count if likes_comments else 0
-        comments_count = likes_comments.comments_count if likes_comments else 0
-
         prompts_with_counts.append(
             schemas.PublicPromptResponse(
                 id=prompt.id,
@@ -121,21 +128,24 @@ async def get_public_prompts(page: int = 1, page_size: int = 10, db: Session = D
                 post_name=prompt.post_name,
                 public=prompt.public,
                 prompt_tag=prompt.prompt_tag,
-                likes_count=likes_count,
-                comments_count=comments_count
+                likes_count=prompt.likes_count,
+                comments_count=prompt.comments_count
             )
         )
 
     # Return the list wrapped in the `PublicPromptListResponse` schema
     return schemas.PublicPromptListResponse(
         prompts=prompts_with_counts,
-        total=total_prompts,
+        total=result_page.total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=result_page.next_cursor
     )
 
 @router.post("/filter-public-prompts/", response_model=schemas.PublicPromptListResponse)
-async def filter_public_prompts(filter_data: schemas.PublicPromptFilterRequest, db: Session = Depends(get_session)):
+@with_viewer_flags(models.PromptTypeEnum.PUBLIC)
+@cached("filter-public-prompts", services.listing_cache_tags(services.PUBLIC_PROMPTS_TAG))
+async def filter_public_prompts(filter_data: schemas.PublicPromptFilterRequest, db: AsyncSession = Depends(get_async_session)):
     """
     Endpoint to filter public prompts with optional filtering by prompt tag and visibility.
 
@@ -143,10 +153,15 @@ async def filter_public_prompts(filter_data: schemas.PublicPromptFilterRequest,
     - **public**: Boolean flag to filter prompts by visibility. If `True`, returns only public prompts; if `False**, returns private ones.
     - **page**: Page number for pagination. Default is 1.
     - **page_size**: Number of prompts per page. Default is 10.
+    - **cursor**: `next_cursor` from the previous page; pages by keyset instead of offset.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
 
-    Returns a paginated list of public prompts matching the provided criteria.
+    Returns a paginated list of public prompts matching the provided criteria, newest first.
     """
-    query = db.query(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PUBLIC)
+    after = decode_cursor(filter_data.cursor, models.RECENT_FIRST) if filter_data.cursor else None
+
+    query = select(models.Prompt).filter(models.Prompt.prompt_type == models.PromptTypeEnum.PUBLIC)
     
     # Filter by prompt_tag if it's not set to "all"
     if filter_data.prompt_tag and filter_data.prompt_tag.lower() != 'all':
@@ -157,36 +172,15 @@ async def filter_public_prompts(filter_data: schemas.PublicPromptFilterRequest,
         query = query.filter(models.Prompt.public == filter_data.public)
     
     # Apply pagination
-    total_prompts = query.count()
-    paginated_prompts = query.offset((filter_data.page - 1) * filter_data.page_size).limit(filter_data.page_size).all()
-    
-    # Get all prompt IDs for bulk fetching likes and comments
-    prompt_ids = [prompt.id for prompt in paginated_prompts]
-
-    # Fetch likes and comments in bulk for all prompts
-    likes_comments_data = (
-        db.query(
-            models.Prompt.id,
-            func.count(socialfeed_models.PostLike.id).label('likes_count'),
-            func.count(socialfeed_models.PostComment.id).label('comments_count')
-        )
-        .outerjoin(socialfeed_models.PostLike, socialfeed_models.PostLike.prompt_id == models.Prompt.id)
-        .outerjoin(socialfeed_models.PostComment, socialfeed_models.PostComment.prompt_id == models.Prompt.id)
-        .filter(models.Prompt.id.in_(prompt_ids))
-        .group_by(models.Prompt.id)
-        .all()
+    result_page = await paginate_keyset(
+        db, query, models.RECENT_FIRST, filter_data.page_size,
+        after=after, page=filter_data.page, include_total=filter_data.include_total
     )
-
-    # Create a mapping for likes and comments based on the fetched data
-    likes_comments_map = {lc[0]: lc for lc in likes_comments_data}
-
-    # Construct the response with counts
+    paginated_prompts = result_page.items
+    
+    # Construct the response with the denormalized like and comment counters
     prompts_with_counts = []
     for prompt in paginated_prompts:
-        likes_comments = likes_comments_map.get(prompt.id, None)
-        likes_count = likes_comments.likes_count if likes_comments else 0
-        comments_count = likes_comments.comments_count if likes_comments else 0
-
         prompts_with_counts.append(
             schemas.PublicPromptResponse(
                 id=prompt.id,
@@ -196,27 +190,116 @@ async def filter_public_prompts(filter_data: schemas.PublicPromptFilterRequest,
                 post_name=prompt.post_name,
                 public=prompt.public,
                 prompt_tag=prompt.prompt_tag,
-                likes_count=likes_count,
-                comments_count=comments_count
+                likes_count=prompt.likes_count,
+                comments_count=prompt.comments_count
             )
         )
 
     # Return the list wrapped in the `PublicPromptListResponse` schema
     return schemas.PublicPromptListResponse(
         prompts=prompts_with_counts,
-        total=total_prompts,
+        total=result_page.total,
         page=filter_data.page,
-        page_size=filter_data.page_size
+        page_size=filter_data.page_size,
+        next_cursor=result_page.next_cursor
     )
 
 
+@router.get("/search/", response_model=schemas.PromptSearchResponse)
+async def search_prompts(
+    q: str = Query(..., min_length=1, max_length=200),
+    prompt_type: Optional[models.PromptTypeEnum] = None,
+    prompt_tag: Optional[models.PromptTagEnum] = None,
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
+    """
+    Search prompts by post name, collection name and prompt text, best match first.
+
+    - **q**: Words to search for. A prompt matches when every word occurs in one of the
+      fields (with stemming on Postgres), or when its post name or collection is spelled
+      similarly to `q`. `"quoted phrases"`, `or` and `-excluded` words work on Postgres.
+    - **prompt_type** / **prompt_tag**: Only return prompts of this type or tag.
+    - **page_size**: Number of results per page. Default is 10.
+    - **cursor**: `next_cursor` from the previous page.
+    - **include_total**: Whether to count all matches (defaults to true without a cursor, false with one).
+    """
+    after = decode_cursor(cursor, search.SEARCH_CURSOR) if cursor else None
+
+    try:
+        result_page = await search.search_prompts(
+            db, q, page_size, after=after, include_total=include_total, prompt_type=prompt_type, prompt_tag=prompt_tag
+        )
+
+        results = []
+        for prompt, score in result_page.items:
+            results.append(
+                schemas.PromptSearchResult(
+                    id=prompt.id,
+                    prompt_type=prompt.prompt_type,
+                    prompt_tag=prompt.prompt_tag,
+                    post_name=prompt.post_name,
+                    collection_name=prompt.collection_name,
+                    prompt=prompt.prompt,
+                    ipfs_image_url=prompt.ipfs_image_url,
+                    account_address=prompt.account_address,
+                    likes_count=prompt.likes_count,
+                    comments_count=prompt.comments_count,
+                    score=score
+                )
+            )
+
+        return schemas.PromptSearchResponse(
+            results=results,
+            total=result_page.total,
+            page_size=page_size,
+            next_cursor=result_page.next_cursor
+        )
+    except Exception as e:
+        detail = {
+            "info": "Failed to search prompts",
+            "error": str(e),
+        }
+        raise HTTPException(status_code=500, detail=detail)
+
+
+@router.get("/autocomplete/", response_model=schemas.AutocompleteResponse)
+async def autocomplete_prompts(
+    q: str = Query(..., min_length=1, max_length=100),
+    field: AutocompleteField = AutocompleteField.POST_NAME,
+    limit: int = Query(10, ge=1, le=autocomplete.MAX_COMPLETIONS),
+):
+    """
+    Complete a prefix from the in-memory index, most liked first.
+
+    - **q**: The prefix typed so far (case-insensitive).
+    - **field**: `post_name`, `collection_name` or `creator` (account address).
+    - **limit**: Number of completions, at most 20. Default is 10.
+    """
+    try:
+        completions = autocomplete.prefix_indexes[field].complete(q, limit)
+        return schemas.AutocompleteResponse(
+            field=field,
+            q=q,
+            completions=[schemas.Completion(value=value, popularity=popularity) for value, popularity in completions]
+        )
+    except Exception as e:
+        detail = {
+            "info": "Failed to autocomplete",
+            "error": str(e),
+        }
+        raise HTTPException(status_code=500, detail=detail)
+
+
 @router.put("/prompts/{prompt_id}/grant_access")
-async def grant_access_to_prompt(prompt_id: int, db: Session = Depends(get_session)):  # Use your existing get_session dependency
+async def grant_access_to_prompt(prompt_id: int, db: AsyncSession = Depends(get_async_session)):
     """
     Grants access to a premium prompt by setting grant_access to True.
     """
 
-    prompt = await db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
+    prompt = (await db.execute(select(models.Prompt).filter(models.Prompt.id == prompt_id))).scalars().first()
 
     if not prompt:
         raise HTTPException(status_code=404, detail="Prompt not found")
@@ -226,5 +309,8 @@ async def grant_access_to_prompt(prompt_id: int, db: Session = Depends(get_sessi
 
     prompt.grant_access = True
     await db.commit()
+    await mark_recent_write(prompt.account_address)
+    # Cached premium listings and this prompt's detail still show it without access
+    await response_cache.invalidate(services.PREMIUM_PROMPTS_TAG, services.prompt_cache_tag(prompt_id))
 
     return {"message": "Access granted to prompt"}
\ No newline at end of file
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from app.core.constants import MAX_PAGE_SIZE
+from app.core.enums.autocomplete import AutocompleteField
 from app.core.enums.tags import PromptTagEnum, PromptTypeEnum
 
 class PublicPromptCreate(BaseModel):
@@ -24,6 +26,8 @@ class PublicPromptResponse(BaseModel):
     prompt_tag: PromptTagEnum
     likes_count: Optional[int] = 0
     comments_count: Optional[int] = 0
+    user_liked: Optional[bool] = None  # Set when the listing is requested with a viewer_account
+    following_creator: Optional[bool] = None  # Set when the listing is requested with a viewer_account
 
     class Config:
         from_attributes = True
@@ -31,9 +35,10 @@ class PublicPromptResponse(BaseModel):
 
 class PublicPromptListResponse(BaseModel):
     prompts: List[PublicPromptResponse]
-    total: int  # Total number of prompts available
+    total: Optional[int] = None  # Total number of prompts available, omitted for cursor pages unless requested
     page: int  # Current page number
     page_size: int  # Number of prompts per page
+    next_cursor: Optional[str] = None  # Cursor for the next page, None on the last page
 
     class Config:
         from_attributes = True
@@ -42,8 +47,42 @@ class PublicPromptListResponse(BaseModel):
 class PublicPromptFilterRequest(BaseModel):
     prompt_tag: Optional[str] = "all"  # Allow 'all' as a valid string
     public: Optional[bool] = Field(True, description="Filter by visibility flag (public)")
-    page: Optional[int] = Field(1, description="Page number for pagination")
-    page_size: Optional[int] = Field(10, description="Number of prompts per page")
+    page: Optional[int] = Field(1, ge=1, description="Page number for pagination")
+    page_size: Optional[int] = Field(10, ge=1, le=MAX_PAGE_SIZE, description="Number of prompts per page")
+    cursor: Optional[str] = Field(None, description="Cursor from a previous page's `next_cursor`; takes precedence over `page`")
+    include_total: Optional[bool] = Field(None, description="Count the total; defaults to true for page-based and false for cursor-based requests")
 
 
 
+
+
+class PromptSearchResult(BaseModel):
+    id: int
+    prompt_type: PromptTypeEnum
+    prompt_tag: PromptTagEnum
+    post_name: str
+    collection_name: Optional[str] = None  # Only premium prompts have one
+    prompt: str
+    ipfs_image_url: str
+    account_address: str
+    likes_count: int
+    comments_count: int
+    score: float  # Relevance to the query; results come in decreasing score
+
+
+class PromptSearchResponse(BaseModel):
+    results: List[PromptSearchResult]
+    total: Optional[int] = None  # Number of matches, omitted for cursor pages unless requested
+    page_size: int
+    next_cursor: Optional[str] = None  # Cursor for the next page, None on the last page
+
+
+class Completion(BaseModel):
+    value: str
+    popularity: int  # Likes across all prompts with this value
+
+
+class AutocompleteResponse(BaseModel):
+    field: AutocompleteField
+    q: str
+    completions: List[Completion]  # Most popular first
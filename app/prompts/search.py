@@ -0,0 +1,183 @@
+import re
+from collections import defaultdict
+from typing import Optional
+
+from sqlalchemy import Float, Integer, func, literal_column, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.helpers import Page, count, encode_cursor
+from .models import SEARCH_DOCUMENT, Prompt, PromptTagEnum, PromptTypeEnum
+
+# Cursor layout for search pages: score, id
+SEARCH_CURSOR = (Float(), Integer())
+# Name similarity from which a prompt matches fuzzily (pg_trgm's default similarity_threshold, used by `%`)
+FUZZY_THRESHOLD = 0.3
+# Full-text weight of a term in each field (Postgres' default weights for A, B and C)
+FIELD_WEIGHTS = {"post_name": 1.0, "collection_name": 0.4, "prompt": 0.2}
+
+
+async def search_prompts(
+    db: AsyncSession,
+    query: str,
+    page_size: int,
+    after: Optional[list] = None,
+    include_total: Optional[bool] = None,
+    prompt_type: Optional[PromptTypeEnum] = None,
+    prompt_tag: Optional[PromptTagEnum] = None,
+) -> Page:
+    """
+    Prompts whose post name, collection or prompt text contain every word of `query`,
+    or whose post name or collection is spelled like it. Best matches come first; the
+    page's items are `(prompt, score)` pairs and `after` is a decoded SEARCH_CURSOR.
+
+    Postgres answers from the GIN indexes on prompts; other databases from `search_index`.
+    """
+    if include_total is None:
+        include_total = after is None
+    if db.get_bind().dialect.name == "postgresql":
+        return await _search_postgres(db, query, page_size, after, include_total, prompt_type, prompt_tag)
+    await search_index.catch_up(db)
+    return await search_index.search(db, query, page_size, after, include_total, prompt_type, prompt_tag)
+
+
+async def _search_postgres(db, query, page_size, after, include_total, prompt_type, prompt_tag) -> Page:
+    document = literal_column(f"({SEARCH_DOCUMENT})")
+    tsquery = func.websearch_to_tsquery(literal_column("'english'::regconfig"), query)
+    score = func.ts_rank_cd(document, tsquery) + func.greatest(
+        func.similarity(Prompt.post_name, query), func.similarity(Prompt.collection_name, query)
+    )
+
+    # Each condition can be answered by one of the GIN indexes
+    stmt = select(Prompt, score.label("score")).filter(or_(
+        document.op("@@")(tsquery),
+        Prompt.post_name.op("%")(query),
+        Prompt.collection_name.op("%")(query),
+    ))
+    if prompt_type is not None:
+        stmt = stmt.filter(Prompt.prompt_type == prompt_type)
+    if prompt_tag is not None:
+        stmt = stmt.filter(Prompt.prompt_tag == prompt_tag)
+    total = await count(db, stmt) if include_total else None
+
+    if after is not None:
+        stmt = stmt.filter(tuple_(score, Prompt.id) < tuple_(*after))
+    result = await db.execute(stmt.order_by(score.desc(), Prompt.id.desc()).limit(page_size + 1))
+    items = [(prompt, prompt_score) for prompt, prompt_score in result.all()]
+    return _page(items, total, page_size)
+
+
+def _page(items: list, total: Optional[int], page_size: int) -> Page:
+    if page_size < 1:
+        return Page(items=[], total=total, next_cursor=None)
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        prompt, score = items[-1]
+        next_cursor = encode_cursor([score, prompt.id])
+    return Page(items=items, total=total, next_cursor=next_cursor)
+
+
+def tokenize(text: Optional[str]) -> list:
+    return re.findall(r"\w+", text.lower()) if text else []
+
+
+def trigrams(text: Optional[str]) -> set:
+    """pg_trgm's trigrams of `text`: every word is padded with two spaces in front and one behind."""
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()) if text else []:
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(grams: set, other: set) -> float:
+    """pg_trgm's similarity: shared trigrams over all distinct trigrams of both."""
+    if not grams or not other:
+        return 0.0
+    shared = len(grams & other)
+    return shared / (len(grams) + len(other) - shared)
+
+
+class SearchIndex:
+    """
+    In-memory stand-in for the Postgres search indexes, used with SQLite (tests and
+    local runs). Terms map to the prompts containing them with their field weights,
+    and name trigrams map to prompts for fuzzy matches. Each worker indexes the prompts
+    it adds right away and loads the others' on its next search.
+    """
+
+    def __init__(self):
+        self._terms = defaultdict(dict)  # term -> {prompt_id: weight}
+        self._trigrams = defaultdict(set)  # trigram -> prompt ids
+        self._documents = {}  # prompt_id -> (prompt_type, prompt_tag, [post name trigrams, collection trigrams])
+        self._loaded_through = 0  # Every prompt up to this id has been loaded from the database
+
+    def add(self, prompt_id: int, post_name, collection_name, prompt, prompt_type, prompt_tag):
+        if prompt_id in self._documents:
+            return
+        for field, text in (("post_name", post_name), ("collection_name", collection_name), ("prompt", prompt)):
+            for term in tokenize(text):
+                postings = self._terms[term]
+                postings[prompt_id] = postings.get(prompt_id, 0) + FIELD_WEIGHTS[field]
+        name_trigrams = [trigrams(post_name), trigrams(collection_name)]
+        for gram in set().union(*name_trigrams):
+            self._trigrams[gram].add(prompt_id)
+        self._documents[prompt_id] = (prompt_type, prompt_tag, name_trigrams)
+
+    async def catch_up(self, db: AsyncSession):
+        """Index the prompts added since the last load (SQLite commits ids in order)."""
+        result = await db.execute(
+            select(
+                Prompt.id, Prompt.post_name, Prompt.collection_name, Prompt.prompt, Prompt.prompt_type, Prompt.prompt_tag
+            )
+            .filter(Prompt.id > self._loaded_through)
+            .order_by(Prompt.id)
+        )
+        for row in result.all():
+            self.add(*row)
+            self._loaded_through = row.id
+
+    async def search(self, db, query, page_size, after, include_total, prompt_type, prompt_tag) -> Page:
+        scores = {}
+
+        # Full text: every term of the query must occur in one of the fields
+        terms = tokenize(query)
+        if terms:
+            for prompt_id in set.intersection(*(set(self._terms.get(term, ())) for term in terms)):
+                scores[prompt_id] = sum(self._terms[term][prompt_id] for term in terms)
+
+        # Fuzzy: only prompts sharing a trigram with the query can be similar to it
+        query_trigrams = trigrams(query)
+        for prompt_id in set().union(*(self._trigrams.get(gram, ()) for gram in query_trigrams)):
+            best = max(similarity(query_trigrams, name_trigrams) for name_trigrams in self._documents[prompt_id][2])
+            if best >= FUZZY_THRESHOLD or prompt_id in scores:
+                scores[prompt_id] = scores.get(prompt_id, 0) + best
+
+        ranked = sorted(
+            (
+                (score, prompt_id) for prompt_id, score in scores.items()
+                if (prompt_type is None or self._documents[prompt_id][0] == prompt_type)
+                and (prompt_tag is None or self._documents[prompt_id][1] == prompt_tag)
+            ),
+            reverse=True,
+        )
+        total = len(ranked) if include_total else None
+        if after is not None:
+            ranked = [entry for entry in ranked if entry < tuple(after)]
+        ranked = ranked[:page_size + 1]
+
+        result = await db.execute(select(Prompt).filter(Prompt.id.in_([prompt_id for _, prompt_id in ranked])))
+        prompts = {prompt.id: prompt for prompt in result.scalars().all()}
+        items = [(prompts[prompt_id], score) for score, prompt_id in ranked if prompt_id in prompts]
+        return _page(items, total, page_size)
+
+
+search_index = SearchIndex()
+
+
+def index_new_prompt(prompt: Prompt, db: AsyncSession):
+    """Make a just-committed prompt searchable in this worker; Postgres maintains its indexes itself."""
+    if db.get_bind().dialect.name != "postgresql":
+        search_index.add(
+            prompt.id, prompt.post_name, prompt.collection_name, prompt.prompt, prompt.prompt_type, prompt.prompt_tag
+        )
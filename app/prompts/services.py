@@ -1,3 +1,226 @@
+import hashlib
+import math
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Integer, cast, delete, func, select, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import models, schemas
+from app.socialfeed import models as socialfeed_models
+from app.core.cache import response_cache
+from app.core.constants import TRENDING_BUCKET_RETENTION_HOURS, TRENDING_HALF_LIFE_HOURS
+from app.core.helpers import insert_for
+from app.leaderboard.services import current_hour
+
+# Response cache tags for prompt listings (see app.core.cache)
+PUBLIC_PROMPTS_TAG = "prompts:public"
+PREMIUM_PROMPTS_TAG = "prompts:premium"
+# Trending premium listings, whose order changes whenever trending scores are refreshed
+PREMIUM_TRENDING_TAG = "prompts:premium:trending"
+
+# How much a like and a comment add to a prompt's trending score
+TRENDING_LIKE_WEIGHT = 1
+TRENDING_COMMENT_WEIGHT = 2
+# Buckets scored per statement by `refresh_trending_scores`
+TRENDING_REFRESH_BATCH_SIZE = 5000
+
+
+def prompt_cache_tag(prompt_id: int) -> str:
+    return f"prompt:{prompt_id}"
+
+
+def creator_cache_tag(account_address: str) -> str:
+    return f"creator:{account_address}"
+
+
+def listing_cache_tags(*listing_tags: str):
+    """
+    Cache tags for a page of prompts: the listing tags, invalidated when a prompt is
+    added, plus one tag per prompt on the page, invalidated when its counters change.
+    """
+    def tags(response: dict, params: dict) -> list:
+        return [*listing_tags, *(prompt_cache_tag(prompt["id"]) for prompt in response["prompts"])]
+    return tags
+
+
+def reconcile_prompt_counters(db: Session) -> int:
+    """
+    Repair drift between the denormalized `likes_count`/`comments_count` columns
+    and the actual rows in `post_likes`/`post_comments`.
+
+    Returns the number of prompts whose counters were corrected.
+    """
+    actual_likes = (
+        select(func.count(socialfeed_models.PostLike.id))
+        .filter(socialfeed_models.PostLike.prompt_id == models.Prompt.id)
+        .scalar_subquery()
+    )
+    actual_comments = (
+        select(func.count(socialfeed_models.PostComment.id))
+        .filter(socialfeed_models.PostComment.prompt_id == models.Prompt.id)
+        .scalar_subquery()
+    )
+
+    result = db.execute(
+        update(models.Prompt)
+        .where(or_(models.Prompt.likes_count != actual_likes, models.Prompt.comments_count != actual_comments))
+        .values(likes_count=actual_likes, comments_count=actual_comments)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount
+
+
+def shuffle_start(*seed_parts: str, seed: Optional[str] = None) -> int:
+    """
+    Starting point on the `shuffle_key` ring for a viewer's shuffled feed.
+
+    Hashes the seed parts (e.g. the viewer's account) with `seed`, which defaults to
+    today's date so each viewer gets a fresh but stable order every day.
+    """
+    seed = seed or datetime.utcnow().date().isoformat()
+    digest = hashlib.sha256(":".join((*seed_parts, seed)).encode()).hexdigest()
+    return int(digest[:8], 16) % models.SHUFFLE_KEY_RANGE
+
+
+def reshuffle_prompts(db: Session) -> int:
+    """
+    Assign every prompt a new random `shuffle_key` so shuffled feeds rotate over time.
+
+    Returns the number of prompts reshuffled.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        new_key = func.abs(func.random()) % models.SHUFFLE_KEY_RANGE
+    else:
+        new_key = cast(func.floor(func.random() * models.SHUFFLE_KEY_RANGE), Integer)
+
+    result = db.execute(
+        update(models.Prompt)
+        .values(shuffle_key=new_key)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount
+
+
+async def add_activity_to_bucket(prompt_id: int, db: AsyncSession, likes: int = 0, comments: int = 0):
+    """Count likes and comments in the prompt's bucket for the current hour (committed by the caller)."""
+    Bucket = models.PromptActivityBucket
+    await db.execute(
+        insert_for(db, Bucket)
+        .values(prompt_id=prompt_id, bucket_start=current_hour(), likes=likes, comments=comments)
+        .on_conflict_do_update(
+            index_elements=['prompt_id', 'bucket_start'],
+            set_={'likes': Bucket.likes + likes, 'comments': Bucket.comments + comments},
+        )
+    )
+
+
+def trending_points(weight: float, bucket_start: datetime) -> float:
+    """
+    A bucket's contribution to a trending score, as log2 of its weight scaled to
+    TRENDING_EPOCH rather than to now.
+
+    A prompt's decayed score at time t is the sum of weight * 2^(-(t - bucket) / half-life)
+    over its buckets. Every prompt shares the 2^(-t / half-life) factor, so the stored
+    score log2(sum of weight * 2^(bucket / half-life)) ranks prompts exactly like the
+    decayed one, and only changes when a prompt gets new activity. Keeping it in log2
+    space keeps the values small however far the epoch recedes.
+    """
+    hours = (bucket_start - models.TRENDING_EPOCH).total_seconds() / 3600
+    return math.log2(weight) + hours / TRENDING_HALF_LIFE_HOURS
+
+
+def add_trending_points(score: float, points: float) -> float:
+    """log2(2^score + 2^points), where a score of 0 means no activity yet."""
+    if not score:
+        return points
+    high, low = max(score, points), min(score, points)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def refresh_trending_scores(db: Session) -> int:
+    """
+    Fold activity buckets that are not yet scored into `Prompt.trending_score`, then
+    delete fully scored buckets older than TRENDING_BUCKET_RETENTION_HOURS.
+
+    Only prompts with new likes or comments are updated: decay never reorders
+    prompts (see `trending_points`). Returns the number of prompts updated.
+    """
+    Bucket = models.PromptActivityBucket
+    unscored = or_(Bucket.likes != Bucket.scored_likes, Bucket.comments != Bucket.scored_comments)
+    updated = set()
+    while True:
+        # Locked so concurrent refreshes never score the same bucket twice
+        buckets = db.execute(
+            select(Bucket.id, Bucket.prompt_id, Bucket.bucket_start, Bucket.likes, Bucket.comments,
+                   Bucket.scored_likes, Bucket.scored_comments)
+            .filter(unscored)
+            .order_by(Bucket.id)
+            .limit(TRENDING_REFRESH_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not buckets:
+            break
+
+        points = {}
+        for bucket in buckets:
+            weight = (
+                (bucket.likes - bucket.scored_likes) * TRENDING_LIKE_WEIGHT
+                + (bucket.comments - bucket.scored_comments) * TRENDING_COMMENT_WEIGHT
+            )
+            if weight > 0:
+                points.setdefault(bucket.prompt_id, []).append(trending_points(weight, bucket.bucket_start))
+
+        scores = dict(db.execute(
+            select(models.Prompt.id, models.Prompt.trending_score).filter(models.Prompt.id.in_(list(points)))
+        ).all()) if points else {}
+        new_scores = []
+        for prompt_id, prompt_points in points.items():
+            if prompt_id not in scores:
+                continue
+            score = scores[prompt_id]
+            for bucket_points in prompt_points:
+                score = add_trending_points(score, bucket_points)
+            new_scores.append({"id": prompt_id, "trending_score": score})
+
+        if new_scores:
+            db.execute(update(models.Prompt), new_scores)
+        db.execute(update(Bucket), [
+            {"id": bucket.id, "scored_likes": bucket.likes, "scored_comments": bucket.comments}
+            for bucket in buckets
+        ])
+        db.commit()
+        updated.update(row["id"] for row in new_scores)
+
+        if len(buckets) < TRENDING_REFRESH_BATCH_SIZE:
+            break
+
+    db.execute(
+        delete(Bucket)
+        .where(Bucket.bucket_start < current_hour() - timedelta(hours=TRENDING_BUCKET_RETENTION_HOURS), ~unscored)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    if updated:
+        response_cache.invalidate_sync(PREMIUM_TRENDING_TAG)
+    return len(updated)
+
 
+def rebuild_trending_scores(db: Session) -> int:
+    """
+    Recompute every trending score from the retained buckets, e.g. after changing
+    TRENDING_HALF_LIFE_HOURS. Returns the number of prompts with a score.
+    """
+    db.execute(update(models.Prompt).values(trending_score=0).execution_options(synchronize_session=False))
+    db.execute(
+        update(models.PromptActivityBucket)
+        .values(scored_likes=0, scored_comments=0)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return refresh_trending_scores(db)
@@ -0,0 +1,193 @@
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.helpers import Page, paginate_keyset, paginate_rotation
+from app.core.metrics import feed_stage_duration
+from app.prompts.models import RECENT_FIRST, Prompt
+from app.prompts.services import shuffle_start
+from . import models, services
+
+
+class FeedRequest(NamedTuple):
+    """
+    What a feed page is built for; `after` holds the decoded cursor, if any, and
+    `viewer_account` the account whose liked/followed state is shown.
+    """
+    user_account: str
+    page: int
+    page_size: int
+    after: Optional[list]
+    include_total: Optional[bool]
+    viewer_account: Optional[str] = None
+
+
+class Enricher(NamedTuple):
+    """
+    A field added to every item of a page. `load(request, prompts, db)` fetches it
+    for the whole page at once and returns `{prompt_id: value}`; prompts it has no
+    value for get `default()`. Viewer-only fields are skipped without a viewer.
+    """
+    field: str
+    load: Callable[[FeedRequest, list, AsyncSession], Awaitable[dict]]
+    default: Callable[[], object] = lambda: None
+    viewer_only: bool = False
+
+
+class FeedPipeline:
+    """
+    Builds a feed page in stages, each timed in `feed_stage_duration_seconds`:
+
+    - `candidates`: the source returns a `Page` of prompts for the request.
+    - `serialize`: each prompt becomes a response item.
+    - one stage per enricher: batch-loaded for the page and joined by prompt id.
+
+    Feeds differ only in their source and item shape, so new feeds get the batching
+    and instrumentation by declaring a pipeline.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source: Callable[[FeedRequest, AsyncSession], Awaitable[Page]],
+        serialize: Callable[[Prompt], dict],
+        enrichers: tuple = (),
+    ):
+        self.name = name
+        self.source = source
+        self.serialize = serialize
+        self.enrichers = enrichers
+
+    @contextmanager
+    def _stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            feed_stage_duration.observe(time.perf_counter() - started, feed=self.name, stage=stage)
+
+    async def run(self, request: FeedRequest, db: AsyncSession) -> tuple:
+        """The page's response items and the source's `Page` (for totals and the next cursor)."""
+        with self._stage("candidates"):
+            result_page = await self.source(request, db)
+
+        with self._stage("serialize"):
+            items = {prompt.id: self.serialize(prompt) for prompt in result_page.items}
+
+        for enricher in self.enrichers:
+            if enricher.viewer_only and not request.viewer_account:
+                continue
+            with self._stage(enricher.field):
+                values = await enricher.load(request, result_page.items, db) if items else {}
+                for prompt_id, item in items.items():
+                    item[enricher.field] = values[prompt_id] if prompt_id in values else enricher.default()
+
+        return list(items.values()), result_page
+
+
+# --- Candidate sources ------------------------------------------------------------
+
+async def all_recent_prompts(request: FeedRequest, db: AsyncSession) -> Page:
+    """
+    Every prompt, newest first. The social feed was the union of prompts from followed
+    and from not-followed creators, which is every prompt, so it is read directly.
+    """
+    return await paginate_keyset(
+        db, select(Prompt), RECENT_FIRST, request.page_size,
+        after=request.after, page=request.page, include_total=request.include_total
+    )
+
+
+async def followers_prompts(request: FeedRequest, db: AsyncSession) -> Page:
+    """Prompts from the user's followers, in the user's shuffled order."""
+    followers = select(models.Follow.follower_account).filter(models.Follow.creator_account == request.user_account).scalar_subquery()
+    return await paginate_rotation(
+        db, select(Prompt).filter(Prompt.account_address.in_(followers)),
+        Prompt.shuffle_key, Prompt.id, shuffle_start(request.user_account), request.page_size,
+        after=request.after, page=request.page, include_total=request.include_total
+    )
+
+
+async def following_timeline(request: FeedRequest, db: AsyncSession) -> Page:
+    """The user's materialized following timeline, newest first."""
+    return await services.read_following_timeline(
+        request.user_account, db, request.page_size,
+        after=request.after, page=request.page, include_total=request.include_total
+    )
+
+
+async def followers_and_following_prompts(request: FeedRequest, db: AsyncSession) -> Page:
+    """Prompts from the user's followers and followed creators, in the user's shuffled order."""
+    accounts = union(
+        select(models.Follow.follower_account).filter(models.Follow.creator_account == request.user_account),
+        select(models.Follow.creator_account).filter(models.Follow.follower_account == request.user_account),
+    )
+    return await paginate_rotation(
+        db, select(Prompt).filter(Prompt.account_address.in_(accounts)),
+        Prompt.shuffle_key, Prompt.id, shuffle_start(request.user_account), request.page_size,
+        after=request.after, page=request.page, include_total=request.include_total
+    )
+
+
+# --- Enrichers --------------------------------------------------------------------
+
+async def load_top_comments(request: FeedRequest, prompts: list, db: AsyncSession) -> dict:
+    return await services.get_top_comments([prompt.id for prompt in prompts], db)
+
+
+async def load_user_liked(request: FeedRequest, prompts: list, db: AsyncSession) -> dict:
+    liked = await services.get_viewer_likes(
+        {prompt.id: prompt.prompt_type for prompt in prompts}, request.viewer_account, db
+    )
+    return {prompt.id: prompt.id in liked for prompt in prompts}
+
+
+async def load_following_creator(request: FeedRequest, prompts: list, db: AsyncSession) -> dict:
+    followed = await services.get_viewer_follows(
+        (prompt.account_address for prompt in prompts), request.viewer_account, db
+    )
+    return {prompt.id: prompt.account_address in followed for prompt in prompts}
+
+
+TOP_COMMENTS = Enricher("top_comments", load_top_comments, list)
+USER_LIKED = Enricher("user_liked", load_user_liked, viewer_only=True)
+FOLLOWING_CREATOR = Enricher("following_creator", load_following_creator, viewer_only=True)
+FEED_ENRICHERS = (TOP_COMMENTS, USER_LIKED, FOLLOWING_CREATOR)
+
+
+# --- Item shapes --------------------------------------------------------------------
+
+def social_feed_item(prompt: Prompt) -> dict:
+    return {
+        "ipfs_image_url": prompt.ipfs_image_url,
+        "prompt_id": prompt.id,
+        "prompt": prompt.prompt,
+        "prompt_type": prompt.prompt_type,
+        "account_address": prompt.account_address,
+        "post_name": prompt.post_name,
+        "likes_count": prompt.likes_count,
+        "comments_count": prompt.comments_count,
+        "public": prompt.public,
+    }
+
+
+def feed_item(prompt: Prompt) -> dict:
+    return {
+        "ipfs_image_url": prompt.ipfs_image_url,
+        "prompt_id": prompt.id,
+        "prompt": prompt.prompt,
+        "prompt_type": prompt.prompt_type,
+        "likes": prompt.likes_count,
+        "comments": prompt.comments_count,
+        "created_at": prompt.created_at,
+        "account_address": prompt.account_address,
+    }
+
+
+SOCIAL_FEED = FeedPipeline("social", all_recent_prompts, social_feed_item, FEED_ENRICHERS)
+FOLLOWERS_FEED = FeedPipeline("followers", followers_prompts, feed_item, FEED_ENRICHERS)
+FOLLOWING_FEED = FeedPipeline("following", following_timeline, feed_item, FEED_ENRICHERS)
+COMBINED_FEED = FeedPipeline("combined", followers_and_following_prompts, feed_item, FEED_ENRICHERS)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Index, UniqueConstraint
 from app.prompts.schemas import PromptTypeEnum
 from sqlalchemy.orm import relationship
 from app.core.database import Base  # Assuming you have a Base model class
@@ -18,6 +18,9 @@ class SocialFeedPost(Base):
 
 class PostLike(Base):
     __tablename__ = 'post_likes'
+    __table_args__ = (
+        UniqueConstraint('prompt_id', 'user_account', name='uq_post_likes_prompt_id_user_account'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     prompt_id = Column(Integer, ForeignKey('prompts.id', ondelete="CASCADE"), nullable=False) 
@@ -30,6 +33,9 @@ class PostLike(Base):
 
 class PostComment(Base):
     __tablename__ = 'post_comments'
+    __table_args__ = (
+        Index('ix_post_comments_prompt_id_created_at', 'prompt_id', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     prompt_id = Column(Integer, ForeignKey('prompts.id', ondelete="CASCADE"), nullable=False) 
@@ -43,7 +49,32 @@ class PostComment(Base):
 
 class Follow(Base):
     __tablename__ = 'follows'
+    __table_args__ = (
+        UniqueConstraint('follower_account', 'creator_account', name='uq_follows_follower_account_creator_account'),
+        Index('ix_follows_creator_account_id', 'creator_account', 'id'),
+        Index('ix_follows_follower_account_id', 'follower_account', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    follower_account = Column(String, nullable=False, index=True)  # The account of the user who follows
-    creator_account = Column(String, nullable=False, index=True)   # The account of the creator being followed
\ No newline at end of file
+    follower_account = Column(String, nullable=False)  # The account of the user who follows
+    creator_account = Column(String, nullable=False)   # The account of the creator being followed
+
+
+# Follow lists are paginated newest follow first
+NEWEST_FOLLOW_FIRST = (Follow.id,)
+
+
+class TimelineEntry(Base):
+    """A prompt pushed into a follower's materialized following-feed timeline."""
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (
+        UniqueConstraint('user_account', 'prompt_id', name='uq_timeline_entries_user_account_prompt_id'),
+        Index('ix_timeline_entries_user_account_created_at', 'user_account', 'created_at', 'prompt_id'),
+        Index('ix_timeline_entries_user_account_creator_account', 'user_account', 'creator_account'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_account = Column(String, nullable=False)  # The follower whose timeline this is
+    creator_account = Column(String, nullable=False)  # The creator of the prompt
+    prompt_id = Column(Integer, ForeignKey('prompts.id', ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime, nullable=False)  # Copied from the prompt so timelines sort without a join
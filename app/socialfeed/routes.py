@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, select
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, select, update
 from datetime import datetime, timedelta
-from app.core.database import get_session
-from . import schemas, services, models
-from app.prompts.models import Prompt
-from app.core.helpers import paginate
+from app.core.database import get_async_session
+from . import feed, schemas, services, models
+from app.prompts.models import Prompt, RECENT_FIRST
+from app.prompts.services import add_activity_to_bucket, prompt_cache_tag
+from app.core.helpers import ROTATION_CURSOR, decode_cursor, paginate_keyset
+from app.celery.celery import backfill_timeline_task, enqueue
+from app.core.cache import response_cache
+from app.core.constants import LIKE_WRITE_BEHIND, MAX_PAGE_SIZE
+from app.core.replica import mark_recent_write
 router = APIRouter()
 
 
 @router.post("/like-prompt/")
-async def like_prompt(like_data: schemas.LikePromptRequest, db: Session = Depends(get_session)):
+async def like_prompt(like_data: schemas.LikePromptRequest, db: AsyncSession = Depends(get_async_session)):
     """
     Like a public or premium prompt.
 
@@ -19,44 +25,55 @@ async def like_prompt(like_data: schemas.LikePromptRequest, db: Session = Depend
     - **user_account**: The account of the user liking the prompt.
     """
     try:
-        # Check if the prompt exists
-        prompt = db.query(Prompt).filter(
-            Prompt.id == like_data.prompt_id,
-            Prompt.prompt_type == like_data.prompt_type
-        ).first()
-
-        if not prompt:
-            raise HTTPException(status_code=404, detail="Prompt not found")
-
-        # Check if the user has already liked the prompt
-        existing_like = db.query(models.PostLike).filter(
-            models.PostLike.prompt_id == like_data.prompt_id,
-            models.PostLike.prompt_type == like_data.prompt_type,
-            models.PostLike.user_account == like_data.user_account
-        ).first()
+        # Acknowledge from the Redis buffer; the like is inserted by the next batch flush
+        if LIKE_WRITE_BEHIND:
+            outcome, total_likes = await services.buffer_like(
+                like_data.prompt_id, like_data.prompt_type, like_data.user_account, db
+            )
+            if outcome == services.LIKE_PROMPT_NOT_FOUND:
+                raise HTTPException(status_code=404, detail="Prompt not found")
+            if outcome == services.LIKE_DUPLICATE:
+                raise HTTPException(status_code=409, detail="User has already liked this prompt")
+            if outcome == services.LIKE_ACCEPTED:
+                return {
+                    "message": "Prompt liked successfully",
+                    "total_likes": total_likes
+                }
 
-        if existing_like:
+        # Insert the like unless the prompt is missing or already liked by the user
+        if not await services.add_like(like_data.prompt_id, like_data.prompt_type, like_data.user_account, db):
+            prompt_exists = (await db.execute(select(Prompt.id).filter(
+                Prompt.id == like_data.prompt_id,
+                Prompt.prompt_type == like_data.prompt_type
+            ))).first()
+            if not prompt_exists:
+                raise HTTPException(status_code=404, detail="Prompt not found")
             raise HTTPException(status_code=409, detail="User has already liked this prompt")
 
-        # Create a new like
-        new_like = models.PostLike(
-            prompt_id=like_data.prompt_id,
-            prompt_type=like_data.prompt_type,
-            user_account=like_data.user_account
-        )
-        db.add(new_like)
-        db.commit()
+        # Bump the denormalized counter in the same transaction as the insert
+        total_likes = (await db.execute(
+            update(Prompt)
+            .where(Prompt.id == like_data.prompt_id)
+            .values(likes_count=Prompt.likes_count + 1)
+            .returning(Prompt.likes_count)
+        )).scalar_one()
+        # Counted towards the prompt's trending score on the next refresh
+        await add_activity_to_bucket(like_data.prompt_id, db, likes=1)
+        await db.commit()
+
+        # Read the user's next pages from the primary until the replica has the like
+        await mark_recent_write(like_data.user_account)
 
-        # Get the updated number of likes
-        total_likes = db.query(models.PostLike).filter(
-            models.PostLike.prompt_id == like_data.prompt_id,
-            models.PostLike.prompt_type == like_data.prompt_type
-        ).count()
+        # Drop cached pages showing this prompt
+        await response_cache.invalidate(prompt_cache_tag(like_data.prompt_id))
 
         return {
             "message": "Prompt liked successfully",
             "total_likes": total_likes
         }
+    except HTTPException:
+        # 404/409/400 raised above, passed through with their own status
+        raise
     except Exception as e:
         detail = {
             "info": "Failed to like prompt",
@@ -67,7 +84,7 @@ async def like_prompt(like_data: schemas.LikePromptRequest, db: Session = Depend
 
 
 @router.post("/comment-prompt/")
-async def comment_prompt(comment_data: schemas.CommentPromptRequest, db: Session = Depends(get_session)):
+async def comment_prompt(comment_data: schemas.CommentPromptRequest, db: AsyncSession = Depends(get_async_session)):
     """
     Add a comment to a public or premium prompt.
 
@@ -78,10 +95,10 @@ async def comment_prompt(comment_data: schemas.CommentPromptRequest, db: Session
     """
     try:
         # Check if the prompt exists
-        prompt = db.query(Prompt).filter(
+        prompt = (await db.execute(select(Prompt).filter(
             Prompt.id == comment_data.prompt_id,
             Prompt.prompt_type == comment_data.prompt_type
-        ).first()
+        ))).scalars().first()
 
         if not prompt:
             raise HTTPException(status_code=404, detail="Prompt not found")
@@ -94,34 +111,29 @@ async def comment_prompt(comment_data: schemas.CommentPromptRequest, db: Session
             comment=comment_data.comment
         )
         db.add(new_comment)
-        db.commit()
 
-        # Get updated total comments count
-        total_comments = db.query(models.PostComment).filter(
-            models.PostComment.prompt_id == comment_data.prompt_id,
-            models.PostComment.prompt_type == comment_data.prompt_type
-        ).count()
+        # Bump the denormalized counter in the same transaction as the insert
+        total_comments = (await db.execute(
+            update(Prompt)
+            .where(Prompt.id == comment_data.prompt_id)
+            .values(comments_count=Prompt.comments_count + 1)
+            .returning(Prompt.comments_count)
+        )).scalar_one()
+        # Counted towards the prompt's trending score on the next refresh
+        await add_activity_to_bucket(comment_data.prompt_id, db, comments=1)
+        await db.commit()
+        await mark_recent_write(comment_data.user_account)
 
-        # Get the latest comments (e.g., top 2)
-        top_comments = db.query(models.PostComment).filter(
-            models.PostComment.prompt_id == comment_data.prompt_id,
-            models.PostComment.prompt_type == comment_data.prompt_type
-        ).order_by(models.PostComment.created_at.desc()).limit(2).all()
+        # Drop cached pages and top comments showing this prompt's comments
+        await response_cache.invalidate(prompt_cache_tag(comment_data.prompt_id))
 
-        # Commit the changes to the database
-        db.commit()
+        # Get the latest comments (e.g., top 2); this also refills the feeds' cache
+        top_comments = await services.get_top_comments([comment_data.prompt_id], db)
 
         return {
             "message": "Comment added successfully",
             "total_comments": total_comments,
-            "latest_comments": [
-                {
-                    "user_account": comment.user_account,
-                    "comment": comment.comment,
-                    "created_at": comment.created_at
-                }
-                for comment in top_comments
-            ]
+            "latest_comments": top_comments[comment_data.prompt_id]
         }
     except Exception as e:
         detail = {
@@ -132,7 +144,7 @@ async def comment_prompt(comment_data: schemas.CommentPromptRequest, db: Session
 
 
 @router.get("/get-prompt-comments/", response_model=schemas.CommentsListResponse)
-async def get_prompt_comments(prompt_id: int, prompt_type: schemas.PromptTypeEnum, limit: int = 2, db: Session = Depends(get_session)):
+async def get_prompt_comments(prompt_id: int, prompt_type: schemas.PromptTypeEnum, limit: int = 2, db: AsyncSession = Depends(get_async_session)):
     """
     Retrieve comments for a specific public or premium prompt.
     
@@ -145,15 +157,16 @@ async def get_prompt_comments(prompt_id: int, prompt_type: schemas.PromptTypeEnu
     try:
         # Fetch the prompt and its comments in a single query using join
         prompt_with_comments = (
-            db.query(Prompt, models.PostComment)
-            .outerjoin(models.PostComment, models.PostComment.prompt_id == Prompt.id)
-            .filter(
-                Prompt.id == prompt_id,
-                Prompt.prompt_type == prompt_type
+            await db.execute(
+                select(Prompt, models.PostComment)
+                .outerjoin(models.PostComment, models.PostComment.prompt_id == Prompt.id)
+                .filter(
+                    Prompt.id == prompt_id,
+                    Prompt.prompt_type == prompt_type
+                )
+                .limit(limit)
             )
-            .limit(limit)
-            .all()
-        )
+        ).all()
 
         # Check if the prompt exists
         if not prompt_with_comments:
@@ -163,11 +176,8 @@ async def get_prompt_comments(prompt_id: int, prompt_type: schemas.PromptTypeEnu
         prompt = prompt_with_comments[0][0]  # The prompt itself
         comments = [pc[1] for pc in prompt_with_comments if pc[1] is not None]
 
-        # Fetch total comments count in one go
-        total_comments = db.query(func.count(models.PostComment.id)).filter(
-            models.PostComment.prompt_id == prompt_id,
-            models.PostComment.prompt_type == prompt_type
-        ).scalar()
+        # Total comments come from the denormalized counter on the prompt
+        total_comments = prompt.comments_count
 
         # Return the response with comments and total count
         return schemas.CommentsListResponse(
@@ -192,7 +202,7 @@ async def get_prompt_comments(prompt_id: int, prompt_type: schemas.PromptTypeEnu
 
 
 @router.post("/follow-creator/")
-async def follow_creator(follower_account: str, creator_account: str, db: Session = Depends(get_session)):
+async def follow_creator(follower_account: str, creator_account: str, db: AsyncSession = Depends(get_async_session)):
     """
     Follow a creator.
     
@@ -200,21 +210,21 @@ async def follow_creator(follower_account: str, creator_account: str, db: Sessio
     - **creator_account**: The account of the creator to be followed.
     """
     try:
-        # Check if already following
-        existing_follow = db.query(models.Follow).filter(
-            models.Follow.follower_account == follower_account,
-            models.Follow.creator_account == creator_account
-        ).first()
-
-        if existing_follow:
+        # Add the follow relationship unless it already exists
+        if not await services.add_follow(follower_account, creator_account, db):
             raise HTTPException(status_code=400, detail="Already following this creator")
+        await db.commit()
 
-        # Add new follow relationship
-        new_follow = models.Follow(follower_account=follower_account, creator_account=creator_account)
-        db.add(new_follow)
-        db.commit()
+        # Both accounts' follow lists change; read them from the primary until the replica catches up
+        await mark_recent_write(follower_account, creator_account)
+
+        # Fill the follower's timeline with the creator's recent prompts
+        await enqueue(backfill_timeline_task, follower_account, creator_account)
 
         return {"message": "Successfully followed the creator"}
+    except HTTPException:
+        # 404/409/400 raised above, passed through with their own status
+        raise
     except Exception as e:
         detail = {
             "info": "Failed to follow creator",
@@ -224,7 +234,7 @@ async def follow_creator(follower_account: str, creator_account: str, db: Sessio
 
 
 @router.delete("/unfollow-creator/")
-async def unfollow_creator(follower_account: str, creator_account: str, db: Session = Depends(get_session)):
+async def unfollow_creator(follower_account: str, creator_account: str, db: AsyncSession = Depends(get_async_session)):
     """
     Unfollow a creator.
     
@@ -232,16 +242,21 @@ async def unfollow_creator(follower_account: str, creator_account: str, db: Sess
     - **creator_account**: The account of the creator to be unfollowed.
     """
     try:
-        follow_relationship = db.query(models.Follow).filter(
+        follow_relationship = (await db.execute(select(models.Follow).filter(
             models.Follow.follower_account == follower_account,
             models.Follow.creator_account == creator_account
-        ).first()
+        ))).scalars().first()
 
         if not follow_relationship:
             raise HTTPException(status_code=404, detail="Not following this creator")
 
-        db.delete(follow_relationship)
-        db.commit()
+        await db.delete(follow_relationship)
+        await db.execute(delete(models.TimelineEntry).where(
+            models.TimelineEntry.user_account == follower_account,
+            models.TimelineEntry.creator_account == creator_account
+        ))
+        await db.commit()
+        await mark_recent_write(follower_account, creator_account)
 
         return {"message": "Successfully unfollowed the creator"}
     except Exception as e:
@@ -253,46 +268,53 @@ async def unfollow_creator(follower_account: str, creator_account: str, db: Sess
 
 
 @router.get("/creator-followers/")
-async def get_creator_followers(creator_account: str, db: Session = Depends(get_session)):
+async def get_creator_followers(
+    creator_account: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
     """
-    Get a list of followers for a specific creator along with their top 5 most liked prompts.
+    Get a list of followers for a specific creator along with their top 5 most liked prompts, newest follow first.
     
     - **creator_account**: The account of the creator whose followers are being retrieved.
+    - **page**: Page number for pagination.
+    - **page_size**: Number of followers per page.
+    - **cursor**: `next_cursor` from the previous page, for constant-cost deep pagination.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
     """
+    after = decode_cursor(cursor, models.NEWEST_FOLLOW_FIRST) if cursor else None
+
     try:
-        followers = db.query(models.Follow).filter(models.Follow.creator_account == creator_account).all()
+        query = select(models.Follow).filter(models.Follow.creator_account == creator_account)
+        result_page = await paginate_keyset(
+            db, query, models.NEWEST_FOLLOW_FIRST, page_size, after=after, page=page, include_total=include_total
+        )
 
-        if not followers:
+        if not result_page.items and after is None and page == 1:
             return {"message": "This creator has no followers"}
 
-        result = []
-        for follow in followers:
-            # Get follower's top 5 most liked prompts
-            prompts = (
-                db.query(Prompt, func.count(models.PostLike.id).label('likes_count'))
-                .outerjoin(models.PostLike, models.PostLike.prompt_id == Prompt.id)
-                .filter(Prompt.account_address == follow.follower_account)
-                .group_by(Prompt.id)
-                .order_by(func.count(models.PostLike.id).desc())  # Sort by the number of likes
-                .limit(5)
-                .all()
-            )
+        # Fetch the top 5 prompts of every follower on the page in one query
+        top_prompts = await services.get_top_prompts([follow.follower_account for follow in result_page.items], db)
 
-            result.append({
+        result = [
+            {
                 "follower_account": follow.follower_account,
-                "top_5_prompts": [
-                    {
-                        "prompt": prompt.prompt,
-                        "prompt_id": prompt.id,
-                        "ipfs_image_url": prompt.ipfs_image_url,
-                        "likes": likes_count,
-                        "comments": len(prompt.comments),
-                        "created_at": prompt.created_at
-                    } for prompt, likes_count in prompts
-                ]
-            })
-
-        return {"creator_account": creator_account, "followers_with_top_prompts": result}
+                "top_5_prompts": top_prompts.get(follow.follower_account, [])
+            }
+            for follow in result_page.items
+        ]
+
+        return {
+            "creator_account": creator_account,
+            "followers_with_top_prompts": result,
+            "total": result_page.total,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": result_page.next_cursor
+        }
     except Exception as e:
         detail = {
             "info": "Failed to get creator followers",
@@ -303,46 +325,53 @@ async def get_creator_followers(creator_account: str, db: Session = Depends(get_
 
 
 @router.get("/user-following/")
-async def get_user_following(follower_account: str, db: Session = Depends(get_session)):
+async def get_user_following(
+    follower_account: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
     """
-    Get a list of creators a user is following along with their top 5 most liked prompts.
+    Get a list of creators a user is following along with their top 5 most liked prompts, newest follow first.
     
     - **follower_account**: The account of the user whose following list is being retrieved.
+    - **page**: Page number for pagination.
+    - **page_size**: Number of creators per page.
+    - **cursor**: `next_cursor` from the previous page, for constant-cost deep pagination.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
     """
+    after = decode_cursor(cursor, models.NEWEST_FOLLOW_FIRST) if cursor else None
+
     try:
-        following = db.query(models.Follow).filter(models.Follow.follower_account == follower_account).all()
+        query = select(models.Follow).filter(models.Follow.follower_account == follower_account)
+        result_page = await paginate_keyset(
+            db, query, models.NEWEST_FOLLOW_FIRST, page_size, after=after, page=page, include_total=include_total
+        )
 
-        if not following:
+        if not result_page.items and after is None and page == 1:
             return {"message": "This user is not following any creators"}
 
-        result = []
-        for follow in following:
-            # Get the top 5 most liked prompts for the creator being followed
-            prompts = (
-                db.query(Prompt, func.count(models.PostLike.id).label('likes_count'))
-                .outerjoin(models.PostLike, models.PostLike.prompt_id == Prompt.id)
-                .filter(Prompt.account_address == follow.creator_account)
-                .group_by(Prompt.id)
-                .order_by(func.count(models.PostLike.id).desc())
-                .limit(5)
-                .all()
-            )
+        # Fetch the top 5 prompts of every creator on the page in one query
+        top_prompts = await services.get_top_prompts([follow.creator_account for follow in result_page.items], db)
 
-            result.append({
+        result = [
+            {
                 "creator_account": follow.creator_account,
-                "top_5_prompts": [
-                    {
-                        "prompt": prompt.prompt,
-                        "prompt_id": prompt.id,
-                        "ipfs_image_url": prompt.ipfs_image_url,
-                        "likes": likes_count,
-                        "comments": len(prompt.comments),
-                        "created_at": prompt.created_at
-                    } for prompt, likes_count in prompts
-                ]
-            })
-
-        return {"follower_account": follower_account, "following_with_top_prompts": result}
+                "top_5_prompts": top_prompts.get(follow.creator_account, [])
+            }
+            for follow in result_page.items
+        ]
+
+        return {
+            "follower_account": follower_account,
+            "following_with_top_prompts": result,
+            "total": result_page.total,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": result_page.next_cursor
+        }
     except Exception as e:
         detail = {
             "info": "Failed to get user following",
@@ -354,111 +383,35 @@ async def get_user_following(follower_account: str, db: Session = Depends(get_se
 
 
 @router.get("/feed/")
-async def social_feed(user_account: str, page: int = 1, page_size: int = 10, db: Session = Depends(get_session)):
+async def social_feed(
+    user_account: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    viewer_account: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
     """
     Social feed: Return prompts from creators the user is following and random new creators, along with total number
     of comments and likes, as well as the top 2 comments for each prompt.
-    """
-    try:
-
-        # Get the list of creators the user is following
-        followed_creators_subquery = (
-            db.query(models.Follow.creator_account)
-            .filter(models.Follow.follower_account == user_account)
-            .subquery()
-        )
-
-        # Fetch prompts from followed creators
-        followed_prompts_query = (
-            db.query(Prompt)
-            .filter(Prompt.account_address.in_(followed_creators_subquery))
-        )
-
-        # Fetch random creators (excluding those already followed)
-        random_creators_query = (
-            db.query(Prompt)
-            .filter(~Prompt.account_address.in_(followed_creators_subquery))
-            .order_by(func.random())
-        )
-
-        # Combine both followed prompts and random creator prompts
-        combined_query = followed_prompts_query.union(random_creators_query)
 
-        # Paginate the feed
-        total_prompts = combined_query.count()
-        paginated_prompts = combined_query.order_by(desc(Prompt.created_at)).offset((page - 1) * page_size).limit(page_size).all()
-
-        # Fetch all necessary data (likes, comments, top 2 comments) in one go
-        prompt_ids = [prompt.id for prompt in paginated_prompts]
-
-        # Fetch total likes and comments counts for all prompts in a single batch query
-        likes_comments_data = (
-            db.query(
-                Prompt.id,
-                func.count(models.PostLike.id).label('likes_count'),
-                func.count(models.PostComment.id).label('comments_count')
-            )
-            .outerjoin(models.PostLike, models.PostLike.prompt_id == Prompt.id)
-            .outerjoin(models.PostComment, models.PostComment.prompt_id == Prompt.id)
-            .filter(Prompt.id.in_(prompt_ids))
-            .group_by(Prompt.id)
-            .all()
-        )
+    Pass the returned `next_cursor` as `cursor` to page without offsets. Pass `viewer_account` to flag each prompt
+    with `user_liked` and `following_creator`.
+    """
+    after = decode_cursor(cursor, RECENT_FIRST) if cursor else None
 
-        # Fetch top 2 comments for each prompt in a single batch query
-        top_comments_data = (
-            db.query(
-                models.PostComment.prompt_id,
-                models.PostComment.user_account,
-                models.PostComment.comment,
-                models.PostComment.created_at
-            )
-            .filter(models.PostComment.prompt_id.in_(prompt_ids))
-            .order_by(models.PostComment.prompt_id, models.PostComment.created_at.desc())
-            .limit(2 * len(prompt_ids))
-            .all()
+    try:
+        results, result_page = await feed.SOCIAL_FEED.run(
+            feed.FeedRequest(user_account, page, page_size, after, include_total, viewer_account), db
         )
 
-        # Convert top_comments_data to a more usable structure (group by prompt_id)
-        from collections import defaultdict
-        top_comments_by_prompt = defaultdict(list)
-        for comment in top_comments_data:
-            top_comments_by_prompt[comment.prompt_id].append({
-                "user_account": comment.user_account,
-                "comment": comment.comment,
-                "created_at": comment.created_at
-            })
-
-        # Construct the final feed using the fetched data
-        feed = []
-        for prompt in paginated_prompts:
-            # Get likes and comments data for the prompt
-            likes_comments = next((lc for lc in likes_comments_data if lc[0] == prompt.id), None)
-            likes_count = likes_comments.likes_count if likes_comments else 0
-            comments_count = likes_comments.comments_count if likes_comments else 0
-
-            # Get top 2 comments for the prompt
-            top_comments = top_comments_by_prompt[prompt.id][:2]
-
-            # Append the prompt data
-            feed.append({
-                "ipfs_image_url": prompt.ipfs_image_url,
-                "prompt_id": prompt.id,
-                "prompt": prompt.prompt,
-                "prompt_type": prompt.prompt_type,
-                "account_address": prompt.account_address,
-                "post_name": prompt.post_name,
-                "likes_count": likes_count,
-                "comments_count": comments_count,
-                "top_comments": top_comments,
-                "public": prompt.public
-            })
-
         return {
-            "results": feed,
-            "total": total_prompts,
+            "results": results,
+            "total": result_page.total,
             "page": page,
-            "page_size": page_size
+            "page_size": page_size,
+            "next_cursor": result_page.next_cursor
         }
     except Exception as e:
         detail = {
@@ -470,86 +423,39 @@ async def social_feed(user_account: str, page: int = 1, page_size: int = 10, db:
 
 
 @router.get("/feed/followers/")
-async def get_feed_for_followers(user_account: str, db: Session = Depends(get_session), page: int = 1, page_size: int = 10):
+async def get_feed_for_followers(
+    user_account: str,
+    db: AsyncSession = Depends(get_async_session),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    viewer_account: Optional[str] = None,
+):
     """
-    Get a randomized feed consisting of the prompts from accounts following a given user.
+    Get a shuffled feed consisting of the prompts from accounts following a given user.
     
     - **user_account**: The account of the user to get the followers' feed for.
     - **page**: Page number for pagination.
     - **page_size**: Number of prompts per page.
+    - **cursor**: `next_cursor` from the previous page; keeps the same shuffled order for the whole session.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
     """
-    try:
-        # Get list of followers
-        followers_subquery = db.query(models.Follow.follower_account).filter(models.Follow.creator_account == user_account).subquery()
-
-        # Fetch prompts from followers with random ordering
-        query = db.query(Prompt).filter(Prompt.account_address.in_(followers_subquery))
-
-        total_prompts = query.count()
-        paginated_prompts = query.order_by(func.random()).offset((page - 1) * page_size).limit(page_size).all()
+    after = decode_cursor(cursor, ROTATION_CURSOR) if cursor else None
 
-        # Fetch all necessary data (likes, comments) in one go
-        prompt_ids = [prompt.id for prompt in paginated_prompts]
-
-        likes_comments_data = (
-            db.query(
-                Prompt.id,
-                func.count(models.PostLike.id).label('likes_count'),
-                func.count(models.PostComment.id).label('comments_count')
-            )
-            .outerjoin(models.PostLike, models.PostLike.prompt_id == Prompt.id)
-            .outerjoin(models.PostComment, models.PostComment.prompt_id == Prompt.id)
-            .filter(Prompt.id.in_(prompt_ids))
-            .group_by(Prompt.id)
-            .all()
-        )
-
-        # Fetch top 2 comments for each prompt in a single batch query
-        top_comments_data = (
-            db.query(
-                models.PostComment.prompt_id,
-                models.PostComment.user_account,
-                models.PostComment.comment,
-                models.PostComment.created_at
-            )
-            .filter(models.PostComment.prompt_id.in_(prompt_ids))
-            .order_by(models.PostComment.prompt_id, models.PostComment.created_at.desc())
-            .limit(2 * len(prompt_ids))
-            .all()
+    try:
+        items, result_page = await feed.FOLLOWERS_FEED.run(
+            feed.FeedRequest(user_account, page, page_size, after, include_total, viewer_account), db
         )
 
-        # Convert top_comments_data to a more usable structure (group by prompt_id)
-        from collections import defaultdict
-        top_comments_by_prompt = defaultdict(list)
-        for comment in top_comments_data:
-            top_comments_by_prompt[comment.prompt_id].append({
-                "user_account": comment.user_account,
-                "comment": comment.comment,
-                "created_at": comment.created_at
-            })
-
-        feed = []
-        for prompt in paginated_prompts:
-            # Get likes and comments data for the prompt
-            likes_comments = next((lc for lc in likes_comments_data if lc[0] == prompt.id), None)
-            likes_count = likes_comments.likes_count if likes_comments else 0
-            comments_count = likes_comments.comments_count if likes_comments else 0
-            # Get top 2 comments for the prompt
-            top_comments = top_comments_by_prompt[prompt.id][:2]
-
-            feed.append({
-                "ipfs_image_url": prompt.ipfs_image_url,
-                "prompt_id": prompt.id,
-                "prompt": prompt.prompt,
-                "prompt_type": prompt.prompt_type,
-                "likes": likes_count,
-                "comments": comments_count,
-                "top_comments": top_comments,
-                "created_at": prompt.created_at,
-                "account_address": prompt.account_address
-            })
-
-        return {"total": total_prompts, "page": page, "page_size": page_size, "feed": feed}
+        return {
+            "total": result_page.total,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": result_page.next_cursor,
+            "feed": items
+        }
     except Exception as e:
         detail = {
             "info": "Failed to get feed for followers",
@@ -559,86 +465,43 @@ async def get_feed_for_followers(user_account: str, db: Session = Depends(get_se
 
 
 @router.get("/feed/following/")
-async def get_feed_for_following(user_account: str, db: Session = Depends(get_session), page: int = 1, page_size: int = 10):
+async def get_feed_for_following(
+    user_account: str,
+    db: AsyncSession = Depends(get_async_session),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    viewer_account: Optional[str] = None,
+):
     """
-    Get a randomized feed consisting of the prompts from accounts the user is following.
+    Get a feed of the prompts from accounts the user is following, newest first.
+
+    The feed is read from the user's materialized timeline, which is filled when a
+    followed creator posts; prompts from creators with very large followings are
+    merged in at read time.
     
     - **user_account**: The account of the user to get the following feed for.
     - **page**: Page number for pagination.
     - **page_size**: Number of prompts per page.
+    - **cursor**: `next_cursor` from the previous page, for constant-cost deep pagination.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
     """
-    try:
-        # Get list of accounts the user is following
-        following_subquery = db.query(models.Follow.creator_account).filter(models.Follow.follower_account == user_account).subquery()
-
-        # Fetch prompts from the creators the user is following with random ordering
-        query = db.query(Prompt).filter(Prompt.account_address.in_(following_subquery))
-
-        total_prompts = query.count()
-        paginated_prompts = query.order_by(func.random()).offset((page - 1) * page_size).limit(page_size).all()
-
-        # Fetch all necessary data (likes, comments) in one go
-        prompt_ids = [prompt.id for prompt in paginated_prompts]
-
-        likes_comments_data = (
-            db.query(
-                Prompt.id,
-                func.count(models.PostLike.id).label('likes_count'),
-                func.count(models.PostComment.id).label('comments_count')
-            )
-            .outerjoin(models.PostLike, models.PostLike.prompt_id == Prompt.id)
-            .outerjoin(models.PostComment, models.PostComment.prompt_id == Prompt.id)
-            .filter(Prompt.id.in_(prompt_ids))
-            .group_by(Prompt.id)
-            .all()
-        )
+    after = decode_cursor(cursor, RECENT_FIRST) if cursor else None
 
-        # Fetch top 2 comments for each prompt in a single batch query
-        top_comments_data = (
-            db.query(
-                models.PostComment.prompt_id,
-                models.PostComment.user_account,
-                models.PostComment.comment,
-                models.PostComment.created_at
-            )
-            .filter(models.PostComment.prompt_id.in_(prompt_ids))
-            .order_by(models.PostComment.prompt_id, models.PostComment.created_at.desc())
-            .limit(2 * len(prompt_ids))
-            .all()
+    try:
+        items, result_page = await feed.FOLLOWING_FEED.run(
+            feed.FeedRequest(user_account, page, page_size, after, include_total, viewer_account), db
         )
 
-        # Convert top_comments_data to a more usable structure (group by prompt_id)
-        from collections import defaultdict
-        top_comments_by_prompt = defaultdict(list)
-        for comment in top_comments_data:
-            top_comments_by_prompt[comment.prompt_id].append({
-                "user_account": comment.user_account,
-                "comment": comment.comment,
-                "created_at": comment.created_at
-            })
-
-        feed = []
-        for prompt in paginated_prompts:
-            # Get likes and comments data for the prompt
-            likes_comments = next((lc for lc in likes_comments_data if lc[0] == prompt.id), None)
-            likes_count = likes_comments.likes_count if likes_comments else 0
-            comments_count = likes_comments.comments_count if likes_comments else 0
-            # Get top 2 comments for the prompt
-            top_comments = top_comments_by_prompt[prompt.id][:2]
-
-            feed.append({
-                "ipfs_image_url": prompt.ipfs_image_url,
-                "prompt_id": prompt.id,
-                "prompt": prompt.prompt,
-                "prompt_type": prompt.prompt_type,
-                "likes": likes_count,
-                "comments": comments_count,
-                "top_comments": top_comments,
-                "created_at": prompt.created_at,
-                "account_address": prompt.account_address
-            })
-
-        return {"total": total_prompts, "page": page, "page_size": page_size, "feed": feed}
+        return {
+            "total": result_page.total,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": result_page.next_cursor,
+            "feed": items
+        }
     except Exception as e:
         detail = {
             "info": "Failed to get feed for following",
@@ -650,93 +513,39 @@ async def get_feed_for_following(user_account: str, db: Session = Depends(get_se
 
 
 @router.get("/feed/combined/")
-async def get_combined_feed(user_account: str, db: Session = Depends(get_session), page: int = 1, page_size: int = 10):
+async def get_combined_feed(
+    user_account: str,
+    db: AsyncSession = Depends(get_async_session),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    viewer_account: Optional[str] = None,
+):
     """
-    Get a randomized combined feed consisting of prompts from both the user's followers and the accounts the user is following.
+    Get a shuffled combined feed consisting of prompts from both the user's followers and the accounts the user is following.
     
     - **user_account**: The account of the user to get the combined feed for.
     - **page**: Page number for pagination.
     - **page_size**: Number of prompts per page.
+    - **cursor**: `next_cursor` from the previous page; keeps the same shuffled order for the whole session.
+    - **include_total**: Whether to count the total (defaults to true without a cursor, false with one).
+    - **viewer_account**: Optional account to flag each prompt with `user_liked` and `following_creator`.
     """
-    try:
-        # Get followers' accounts
-        followers_query = db.query(models.Follow.follower_account).filter(models.Follow.creator_account == user_account)
-
-        # Get following accounts
-        following_query = db.query(models.Follow.creator_account).filter(models.Follow.follower_account == user_account)
-
-        # Combine followers and following accounts using union
-        all_accounts_query = followers_query.union(following_query).subquery()
-
-        # Fetch prompts from all combined accounts with random ordering
-        query = db.query(Prompt).filter(Prompt.account_address.in_(all_accounts_query))
-
-        total_prompts = query.count()
-        paginated_prompts = query.order_by(func.random()).offset((page - 1) * page_size).limit(page_size).all()
-
-        # Fetch all necessary data (likes, comments) in one go
-        prompt_ids = [prompt.id for prompt in paginated_prompts]
-
-        likes_comments_data = (
-            db.query(
-                Prompt.id,
-                func.count(models.PostLike.id).label('likes_count'),
-                func.count(models.PostComment.id).label('comments_count')
-            )
-            .outerjoin(models.PostLike, models.PostLike.prompt_id == Prompt.id)
-            .outerjoin(models.PostComment, models.PostComment.prompt_id == Prompt.id)
-            .filter(Prompt.id.in_(prompt_ids))
-            .group_by(Prompt.id)
-            .all()
-        )
+    after = decode_cursor(cursor, ROTATION_CURSOR) if cursor else None
 
-        # Fetch top 2 comments for each prompt in a single batch query
-        top_comments_data = (
-            db.query(
-                models.PostComment.prompt_id,
-                models.PostComment.user_account,
-                models.PostComment.comment,
-                models.PostComment.created_at
-            )
-            .filter(models.PostComment.prompt_id.in_(prompt_ids))
-            .order_by(models.PostComment.prompt_id, models.PostComment.created_at.desc())
-            .limit(2 * len(prompt_ids))
-            .all()
+    try:
+        items, result_page = await feed.COMBINED_FEED.run(
+            feed.FeedRequest(user_account, page, page_size, after, include_total, viewer_account), db
         )
 
-        # Convert top_comments_data to a more usable structure (group by prompt_id)
-        from collections import defaultdict
-        top_comments_by_prompt = defaultdict(list)
-        for comment in top_comments_data:
-            top_comments_by_prompt[comment.prompt_id].append({
-                "user_account": comment.user_account,
-                "comment": comment.comment,
-                "created_at": comment.created_at
-            })
-
-
-        feed = []
-        for prompt in paginated_prompts:
-            # Get likes and comments data for the prompt
-            likes_comments = next((lc for lc in likes_comments_data if lc[0] == prompt.id), None)
-            likes_count = likes_comments.likes_count if likes_comments else 0
-            comments_count = likes_comments.comments_count if likes_comments else 0
-            # Get top 2 comments for the prompt
-            top_comments = top_comments_by_prompt[prompt.id][:2]
-
-            feed.append({
-                "ipfs_image_url": prompt.ipfs_image_url,
-                "prompt_id": prompt.id,
-                "prompt": prompt.prompt,
-                "prompt_type": prompt.prompt_type,
-                "likes": likes_count,
-                "comments": comments_count,
-                "top_comments": top_comments,
-                "created_at": prompt.created_at,
-                "account_address": prompt.account_address
-            })
-
-        return {"total": total_prompts, "page": page, "page_size": page_size, "feed": feed}
+        return {
+            "total": result_page.total,
+            "page": page,
+            "page_size": page_size,
+            "next_cursor": result_page.next_cursor,
+            "feed": items
+        }
     except Exception as e:
         detail = {
             "info": "Failed to get combined feed",
@@ -746,9 +555,8 @@ async def get_combined_feed(user_account: str, db: Session = Depends(get_session
 
 
 
-
 @router.get("/prompt-likes/")
-async def get_prompt_likes(prompt_id: int, account_address: str, db: Session = Depends(get_session)):
+async def get_prompt_likes(prompt_id: int, account_address: str, db: AsyncSession = Depends(get_async_session)):
     """
     Retrieve the number of likes for a specific prompt and whether the user has liked it or not.
 
@@ -757,29 +565,81 @@ async def get_prompt_likes(prompt_id: int, account_address: str, db: Session = D
     """
     try:
         # Check if the prompt exists
-        prompt = db.query(Prompt).filter(Prompt.id == prompt_id).first()
+        prompt = (await db.execute(select(Prompt).filter(Prompt.id == prompt_id))).scalars().first()
         if not prompt:
             raise HTTPException(status_code=404, detail="Prompt not found")
 
-        # Count the number of likes for the prompt
-        likes_count = db.query(models.PostLike).filter(
-            models.PostLike.prompt_id == prompt_id
-        ).count()
-
         # Check if the user has liked the prompt
-        user_liked = db.query(models.PostLike).filter(
+        user_liked = (await db.execute(select(models.PostLike).filter(
             models.PostLike.prompt_id == prompt_id,
             models.PostLike.user_account == account_address
-        ).first()
+        ))).scalars().first()
+
+        likes_count = prompt.likes_count
+        user_liked = bool(user_liked)
+        # Count likes still waiting in the write-behind buffer
+        if LIKE_WRITE_BEHIND:
+            buffered_count, buffered_liked = await services.get_buffered_like_state(
+                prompt_id, prompt.prompt_type, account_address
+            )
+            if buffered_count is not None:
+                likes_count = buffered_count
+            user_liked = user_liked or buffered_liked
 
         return {
             "prompt_id": prompt_id,
             "likes_count": likes_count,
-            "user_liked": bool(user_liked)  # Return True if the user has liked, False otherwise
+            "user_liked": user_liked  # Return True if the user has liked, False otherwise
         }
     except Exception as e:
         detail = {
             "info": "Failed to get prompt likes",
             "error": str(e),
         }
-        raise HTTPException(status_code=500, detail=detail)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=detail)
+
+
+@router.post("/bulk-prompt-likes/")
+async def get_bulk_prompt_likes(likes_data: schemas.BulkPromptLikesRequest, db: AsyncSession = Depends(get_async_session)):
+    """
+    Retrieve the number of likes and whether the user has liked it for many prompts at once, so a page of cards
+    needs one request instead of one `/prompt-likes/` call per card.
+
+    - **prompt_ids**: The IDs of the prompts (at most 100). Unknown IDs are left out of the response.
+    - **account_address**: The account address of the user to check if they have liked the prompts.
+    """
+    try:
+        prompt_ids = list(dict.fromkeys(likes_data.prompt_ids))
+        prompts = (await db.execute(
+            select(Prompt.id, Prompt.prompt_type, Prompt.likes_count).filter(Prompt.id.in_(prompt_ids))
+        )).all() if prompt_ids else []
+        prompt_types = {prompt.id: prompt.prompt_type for prompt in prompts}
+        likes_counts = {prompt.id: prompt.likes_count for prompt in prompts}
+
+        # One IN query for every prompt's liked state
+        liked = await services.get_viewer_likes(prompt_types, likes_data.account_address, db)
+
+        # Count likes still waiting in the write-behind buffer
+        if LIKE_WRITE_BEHIND:
+            buffered = await services.get_buffered_like_states(prompt_types, likes_data.account_address)
+            for prompt_id, (buffered_count, _) in buffered.items():
+                if buffered_count is not None:
+                    likes_counts[prompt_id] = buffered_count
+
+        return {
+            "account_address": likes_data.account_address,
+            "likes": [
+                {
+                    "prompt_id": prompt_id,
+                    "likes_count": likes_counts[prompt_id],
+                    "user_liked": prompt_id in liked
+                }
+                for prompt_id in prompt_ids if prompt_id in prompt_types
+            ]
+        }
+    except Exception as e:
+        detail = {
+            "info": "Failed to get prompt likes",
+            "error": str(e),
+        }
+        raise HTTPException(status_code=500, detail=detail)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.prompts.schemas import PromptTypeEnum
 from typing import List
 class LikePromptRequest(BaseModel):
@@ -12,6 +12,10 @@ class CommentPromptRequest(BaseModel):
     user_account: str
     comment: str
 
+class BulkPromptLikesRequest(BaseModel):
+    prompt_ids: List[int] = Field(..., max_length=100, description="Prompts to report, at most 100")
+    account_address: str
+
 class CommentResponse(BaseModel):
     user_account: str
     comment: str
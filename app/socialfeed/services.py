@@ -1,39 +1,853 @@
-from sqlalchemy.orm import Session
+import asyncio
+import functools
+import inspect
+import json
+import uuid
+from collections import Counter
+from contextlib import nullcontext
+from typing import Optional
+from sqlalchemy import DateTime, case, delete, exists, func, literal, select, tuple_, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
 from datetime import datetime, timedelta
 from . import schemas
+from . import models as socialfeed_models
 from app.leaderboard import models
+from app.leaderboard.services import add_generations_to_buckets, record_user_stats
+from app.prompts.models import Prompt
+from app.prompts.schemas import PromptTypeEnum
+from app.prompts.services import add_activity_to_bucket, creator_cache_tag, prompt_cache_tag
+from app.core.cache import RELEASE_LOCK_SCRIPT, response_cache
+from app.core.constants import (
+    FANOUT_FOLLOWER_LIMIT, LIKE_CACHE_SECONDS, LIKE_FLUSH_BATCH_SIZE, LIKE_FLUSH_INTERVAL_SECONDS, LIKE_WRITE_BEHIND,
+    TIMELINE_MAX_ENTRIES, TOP_COMMENTS_CACHE_SECONDS, TOP_PROMPTS_CACHE_SECONDS, USER_STATS_COALESCE,
+    USER_STATS_FLUSH_INTERVAL_SECONDS,
+)
+from app.core.database import AsyncSessionLocal, primary_session, request_session
+from app.core.helpers import Page, count, encode_cursor, insert_for
+from app.core.metrics import record_cache
+from app.core.redis_client import get_redis
 
-def update_user_stats(user_account: str, db: Session):
+# XP earned per generation
+GENERATION_XP = 2
+
+
+async def upsert_user_stats(generations: dict, db: AsyncSession) -> list:
     """
-    Update the user stats after a generation:
+    Count `{user_account: generations}` in the users' stats with one
+    `INSERT ... ON CONFLICT DO UPDATE`, in the caller's transaction:
     - Add 2 XP per generation.
-    - Update the streak if generations happen on consecutive days.
-    """
-    user_stat = db.query(models.UserStats).filter(models.UserStats.user_account == user_account).first()
-    
-    if not user_stat:
-        # Create new user stat if not present with default values for xp and generations
-        user_stat = models.UserStats(user_account=user_account, xp=0, total_generations=0, streak_days=0)
-        db.add(user_stat)
-    
-    # Calculate XP
-    user_stat.xp += 2
-    user_stat.total_generations += 1
-
-    # Update streak if the last generation was yesterday
-    if user_stat.last_generation:
-        last_generation_date = user_stat.last_generation.date()
-        today_date = datetime.utcnow().date()
-        
-        if today_date == last_generation_date + timedelta(days=1):
-            user_stat.streak_days += 1
-        elif today_date != last_generation_date:
-            user_stat.streak_days = 1  # Reset streak if a day is skipped
-    else:
-        user_stat.streak_days = 1  # First day of streak
-
-    # Update last generation timestamp
-    user_stat.last_generation = datetime.utcnow()
+    - Extend the streak if the last generation was yesterday, keep it if it was
+      today, and restart it otherwise.
+
+    The arithmetic runs in SQL against the stored row, so concurrent generations
+    from the same wallet cannot overwrite each other. Also counts the generations
+    towards the rolling 24h leaderboard. Returns the updated `UserStats` rows; the
+    caller commits and then passes them to `publish_user_stats`.
+    """
+    if not generations:
+        return []
+    UserStats = models.UserStats
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    stmt = insert_for(db, UserStats).values([
+        {
+            "user_account": user_account,
+            "xp": GENERATION_XP * count,
+            "total_generations": count,
+            "streak_days": 1,
+            "last_generation": now,
+        }
+        for user_account, count in generations.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_account'],
+        set_={
+            'xp': UserStats.xp + stmt.excluded.xp,
+            'total_generations': UserStats.total_generations + stmt.excluded.total_generations,
+            'streak_days': case(
+                (UserStats.last_generation >= today, UserStats.streak_days),
+                (UserStats.last_generation >= today - timedelta(days=1), UserStats.streak_days + 1),
+                else_=1,
+            ),
+            'last_generation': stmt.excluded.last_generation,
+        },
+    ).returning(UserStats)
+    user_stats = (await db.scalars(stmt, execution_options={"populate_existing": True})).all()
+
+    await add_generations_to_buckets(generations, db)
+    return user_stats
+
+
+async def publish_user_stats(user_stats: list, generations: Optional[dict] = None):
+    """
+    Push committed stats into the leaderboards, with `{user_account: generations}`
+    counted (default 1 each). They can be rebuilt from user_stats if this fails.
+    """
+    for user_stat in user_stats:
+        try:
+            await record_user_stats(user_stat, (generations or {}).get(user_stat.user_account, 1))
+        except Exception as e:
+            print(f"Error updating leaderboards for {user_stat.user_account}: {e}")
+
 
+# Generations waiting to be counted by `flush_user_stats`: user account -> count
+_pending_generations = Counter()
+
+
+async def update_user_stats(user_account: str, db: AsyncSession) -> list:
+    """
+    Count a generation in the user's stats, in the caller's transaction. Returns the
+    rows to pass to `publish_user_stats` after committing.
+
+    With USER_STATS_COALESCE, the generation is buffered in-process instead and
+    nothing is returned: bursts from the same wallet are merged and counted by
+    the next `flush_user_stats`.
+    """
+    if USER_STATS_COALESCE:
+        _pending_generations[user_account] += 1
+        return []
+    return await upsert_user_stats({user_account: 1}, db)
+
+
+async def flush_user_stats() -> int:
+    """
+    Count all buffered generations with one statement and commit. Returns the number
+    of generations counted; they are put back in the buffer if the write fails.
+    """
+    global _pending_generations
+    if not _pending_generations:
+        return 0
+    generations, _pending_generations = _pending_generations, Counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            user_stats = await upsert_user_stats(dict(generations), db)
+            await db.commit()
+    except Exception:
+        _pending_generations.update(generations)
+        raise
+    await publish_user_stats(user_stats, generations)
+    return sum(generations.values())
+
+
+async def run_user_stats_flusher():
+    """Flush buffered generations every USER_STATS_FLUSH_INTERVAL_SECONDS (run for the app's lifetime)."""
+    try:
+        while True:
+            await asyncio.sleep(USER_STATS_FLUSH_INTERVAL_SECONDS)
+            try:
+                await flush_user_stats()
+            except Exception as e:
+                print(f"Error flushing user stats: {e}")
+    except asyncio.CancelledError:
+        pass
+
+
+def fan_out_prompt(prompt_id: int, db: Session) -> int:
+    """
+    Push a new prompt into the timelines of its creator's followers (fan-out on write).
+
+    Creators with more than FANOUT_FOLLOWER_LIMIT followers are skipped; their prompts
+    are pulled into followers' feeds at read time instead. Returns the number of
+    timelines written to.
+    """
+    prompt = db.get(Prompt, prompt_id)
+    if not prompt:
+        return 0
+
+    # Only count as far as the limit, so large creators don't cost a full count
+    followers_count = db.execute(
+        select(func.count()).select_from(
+            select(socialfeed_models.Follow.id)
+            .filter(socialfeed_models.Follow.creator_account == prompt.account_address)
+            .limit(FANOUT_FOLLOWER_LIMIT + 1)
+            .subquery()
+        )
+    ).scalar_one()
+    if followers_count == 0 or followers_count > FANOUT_FOLLOWER_LIMIT:
+        return 0
+
+    followers = (
+        select(
+            socialfeed_models.Follow.follower_account,
+            literal(prompt.account_address),
+            literal(prompt.id),
+            literal(prompt.created_at, DateTime),
+        )
+        .filter(socialfeed_models.Follow.creator_account == prompt.account_address)
+        .distinct()
+    )
+    result = db.execute(
+        insert_for(db, socialfeed_models.TimelineEntry)
+        .from_select(['user_account', 'creator_account', 'prompt_id', 'created_at'], followers)
+        .on_conflict_do_nothing()
+    )
     db.commit()
 
+    return result.rowcount
+
+
+def backfill_timeline(follower_account: str, creator_account: str, db: Session) -> int:
+    """
+    Copy a newly followed creator's most recent prompts into the follower's timeline.
+    Returns the number of entries added.
+    """
+    recent_prompts = (
+        select(literal(follower_account), Prompt.account_address, Prompt.id, Prompt.created_at)
+        .filter(Prompt.account_address == creator_account)
+        .order_by(Prompt.created_at.desc())
+        .limit(TIMELINE_MAX_ENTRIES)
+    )
+    result = db.execute(
+        insert_for(db, socialfeed_models.TimelineEntry)
+        .from_select(['user_account', 'creator_account', 'prompt_id', 'created_at'], recent_prompts)
+        .on_conflict_do_nothing()
+    )
+    db.commit()
+
+    return result.rowcount
+
+
+def trim_timelines(db: Session) -> int:
+    """
+    Keep only the newest TIMELINE_MAX_ENTRIES entries of every timeline.
+    Returns the number of entries removed.
+    """
+    TimelineEntry = socialfeed_models.TimelineEntry
+    ranked = select(
+        TimelineEntry.id,
+        func.row_number().over(
+            partition_by=TimelineEntry.user_account,
+            order_by=(TimelineEntry.created_at.desc(), TimelineEntry.prompt_id.desc()),
+        ).label('position'),
+    ).subquery()
+
+    result = db.execute(
+        delete(TimelineEntry)
+        .where(TimelineEntry.id.in_(select(ranked.c.id).filter(ranked.c.position > TIMELINE_MAX_ENTRIES)))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount
+
+
+async def get_followed_celebrities(user_account: str, db: AsyncSession) -> list:
+    """
+    The creators `user_account` follows that are not fanned out on write because they
+    have more than FANOUT_FOLLOWER_LIMIT followers.
+    """
+    Follow = socialfeed_models.Follow
+    others = aliased(Follow)
+    # Only count as far as the limit, as fan_out_prompt does, so a big creator costs
+    # at most FANOUT_FOLLOWER_LIMIT + 1 entries of ix_follows_creator_account_id
+    over_limit = (
+        select(others.id)
+        .filter(others.creator_account == Follow.creator_account)
+        .offset(FANOUT_FOLLOWER_LIMIT)
+        .exists()
+    )
+    result = await db.execute(
+        select(Follow.creator_account).filter(Follow.follower_account == user_account, over_limit).distinct()
+    )
+    return result.scalars().all()
+
+
+async def read_following_timeline(
+    user_account: str,
+    db: AsyncSession,
+    page_size: int,
+    after: Optional[list] = None,
+    page: int = 1,
+    include_total: Optional[bool] = None,
+) -> Page:
+    """
+    Read a page of the user's following feed, newest first.
+
+    Entries fanned out to the user's own timeline are merged with prompts pulled from
+    followed creators that are too big to fan out. `after` holds decoded
+    `(created_at, prompt_id)` cursor values; without it the legacy `page` offset is used.
+    """
+    TimelineEntry = socialfeed_models.TimelineEntry
+    if include_total is None:
+        include_total = after is None
+    window = page_size + 1 if after is not None else page * page_size + 1
+
+    pushed = select(TimelineEntry.created_at, TimelineEntry.prompt_id).filter(TimelineEntry.user_account == user_account)
+    pushed_page = pushed
+    if after is not None:
+        pushed_page = pushed.filter(tuple_(TimelineEntry.created_at, TimelineEntry.prompt_id) < tuple_(*after))
+    rows = (
+        await db.execute(pushed_page.order_by(TimelineEntry.created_at.desc(), TimelineEntry.prompt_id.desc()).limit(window))
+    ).all()
+
+    celebrities = await get_followed_celebrities(user_account, db)
+    pulled = None
+    if celebrities:
+        pulled = select(Prompt.created_at, Prompt.id).filter(Prompt.account_address.in_(celebrities))
+        pulled_page = pulled
+        if after is not None:
+            pulled_page = pulled.filter(tuple_(Prompt.created_at, Prompt.id) < tuple_(*after))
+        rows += (await db.execute(pulled_page.order_by(Prompt.created_at.desc(), Prompt.id.desc()).limit(window))).all()
+
+    # Merge both streams newest first; a prompt can be in both if its creator crossed the limit
+    merged = sorted({prompt_id: created_at for created_at, prompt_id in rows}.items(), key=lambda row: (row[1], row[0]), reverse=True)
+    if after is None:
+        merged = merged[(page - 1) * page_size:]
+    has_more = len(merged) > page_size
+    merged = merged[:page_size]
+
+    prompt_ids = [prompt_id for prompt_id, _ in merged]
+    prompts_by_id = {
+        prompt.id: prompt
+        for prompt in (await db.execute(select(Prompt).filter(Prompt.id.in_(prompt_ids)))).scalars()
+    }
+    items = [prompts_by_id[prompt_id] for prompt_id in prompt_ids if prompt_id in prompts_by_id]
+
+    next_cursor = None
+    if has_more:
+        last_prompt_id, last_created_at = merged[-1]
+        next_cursor = encode_cursor([last_created_at, last_prompt_id])
+
+    # The whole timeline, like paginate_keyset, not just what is left after the cursor
+    total = None
+    if include_total:
+        total = await count(db, pushed)
+        if pulled is not None:
+            total += await count(db, pulled)
+
+    return Page(items=items, total=total, next_cursor=next_cursor)
+
+
+# Comments shown under each prompt in the feeds
+TOP_COMMENTS_LIMIT = 2
+
+
+def _top_comments_cache_key(prompt_id: int) -> str:
+    return f"cache:top-comments:{prompt_id}"
+
+
+async def get_top_comments(prompt_ids: list, db: AsyncSession, limit: int = TOP_COMMENTS_LIMIT) -> dict:
+    """
+    The newest `limit` comments of each prompt, as `{prompt_id: [comment, ...]}`.
+
+    All prompts are read in one query ranked per prompt with ROW_NUMBER(), so a
+    prompt with many comments cannot crowd out the others. With the default limit,
+    each prompt's comments are cached for TOP_COMMENTS_CACHE_SECONDS under the prompt's
+    cache tag, which `comment_prompt` invalidates.
+    """
+    prompt_ids = list(dict.fromkeys(prompt_ids))
+    top_comments = {}
+    use_cache = TOP_COMMENTS_CACHE_SECONDS > 0 and limit == TOP_COMMENTS_LIMIT
+    missing = prompt_ids
+    if use_cache and prompt_ids:
+        entries = await response_cache.get_many([_top_comments_cache_key(prompt_id) for prompt_id in prompt_ids])
+        for prompt_id, entry in zip(prompt_ids, entries):
+            record_cache("top_comments", hit=entry is not None)
+            if entry is not None:
+                top_comments[prompt_id] = entry["value"]
+        missing = [prompt_id for prompt_id in prompt_ids if prompt_id not in top_comments]
+    if not missing:
+        return top_comments
+
+    PostComment = socialfeed_models.PostComment
+    ranked = (
+        select(
+            PostComment.prompt_id,
+            PostComment.user_account,
+            PostComment.comment,
+            PostComment.created_at,
+            func.row_number().over(
+                partition_by=PostComment.prompt_id,
+                order_by=(PostComment.created_at.desc(), PostComment.id.desc()),
+            ).label("position"),
+        )
+        .filter(PostComment.prompt_id.in_(missing))
+        .subquery()
+    )
+    # Cached entries are read from the primary, so a comment invalidating them cannot be missed on refill
+    async with (primary_session(db) if use_cache else nullcontext(db)) as read_db:
+        rows = await read_db.execute(
+            select(ranked.c.prompt_id, ranked.c.user_account, ranked.c.comment, ranked.c.created_at)
+            .filter(ranked.c.position <= limit)
+            .order_by(ranked.c.prompt_id, ranked.c.position)
+        )
+    fetched = {prompt_id: [] for prompt_id in missing}
+    for row in rows:
+        fetched[row.prompt_id].append({
+            "user_account": row.user_account,
+            "comment": row.comment,
+            "created_at": row.created_at,
+        })
+
+    if use_cache:
+        await response_cache.set_many(
+            [
+                (_top_comments_cache_key(prompt_id), jsonable_encoder(comments), [prompt_cache_tag(prompt_id)])
+                for prompt_id, comments in fetched.items()
+            ],
+            TOP_COMMENTS_CACHE_SECONDS,
+        )
+    top_comments.update(fetched)
+    return top_comments
+
+
+TOP_PROMPTS_LIMIT = 5
+
+
+def _top_prompts_cache_key(account_address: str) -> str:
+    return f"cache:top-prompts:{account_address}"
+
+
+async def get_top_prompts(accounts: list, db: AsyncSession, limit: int = TOP_PROMPTS_LIMIT) -> dict:
+    """
+    The `limit` most liked prompts of each account, as `{account: [prompt, ...]}`.
+
+    All accounts are read in one query ranked per account with ROW_NUMBER(). With the
+    default limit, each account's prompts are cached for TOP_PROMPTS_CACHE_SECONDS
+    under the creator's tag (invalidated when they post) and the tags of the prompts
+    shown (invalidated on likes and comments).
+    """
+    accounts = list(dict.fromkeys(accounts))
+    top_prompts = {}
+    use_cache = TOP_PROMPTS_CACHE_SECONDS > 0 and limit == TOP_PROMPTS_LIMIT
+    missing = accounts
+    if use_cache and accounts:
+        entries = await response_cache.get_many([_top_prompts_cache_key(account) for account in accounts])
+        for account, entry in zip(accounts, entries):
+            record_cache("top_prompts", hit=entry is not None)
+            if entry is not None:
+                top_prompts[account] = entry["value"]
+        missing = [account for account in accounts if account not in top_prompts]
+    if not missing:
+        return top_prompts
+
+    ranked = (
+        select(
+            Prompt.id,
+            Prompt.account_address,
+            Prompt.prompt,
+            Prompt.ipfs_image_url,
+            Prompt.likes_count,
+            Prompt.comments_count,
+            Prompt.created_at,
+            func.row_number().over(
+                partition_by=Prompt.account_address,
+                order_by=(Prompt.likes_count.desc(), Prompt.id.desc()),
+            ).label("position"),
+        )
+        .filter(Prompt.account_address.in_(missing))
+        .subquery()
+    )
+    # Read from the primary when caching, like get_top_comments
+    async with (primary_session(db) if use_cache else nullcontext(db)) as read_db:
+        rows = await read_db.execute(
+            select(ranked).filter(ranked.c.position <= limit).order_by(ranked.c.account_address, ranked.c.position)
+        )
+    fetched = {account: [] for account in missing}
+    for row in rows:
+        fetched[row.account_address].append({
+            "prompt": row.prompt,
+            "prompt_id": row.id,
+            "ipfs_image_url": row.ipfs_image_url,
+            "likes": row.likes_count,
+            "comments": row.comments_count,
+            "created_at": row.created_at,
+        })
+
+    if use_cache:
+        await response_cache.set_many(
+            [
+                (
+                    _top_prompts_cache_key(account),
+                    jsonable_encoder(prompts),
+                    [creator_cache_tag(account), *(prompt_cache_tag(prompt["prompt_id"]) for prompt in prompts)],
+                )
+                for account, prompts in fetched.items()
+            ],
+            TOP_PROMPTS_CACHE_SECONDS,
+        )
+    top_prompts.update(fetched)
+    return top_prompts
+
+
+async def get_viewer_likes(prompt_types: dict, viewer_account: str, db: AsyncSession) -> set:
+    """
+    Which of the prompts (`{prompt_id: prompt_type}`) the viewer has liked, read with
+    one `IN` query. Likes still waiting in the write-behind buffer count too.
+    """
+    if not prompt_types:
+        return set()
+    PostLike = socialfeed_models.PostLike
+    liked = set((await db.execute(
+        select(PostLike.prompt_id).filter(
+            PostLike.user_account == viewer_account, PostLike.prompt_id.in_(list(prompt_types))
+        )
+    )).scalars().all())
+    if LIKE_WRITE_BEHIND:
+        buffered = await get_buffered_like_states(prompt_types, viewer_account)
+        liked.update(prompt_id for prompt_id, (_, user_liked) in buffered.items() if user_liked)
+    return liked
+
+
+async def get_viewer_follows(creator_accounts, viewer_account: str, db: AsyncSession) -> set:
+    """Which of the creators the viewer follows, read with one `IN` query."""
+    creator_accounts = list(set(creator_accounts))
+    if not creator_accounts:
+        return set()
+    Follow = socialfeed_models.Follow
+    return set((await db.execute(
+        select(Follow.creator_account).filter(
+            Follow.follower_account == viewer_account, Follow.creator_account.in_(creator_accounts)
+        )
+    )).scalars().all())
+
+
+def with_viewer_flags(prompt_type: PromptTypeEnum, items_field: str = "prompts"):
+    """
+    Add an optional `viewer_account` query parameter to a prompt listing route. When
+    it is given, every item gets `user_liked` and `following_creator`, computed for
+    the whole page with one batched query each.
+
+    The flags are added after the (possibly cached) response is built, so cached
+    listings stay shared between viewers. Their session is only opened, and its
+    admission slot only taken, once the listing is built and a viewer is given.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        extra_parameters = [
+            inspect.Parameter("viewer_account", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Optional[str]),
+            inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ]
+
+        @functools.wraps(func)
+        async def wrapper(*args, request: Request, viewer_account: Optional[str] = None, **kwargs):
+            response = jsonable_encoder(await func(*args, **kwargs))
+            if not viewer_account:
+                return response
+            items = response[items_field]
+            async with request_session(request) as db:
+                liked = await get_viewer_likes({item["id"]: prompt_type for item in items}, viewer_account, db)
+                followed = await get_viewer_follows((item["account_address"] for item in items), viewer_account, db)
+            # A new dict, so a cached response is never modified in place
+            return {
+                **response,
+                items_field: [
+                    {**item, "user_liked": item["id"] in liked, "following_creator": item["account_address"] in followed}
+                    for item in items
+                ],
+            }
+
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), *extra_parameters])
+        return wrapper
+    return decorator
+
+
+async def add_like(prompt_id: int, prompt_type: PromptTypeEnum, user_account: str, db: AsyncSession) -> bool:
+    """
+    Insert a like in one statement, if the prompt exists and the user has not liked
+    it yet (the unique constraint decides, so concurrent repeats cannot both land).
+    Returns whether a like was added; the caller commits.
+    """
+    PostLike = socialfeed_models.PostLike
+    like = select(
+        literal(prompt_id),
+        literal(prompt_type, type_=PostLike.prompt_type.type),
+        literal(user_account),
+    ).where(exists().where(Prompt.id == prompt_id, Prompt.prompt_type == prompt_type))
+    inserted = await db.execute(
+        insert_for(db, PostLike)
+        .from_select(["prompt_id", "prompt_type", "user_account"], like)
+        .on_conflict_do_nothing(index_elements=["prompt_id", "user_account"])
+        .returning(PostLike.id)
+    )
+    return inserted.first() is not None
+
+
+async def add_follow(follower_account: str, creator_account: str, db: AsyncSession) -> bool:
+    """Insert a follow unless it already exists. Returns whether it was added; the caller commits."""
+    Follow = socialfeed_models.Follow
+    inserted = await db.execute(
+        insert_for(db, Follow)
+        .values(follower_account=follower_account, creator_account=creator_account)
+        .on_conflict_do_nothing(index_elements=["follower_account", "creator_account"])
+        .returning(Follow.id)
+    )
+    return inserted.first() is not None
+
+
+# Write-behind likes: accepted likes wait in this Redis list until a flush inserts them
+LIKE_BUFFER_KEY = "likes:buffer"
+# The batch being inserted. It stays here until committed, so a crashed flush is retried
+LIKE_PROCESSING_KEY = "likes:processing"
+# Buffered likes that cannot be inserted (bad payload, prompt deleted since it was liked)
+LIKE_DEAD_LETTER_KEY = "likes:dead-letter"
+# Held by the worker currently flushing, and extended with every batch it claims
+LIKE_FLUSH_LOCK = "likes:flush-lock"
+LIKE_FLUSH_LOCK_SECONDS = 60
+# Errors that a single like will keep raising however often it is retried
+PERMANENT_LIKE_ERRORS = (IntegrityError, DataError, ValueError, KeyError, TypeError)
+
+# Outcomes of `buffer_like`
+LIKE_ACCEPTED = "accepted"
+LIKE_DUPLICATE = "duplicate"
+LIKE_PROMPT_NOT_FOUND = "not_found"
+LIKE_BUFFER_UNAVAILABLE = "unavailable"
+
+# KEYS: like count, likers set, buffer. ARGV: user, buffered like, ttl.
+# Returns -1 if the prompt's like state is not loaded, -2 for a repeat like, else the new count.
+_BUFFER_LIKE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 0 then return -1 end
+if redis.call('sadd', KEYS[2], ARGV[1]) == 0 then return -2 end
+redis.call('rpush', KEYS[3], ARGV[2])
+redis.call('expire', KEYS[1], ARGV[3])
+redis.call('expire', KEYS[2], ARGV[3] + 60)
+return redis.call('incr', KEYS[1])
+"""
+
+
+def _like_keys(prompt_id: int, prompt_type: PromptTypeEnum) -> tuple:
+    return f"likes:count:{prompt_type.value}:{prompt_id}", f"likes:users:{prompt_type.value}:{prompt_id}"
+
+
+async def _load_like_state(client, prompt_id: int, prompt_type: PromptTypeEnum, db: AsyncSession) -> bool:
+    """Copy a prompt's like count and likers into Redis. False if the prompt does not exist."""
+    prompt = (await db.execute(
+        select(Prompt.likes_count).filter(Prompt.id == prompt_id, Prompt.prompt_type == prompt_type)
+    )).first()
+    if prompt is None:
+        return False
+    likers = (await db.execute(
+        select(socialfeed_models.PostLike.user_account).filter(
+            socialfeed_models.PostLike.prompt_id == prompt_id,
+            socialfeed_models.PostLike.prompt_type == prompt_type,
+        )
+    )).scalars().all()
+
+    count_key, users_key = _like_keys(prompt_id, prompt_type)
+    async with client.pipeline(transaction=False) as pipe:
+        for i in range(0, len(likers), 5000):
+            pipe.sadd(users_key, *likers[i:i + 5000])
+        pipe.expire(users_key, LIKE_CACHE_SECONDS + 60)
+        # The count is written last: its presence marks the likers set as complete
+        pipe.set(count_key, prompt.likes_count or 0, nx=True, ex=LIKE_CACHE_SECONDS)
+        await pipe.execute()
+    return True
+
+
+# KEYS: lock, buffer, processing. ARGV: token, batch size, lock ttl in ms.
+# Returns nil if the lock is no longer held. Otherwise extends it and returns the batch
+# in processing, first moving up to a batch from the buffer if none is left over.
+_CLAIM_LIKES_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then return false end
+redis.call('pexpire', KEYS[1], ARGV[3])
+if redis.call('llen', KEYS[3]) == 0 then
+    local batch = redis.call('lrange', KEYS[2], 0, ARGV[2] - 1)
+    if #batch > 0 then
+        redis.call('rpush', KEYS[3], unpack(batch))
+        redis.call('ltrim', KEYS[2], #batch, -1)
+    end
+end
+return redis.call('lrange', KEYS[3], 0, -1)
+"""
+
+# KEYS: lock, processing, dead letter. ARGV: token, lock ttl in ms, likes to dead-letter...
+# Drops the committed batch only if the lock is still held; returns 0 otherwise.
+_FINISH_LIKES_SCRIPT = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('del', KEYS[2])
+if #ARGV > 2 then redis.call('rpush', KEYS[3], unpack(ARGV, 3)) end
+redis.call('pexpire', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+async def buffer_like(prompt_id: int, prompt_type: PromptTypeEnum, user_account: str, db: AsyncSession) -> tuple:
+    """
+    Accept a like without writing it to the database: the prompt and repeat likes are
+    checked against state cached in Redis, and the like is queued for
+    `flush_buffered_likes`. Returns `(outcome, total_likes)`; the outcome is
+    LIKE_BUFFER_UNAVAILABLE without Redis, and the caller should write the like directly.
+    """
+    client = await get_redis()
+    if client is None:
+        return LIKE_BUFFER_UNAVAILABLE, None
+
+    count_key, users_key = _like_keys(prompt_id, prompt_type)
+    payload = json.dumps({
+        "prompt_id": prompt_id,
+        "prompt_type": prompt_type.value,
+        "user_account": user_account,
+        "created_at": datetime.utcnow().isoformat(),
+    })
+    keys_and_args = (3, count_key, users_key, LIKE_BUFFER_KEY, user_account, payload, LIKE_CACHE_SECONDS)
+
+    result = await client.eval(_BUFFER_LIKE_SCRIPT, *keys_and_args)
+    if result == -1:
+        if not await _load_like_state(client, prompt_id, prompt_type, db):
+            return LIKE_PROMPT_NOT_FOUND, None
+        result = await client.eval(_BUFFER_LIKE_SCRIPT, *keys_and_args)
+    if result == -2:
+        return LIKE_DUPLICATE, None
+    return LIKE_ACCEPTED, result
+
+
+async def get_buffered_like_state(prompt_id: int, prompt_type: PromptTypeEnum, user_account: str) -> tuple:
+    """
+    `(likes_count, user_liked)` including likes not yet flushed; `(None, False)` when
+    nothing is cached for the prompt.
+    """
+    states = await get_buffered_like_states({prompt_id: prompt_type}, user_account)
+    return states.get(prompt_id, (None, False))
+
+
+async def get_buffered_like_states(prompt_types: dict, user_account: str) -> dict:
+    """
+    `get_buffered_like_state` for many prompts (`{prompt_id: prompt_type}`) in one
+    Redis round trip, as `{prompt_id: (likes_count, user_liked)}`. Empty without Redis.
+    """
+    client = await get_redis()
+    if client is None or not prompt_types:
+        return {}
+    async with client.pipeline(transaction=False) as pipe:
+        for prompt_id, prompt_type in prompt_types.items():
+            count_key, users_key = _like_keys(prompt_id, prompt_type)
+            pipe.get(count_key)
+            pipe.sismember(users_key, user_account)
+        results = await pipe.execute()
+    return {
+        prompt_id: ((int(likes_count) if likes_count is not None else None), bool(user_liked))
+        for prompt_id, likes_count, user_liked in zip(prompt_types, results[::2], results[1::2])
+    }
+
+
+async def insert_likes(likes: list, db: AsyncSession) -> dict:
+    """
+    Insert buffered likes with one multi-row statement and bump each prompt's
+    counter by the likes actually added. Likes already stored are skipped by the
+    unique constraint, so a batch can be retried safely. Returns `{prompt_id: (prompt_type, added)}`.
+    """
+    PostLike = socialfeed_models.PostLike
+    # One row per (prompt, user): a statement may not hit the same conflict twice
+    pending = {(like["prompt_id"], like["user_account"]): like for like in likes}
+    rows = [
+        {
+            "prompt_id": like["prompt_id"],
+            "prompt_type": PromptTypeEnum(like["prompt_type"]),
+            "user_account": like["user_account"],
+            "created_at": datetime.fromisoformat(like["created_at"]),
+        }
+        for like in pending.values()
+    ]
+    if not rows:
+        return {}
+
+    inserted = (await db.execute(
+        insert_for(db, PostLike)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["prompt_id", "user_account"])
+        .returning(PostLike.prompt_id)
+    )).scalars().all()
+    added = Counter(inserted)
+    for prompt_id, likes_added in added.items():
+        await db.execute(
+            update(Prompt)
+            .where(Prompt.id == prompt_id)
+            .values(likes_count=Prompt.likes_count + likes_added)
+            .execution_options(synchronize_session=False)
+        )
+        await add_activity_to_bucket(prompt_id, db, likes=likes_added)
+    await db.commit()
+
+    prompt_types = {row["prompt_id"]: row["prompt_type"] for row in rows}
+    return {prompt_id: (prompt_types[prompt_id], likes_added) for prompt_id, likes_added in added.items()}
+
+
+async def insert_like_batch(payloads: list) -> tuple:
+    """
+    Insert a batch of buffered likes, as `insert_likes`. If the batch fails, its likes
+    are retried one by one and those failing with a PERMANENT_LIKE_ERRORS error are
+    set aside. Returns `(added, rejected payloads)`; other errors propagate, so the
+    batch is retried by the next flush.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            return await insert_likes([json.loads(payload) for payload in payloads], db), []
+    except PERMANENT_LIKE_ERRORS as e:
+        print(f"Error flushing {len(payloads)} buffered likes, retrying them one by one: {e}")
+
+    added, rejected = {}, []
+    for payload in payloads:
+        try:
+            async with AsyncSessionLocal() as db:
+                inserted = await insert_likes([json.loads(payload)], db)
+        except PERMANENT_LIKE_ERRORS as e:
+            print(f"Moving buffered like {payload} to {LIKE_DEAD_LETTER_KEY}: {e}")
+            rejected.append(payload)
+            continue
+        for prompt_id, (prompt_type, likes_added) in inserted.items():
+            added[prompt_id] = (prompt_type, added.get(prompt_id, (prompt_type, 0))[1] + likes_added)
+    return added, rejected
+
+
+async def flush_buffered_likes() -> int:
+    """
+    Move buffered likes into the database in batches of LIKE_FLUSH_BATCH_SIZE.
+
+    One worker flushes at a time. Each batch is moved to LIKE_PROCESSING_KEY and
+    only dropped from there once committed, and only while this worker still holds
+    the lock: if a slow batch lets the lock expire, the next holder retries it
+    instead of losing it (inserting likes twice is a no-op). Likes that can never be
+    inserted go to LIKE_DEAD_LETTER_KEY. Returns the number of likes taken from the buffer.
+    """
+    client = await get_redis()
+    if client is None:
+        return 0
+    token = uuid.uuid4().hex
+    lock_ms = LIKE_FLUSH_LOCK_SECONDS * 1000
+    if not await client.set(LIKE_FLUSH_LOCK, token, nx=True, px=lock_ms):
+        return 0
+
+    flushed = 0
+    try:
+        while True:
+            payloads = await client.eval(
+                _CLAIM_LIKES_SCRIPT, 3, LIKE_FLUSH_LOCK, LIKE_BUFFER_KEY, LIKE_PROCESSING_KEY,
+                token, LIKE_FLUSH_BATCH_SIZE, lock_ms,
+            )
+            if not payloads:
+                break
+            added, rejected = await insert_like_batch(payloads)
+            finished = await client.eval(
+                _FINISH_LIKES_SCRIPT, 3, LIKE_FLUSH_LOCK, LIKE_PROCESSING_KEY, LIKE_DEAD_LETTER_KEY,
+                token, lock_ms, *rejected,
+            )
+            if added:
+                await response_cache.invalidate(*(prompt_cache_tag(prompt_id) for prompt_id in added))
+            if not finished:
+                print("Lost the like flush lock; the next flush retries the batch")
+                break
+            flushed += len(payloads)
+
+            if len(payloads) < LIKE_FLUSH_BATCH_SIZE:
+                break
+    finally:
+        await client.eval(RELEASE_LOCK_SCRIPT, 1, LIKE_FLUSH_LOCK, token)
+
+    return flushed
+
+
+async def run_like_flusher():
+    """Flush buffered likes every LIKE_FLUSH_INTERVAL_SECONDS (run for the app's lifetime)."""
+    try:
+        while True:
+            await asyncio.sleep(LIKE_FLUSH_INTERVAL_SECONDS)
+            try:
+                await flush_buffered_likes()
+            except Exception as e:
+                print(f"Error flushing buffered likes: {e}")
+    except asyncio.CancelledError:
+        pass
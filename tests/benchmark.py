@@ -0,0 +1,226 @@
+"""
+In-process benchmark of every router, run against seeded data (see tests/seed.py).
+
+Requests go straight to the ASGI app through httpx, so results measure the app
+and the database rather than the network. For each scenario the run reports
+p50/p95/p99 latency and SQL queries per request (from the X-DB-Query-Count
+header). It can compare against a stored baseline and exit non-zero when a
+scenario regresses.
+
+    SQLALCHEMY_DATABASE_URL=sqlite:///bench.db python -m tests.benchmark --save-baseline tests/bench_baseline.json
+    SQLALCHEMY_DATABASE_URL=sqlite:///bench.db python -m tests.benchmark --baseline tests/bench_baseline.json
+
+Use tests/locustfile.py for the same routes over HTTP against a running server.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+
+# Query counts come from the dev-mode headers; the budget check would only add noise here
+os.environ.setdefault("DEV_MODE", "true")
+os.environ.setdefault("QUERY_COUNT_THRESHOLD", "0")
+
+import httpx  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.core.database import get_session_with_ctx_manager  # noqa: E402
+from app.leaderboard.models import UserStats  # noqa: E402
+from app.main import app  # noqa: E402
+from app.prompts.models import Prompt  # noqa: E402
+from app.socialfeed.models import Follow  # noqa: E402
+
+
+class Scenario:
+    """A named request; `build(rng, n)` returns (method, url, params, json) for the n-th call."""
+
+    def __init__(self, name: str, build):
+        self.name = name
+        self.build = build
+
+
+def load_samples() -> dict:
+    """Real ids and accounts from the seeded database for the scenarios to request."""
+    with get_session_with_ctx_manager() as db:
+        prompts = db.execute(select(Prompt.id, Prompt.prompt_type).limit(5000)).all()
+        follows = db.execute(select(Follow.follower_account, Follow.creator_account).limit(5000)).all()
+        ranked = db.execute(select(UserStats.user_account).limit(5000)).scalars().all()
+    if not prompts or not follows or not ranked:
+        sys.exit("No seeded data found; run `python -m tests.seed` first.")
+    return {
+        "prompts": [(prompt_id, prompt_type.value) for prompt_id, prompt_type in prompts],
+        "followers": sorted({follower for follower, _ in follows}),
+        "creators": sorted({creator for _, creator in follows}),
+        "ranked": ranked,
+        # Not from the seeded rng: reruns on the same database must write new likes and follows
+        "run_id": int.from_bytes(os.urandom(4), "big"),
+    }
+
+
+def build_scenarios(samples: dict) -> list:
+    prompts, followers, creators, ranked = samples["prompts"], samples["followers"], samples["creators"], samples["ranked"]
+    run_id = samples["run_id"]
+
+    def get(path, params=lambda rng, n: {}):
+        return lambda rng, n: ("GET", path, params(rng, n), None)
+
+    def post(path, body=lambda rng, n: {}, params=lambda rng, n: {}):
+        return lambda rng, n: ("POST", path, params(rng, n), body(rng, n))
+
+    def viewer(rng, n):
+        return {"user_account": rng.choice(followers)}
+
+    def fresh_account(n):
+        # Unique per call so write paths never hit "already liked" or "already following"
+        return f"0xbench{run_id:08x}{n:056x}"
+
+    def like(rng, n):
+        prompt_id, prompt_type = rng.choice(prompts)
+        return {"prompt_id": prompt_id, "prompt_type": prompt_type, "user_account": fresh_account(n)}
+
+    def comment(rng, n):
+        prompt_id, prompt_type = rng.choice(prompts)
+        return {"prompt_id": prompt_id, "prompt_type": prompt_type, "user_account": rng.choice(followers), "comment": "benchmark"}
+
+    return [
+        Scenario("prompts.get_public_prompts", get("/prompts/get-public-prompts/", lambda rng, n: {"page": rng.randint(1, 10)})),
+        Scenario("prompts.filter_public_prompts", post("/prompts/filter-public-prompts/", lambda rng, n: {"prompt_tag": rng.choice(["Anime", "3D Art", "all"]), "page": rng.randint(1, 5)})),
+        Scenario("marketplace.get_premium_prompts", get("/marketplace/get-premium-prompts/", lambda rng, n: {"page": rng.randint(1, 10)})),
+        Scenario("marketplace.filter_recent", post("/marketplace/filter-premium-prompts/", lambda rng, n: {"filter_type": "recent"})),
+        Scenario("marketplace.filter_popular", post("/marketplace/filter-premium-prompts/", lambda rng, n: {"filter_type": "popular"})),
+        Scenario("marketplace.filter_trending", post("/marketplace/filter-premium-prompts/", lambda rng, n: {"filter_type": "trending"})),
+        Scenario("socialfeed.feed", get("/socialfeed/feed/", viewer)),
+        Scenario("socialfeed.feed_followers", get("/socialfeed/feed/followers/", viewer)),
+        Scenario("socialfeed.feed_following", get("/socialfeed/feed/following/", viewer)),
+        Scenario("socialfeed.feed_combined", get("/socialfeed/feed/combined/", viewer)),
+        Scenario("socialfeed.creator_followers", get("/socialfeed/creator-followers/", lambda rng, n: {"creator_account": rng.choice(creators)})),
+        Scenario("socialfeed.user_following", get("/socialfeed/user-following/", lambda rng, n: {"follower_account": rng.choice(followers)})),
+        Scenario("socialfeed.prompt_comments", get("/socialfeed/get-prompt-comments/", lambda rng, n: dict(zip(("prompt_id", "prompt_type"), rng.choice(prompts))))),
+        Scenario("socialfeed.prompt_likes", get("/socialfeed/prompt-likes/", lambda rng, n: {"prompt_id": rng.choice(prompts)[0], "account_address": rng.choice(followers)})),
+        Scenario("leaderboard.generations_24h", get("/leaderboard/generations-24h/", lambda rng, n: {"page": rng.randint(1, 5)})),
+        Scenario("leaderboard.streaks", get("/leaderboard/streaks/", lambda rng, n: {"page": rng.randint(1, 5)})),
+        Scenario("leaderboard.xp", get("/leaderboard/xp/", lambda rng, n: {"page": rng.randint(1, 5)})),
+        Scenario("leaderboard.rank", get("/leaderboard/rank/", lambda rng, n: {"user_account": rng.choice(ranked), "board": rng.choice(["xp", "streaks", "generations"])})),
+        Scenario("write.like_prompt", post("/socialfeed/like-prompt/", like)),
+        Scenario("write.comment_prompt", post("/socialfeed/comment-prompt/", comment)),
+        Scenario("write.follow_creator", post("/socialfeed/follow-creator/", params=lambda rng, n: {"follower_account": fresh_account(n), "creator_account": rng.choice(creators)})),
+    ]
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, rng: random.Random, counter, args) -> dict:
+    latencies, queries, errors = [], [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(record: bool):
+        nonlocal errors
+        method, url, params, body = scenario.build(rng, next(counter))
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, params=params, json=body)
+            elapsed = time.perf_counter() - started
+        if not record:
+            return
+        if response.status_code >= 400:
+            errors += 1
+        latencies.append(elapsed * 1000)
+        if "x-db-query-count" in response.headers:
+            queries.append(int(response.headers["x-db-query-count"]))
+
+    await asyncio.gather(*(one(False) for _ in range(args.warmup)))
+    await asyncio.gather(*(one(True) for _ in range(args.requests)))
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, noise_ms: float) -> list:
+    """Scenarios that got slower than the baseline allows, or started running more queries."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        allowed_p95 = before["p95_ms"] * (1 + tolerance) + noise_ms
+        if result["p95_ms"] > allowed_p95:
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms > {allowed_p95:.2f}ms allowed (baseline {before['p95_ms']}ms)")
+        if (result["queries_per_request"] or 0) > (before.get("queries_per_request") or 0) + 0.5:
+            regressions.append(f"{name}: {result['queries_per_request']} queries/request, baseline {before['queries_per_request']}")
+        if result["errors"] > before.get("errors", 0):
+            regressions.append(f"{name}: {result['errors']} errors, baseline {before.get('errors', 0)}")
+    return regressions
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    samples = load_samples()
+    scenarios = [s for s in build_scenarios(samples) if not args.only or any(part in s.name for part in args.only)]
+    counter = itertools.count()
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(client, scenario, rng, counter, args)
+                result = results[scenario.name]
+                print(
+                    f"{scenario.name:<34} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+                    f"p99 {result['p99_ms']:>8.2f}ms  queries/req {result['queries_per_request']}  errors {result['errors']}"
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every router in-process against seeded data.")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--only", nargs="*", help="Run only scenarios whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Compare against this results file and fail on regressions")
+    parser.add_argument("--save-baseline", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p95 slowdown")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="Absolute p95 slack for very fast routes")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.noise_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+import tempfile
+
+# The app reads its configuration at import time; tests always run on a throwaway
+# SQLite database with the in-process fallbacks, whatever the environment or .env says
+os.environ["SQLALCHEMY_DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ["SQLALCHEMY_REPLICA_URL"] = ""
+os.environ["REDIS_URL"] = "unreachable://"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.database import Base, engine
+from app.main import app
+
+
+@pytest.fixture
+def client():
+    """A client for the app on empty tables."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with TestClient(app) as client:
+        yield client
@@ -1,5 +1,32 @@
+import os
 import random
-from locust import HttpUser, TaskSet, task, between
+from locust import HttpUser, TaskSet, task, between, events
+
+# Match the volumes passed to `python -m tests.seed` so requests hit seeded rows
+SEEDED_USERS = int(os.getenv("BENCH_USERS", 1000))
+SEEDED_PROMPTS = int(os.getenv("BENCH_PROMPTS", 5000))
+
+
+def seeded_account():
+    """A random account created by tests/seed.py."""
+    return "0x" + f"{random.randrange(SEEDED_USERS):064x}"
+
+
+# Queries per request, from the X-DB-Query-Count header the server sends in DEV_MODE
+query_counts = {}
+
+
+@events.request.add_listener
+def record_query_count(name, response=None, exception=None, **kwargs):
+    if response is not None and "X-DB-Query-Count" in response.headers:
+        query_counts.setdefault(name, []).append(int(response.headers["X-DB-Query-Count"]))
+
+
+@events.quitting.add_listener
+def report_query_counts(environment, **kwargs):
+    for name, counts in sorted(query_counts.items()):
+        print(f"{name:<50} {sum(counts) / len(counts):6.2f} queries/request")
+
 
 class UserBehavior(TaskSet):
     @task(1)
@@ -33,6 +60,54 @@ class UserBehavior(TaskSet):
         }
         self.client.post("/prompts/filter-public-prompts/", json=payload)
 
+    @task(1)
+    def filter_premium_prompts(self):
+        """
+        Test for the recent, popular and trending marketplace filters.
+        """
+        payload = {"filter_type": random.choice(["recent", "popular", "trending"]), "page": random.randint(1, 5)}
+        self.client.post("/marketplace/filter-premium-prompts/", json=payload, name="/marketplace/filter-premium-prompts/")
+
+    @task(3)
+    def get_feeds(self):
+        """
+        Test for the social feeds of a seeded user.
+        """
+        path = random.choice(["/socialfeed/feed/", "/socialfeed/feed/followers/", "/socialfeed/feed/following/", "/socialfeed/feed/combined/"])
+        self.client.get(f"{path}?user_account={seeded_account()}", name=path)
+
+    @task(1)
+    def get_follow_lists(self):
+        """
+        Test for a creator's followers and a user's followed creators.
+        """
+        account = seeded_account()
+        if random.random() < 0.5:
+            self.client.get(f"/socialfeed/creator-followers/?creator_account={account}", name="/socialfeed/creator-followers/")
+        else:
+            self.client.get(f"/socialfeed/user-following/?follower_account={account}", name="/socialfeed/user-following/")
+
+    @task(1)
+    def get_leaderboards(self):
+        """
+        Test for the leaderboards and rank lookups.
+        """
+        path = random.choice(["/leaderboard/generations-24h/", "/leaderboard/streaks/", "/leaderboard/xp/"])
+        self.client.get(f"{path}?page={random.randint(1, 5)}", name=path)
+        self.client.get(f"/leaderboard/rank/?user_account={seeded_account()}", name="/leaderboard/rank/")
+
+    @task(1)
+    def like_prompt(self):
+        """
+        Test for liking a prompt (write path).
+        """
+        payload = {
+            "prompt_id": random.randint(1, SEEDED_PROMPTS),
+            "prompt_type": random.choice(["public", "premium"]),
+            "user_account": seeded_account(),
+        }
+        self.client.post("/socialfeed/like-prompt/", json=payload)
+
 class APIUser(HttpUser):
     tasks = [UserBehavior]
     wait_time = between(1, 5)  # Simulate wait time between tasks (1 to 5 seconds)
@@ -0,0 +1,244 @@
+"""
+Synthetic data generator for benchmarks.
+
+Fills the database configured by SQLALCHEMY_DATABASE_URL with prompts, likes,
+comments, follows, timelines, user stats, and hourly generation and trending
+buckets. Volumes are configurable and popularity is skewed the way real social
+data is: a few creators post most prompts and have most followers, and a few
+prompts get most likes (Zipf-distributed).
+
+    SQLALCHEMY_DATABASE_URL=sqlite:///bench.db python -m tests.seed --create-tables
+    python -m tests.seed --users 5000 --prompts 50000 --likes 500000 --seed 7
+
+Runs are reproducible for a given --seed.
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from app.core.database import Base, engine, get_session_with_ctx_manager
+from app.core.enums.tags import PromptTagEnum, PromptTypeEnum
+from app.leaderboard.models import GenerationBucket, UserStats
+from app.prompts.models import SHUFFLE_KEY_RANGE, Prompt, PromptActivityBucket
+from app.prompts.services import refresh_trending_scores
+from app.socialfeed.models import Follow, PostComment, PostLike, TimelineEntry
+
+BATCH_SIZE = 5000
+SEED_TABLES = (TimelineEntry, PostLike, PostComment, Follow, GenerationBucket, UserStats, PromptActivityBucket, Prompt)
+
+
+def account(i: int) -> str:
+    """Deterministic wallet-style address for synthetic user `i`."""
+    return "0x" + f"{i:064x}"
+
+
+def zipf_weights(n: int, exponent: float) -> list:
+    """Cumulative weights so rank 1 is picked most often, rank n least."""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def unique_pairs(rng: random.Random, count: int, pick_left, pick_right, allow=lambda left, right: True) -> set:
+    """Draw up to `count` distinct (left, right) pairs; gives up once duplicates dominate."""
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        attempts += 1
+        left, right = pick_left(), pick_right()
+        if allow(left, right):
+            pairs.add((left, right))
+    return pairs
+
+
+def bulk_insert(db, model, rows: list):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.execute(insert(model), rows[i:i + BATCH_SIZE])
+    db.commit()
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    users = [account(i) for i in range(args.users)]
+    tags = list(PromptTagEnum)
+
+    # Creators ordered by popularity: low indexes post more and are followed more
+    creator_weights = zipf_weights(args.users, args.skew)
+
+    def pick_creator():
+        return rng.choices(users, cum_weights=creator_weights)[0]
+
+    with get_session_with_ctx_manager() as db:
+        if args.reset:
+            for model in SEED_TABLES:
+                db.execute(delete(model))
+            db.commit()
+
+        first_id = (db.execute(select(func.max(Prompt.id))).scalar() or 0) + 1
+        prompts = []
+        for i in range(args.prompts):
+            premium = rng.random() < args.premium_share
+            prompts.append({
+                "id": first_id + i,
+                "ipfs_image_url": f"ipfs://bench/{first_id + i}",
+                "prompt": f"{rng.choice(['castle', 'forest', 'city', 'ocean', 'robot'])} at {rng.choice(['dawn', 'dusk', 'night'])} #{i}",
+                "account_address": pick_creator(),
+                "post_name": f"Bench prompt {first_id + i}",
+                "public": not premium,
+                "prompt_tag": rng.choice(tags),
+                "prompt_type": PromptTypeEnum.PREMIUM if premium else PromptTypeEnum.PUBLIC,
+                "cid": f"cid-{i}" if premium else None,
+                "collection_name": f"collection-{i % 50}" if premium else None,
+                "max_supply": rng.randint(1, 100) if premium else None,
+                "prompt_nft_price": round(rng.uniform(0.1, 10), 2) if premium else None,
+                "created_at": now - timedelta(seconds=rng.randrange(args.days * 86400)),
+                "likes_count": 0,
+                "comments_count": 0,
+                "shuffle_key": rng.randrange(SHUFFLE_KEY_RANGE),
+            })
+
+        # A few prompts collect most of the likes and comments
+        prompt_order = list(range(len(prompts)))
+        rng.shuffle(prompt_order)
+        prompt_weights = zipf_weights(len(prompts), args.skew)
+
+        def pick_prompt():
+            return rng.choices(prompt_order, cum_weights=prompt_weights)[0]
+
+        likes = unique_pairs(rng, args.likes, pick_prompt, lambda: rng.choice(users))
+        like_rows = []
+        for index, user_account in likes:
+            prompt = prompts[index]
+            prompt["likes_count"] += 1
+            like_rows.append({
+                "prompt_id": prompt["id"],
+                "prompt_type": prompt["prompt_type"],
+                "user_account": user_account,
+                "created_at": prompt["created_at"] + timedelta(seconds=rng.randrange(86400)),
+            })
+
+        comment_rows = []
+        for _ in range(args.comments):
+            prompt = prompts[pick_prompt()]
+            prompt["comments_count"] += 1
+            comment_rows.append({
+                "prompt_id": prompt["id"],
+                "prompt_type": prompt["prompt_type"],
+                "user_account": rng.choice(users),
+                "comment": rng.choice(["nice", "love this", "how did you make this?", "wow", "great colors"]),
+                "created_at": prompt["created_at"] + timedelta(seconds=rng.randrange(86400)),
+            })
+
+        follows = unique_pairs(
+            rng, args.follows, lambda: rng.choice(users), pick_creator, allow=lambda follower, creator: follower != creator
+        )
+        follow_rows = [{"follower_account": follower, "creator_account": creator} for follower, creator in follows]
+
+        generations = {}
+        for prompt in prompts:
+            generations.setdefault(prompt["account_address"], []).append(prompt["created_at"])
+        stats_rows, bucket_rows = [], []
+        for user_account, created in generations.items():
+            last_generation = max(created)
+            stats_rows.append({
+                "user_account": user_account,
+                "xp": 2 * len(created),
+                "total_generations": len(created),
+                "streak_days": rng.randint(1, 30) if now - last_generation < timedelta(days=2) else 0,
+                "last_generation": last_generation,
+            })
+            hourly = {}
+            for created_at in created:
+                if now - created_at < timedelta(hours=args.bucket_hours):
+                    hour = created_at.replace(minute=0, second=0, microsecond=0)
+                    hourly[hour] = hourly.get(hour, 0) + 1
+            bucket_rows += [
+                {"user_account": user_account, "bucket_start": hour, "generations": count}
+                for hour, count in hourly.items()
+            ]
+
+        # Hourly trending buckets for the recent likes and comments
+        activity = {}
+        for rows, field in ((like_rows, "likes"), (comment_rows, "comments")):
+            for row in rows:
+                if now - row["created_at"] < timedelta(hours=args.bucket_hours):
+                    hour = row["created_at"].replace(minute=0, second=0, microsecond=0)
+                    bucket = activity.setdefault((row["prompt_id"], hour), {"likes": 0, "comments": 0})
+                    bucket[field] += 1
+        activity_rows = [
+            {"prompt_id": prompt_id, "bucket_start": hour, **counts} for (prompt_id, hour), counts in activity.items()
+        ]
+
+        started = time.perf_counter()
+        bulk_insert(db, Prompt, prompts)
+        bulk_insert(db, PostLike, like_rows)
+        bulk_insert(db, PostComment, comment_rows)
+        bulk_insert(db, Follow, follow_rows)
+        bulk_insert(db, UserStats, stats_rows)
+        bulk_insert(db, GenerationBucket, bucket_rows)
+        bulk_insert(db, PromptActivityBucket, activity_rows)
+        trending_count = refresh_trending_scores(db)
+        timeline_count = build_timelines(db, args.timeline_entries)
+
+        print(
+            f"Seeded {len(prompts)} prompts, {len(like_rows)} likes, {len(comment_rows)} comments, "
+            f"{len(follow_rows)} follows, {timeline_count} timeline entries, {len(stats_rows)} user stats, "
+            f"{len(bucket_rows)} generation buckets, {trending_count} trending prompts in {time.perf_counter() - started:.1f}s"
+        )
+
+
+def build_timelines(db, max_entries: int) -> int:
+    """Materialize following timelines from the seeded follows, newest `max_entries` per user."""
+    ranked = (
+        select(
+            Follow.follower_account.label("user_account"),
+            Prompt.account_address.label("creator_account"),
+            Prompt.id.label("prompt_id"),
+            Prompt.created_at.label("created_at"),
+            func.row_number().over(
+                partition_by=Follow.follower_account,
+                order_by=(Prompt.created_at.desc(), Prompt.id.desc()),
+            ).label("position"),
+        )
+        .join(Prompt, Prompt.account_address == Follow.creator_account)
+        .subquery()
+    )
+    db.execute(delete(TimelineEntry))
+    result = db.execute(
+        insert(TimelineEntry).from_select(
+            ["user_account", "creator_account", "prompt_id", "created_at"],
+            select(ranked.c.user_account, ranked.c.creator_account, ranked.c.prompt_id, ranked.c.created_at)
+            .filter(ranked.c.position <= max_entries),
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic benchmark data.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--prompts", type=int, default=5000)
+    parser.add_argument("--likes", type=int, default=50000)
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--follows", type=int, default=20000)
+    parser.add_argument("--premium-share", type=float, default=0.3, help="Fraction of prompts that are premium")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for creator and prompt popularity")
+    parser.add_argument("--days", type=int, default=90, help="Spread prompt creation over this many days")
+    parser.add_argument("--bucket-hours", type=int, default=48, help="Write hourly generation and trending buckets this far back")
+    parser.add_argument("--timeline-entries", type=int, default=1000, help="Entries kept per timeline")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, for reproducible data")
+    parser.add_argument("--create-tables", action="store_true", help="Create missing tables (SQLite; use alembic for Postgres)")
+    parser.add_argument("--reset", action="store_true", help="Delete existing rows from the seeded tables first")
+    args = parser.parse_args()
+
+    if args.create_tables:
+        Base.metadata.create_all(engine)
+    seed(args)
+
+
+if __name__ == "__main__":
+    main()
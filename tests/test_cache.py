@@ -0,0 +1,93 @@
+import asyncio
+
+from app.core.cache import ResponseCache
+
+
+class SlowComputation:
+    """A compute function that blocks until released and counts its calls."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.value
+
+
+def tagged(*tags):
+    return lambda value: list(tags)
+
+
+def test_concurrent_misses_share_one_computation():
+    async def scenario():
+        cache = ResponseCache(100)
+        compute = SlowComputation({"page": 1})
+        callers = [
+            asyncio.create_task(cache.get_or_compute("key", compute, tagged("prompts"), 60)) for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        compute.release.set()
+        results = await asyncio.gather(*callers)
+
+        assert compute.calls == 1
+        assert results == [({"page": 1}, False)] * 5
+        assert await cache.get_or_compute("key", compute, tagged("prompts"), 60) == ({"page": 1}, True)
+        assert compute.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_during_a_computation_is_not_stored():
+    async def scenario():
+        cache = ResponseCache(100)
+        compute = SlowComputation({"page": 1})
+        caller = asyncio.create_task(cache.get_or_compute("key", compute, tagged("prompts"), 60))
+        await asyncio.sleep(0.01)
+        # A write lands while the page is being built from the rows before it
+        await cache.invalidate("prompts")
+        compute.release.set()
+
+        # The caller still gets its result, but the next one recomputes
+        assert await caller == ({"page": 1}, False)
+        assert await cache.get("key") is None
+
+    asyncio.run(scenario())
+
+
+def test_invalidating_another_tag_during_a_computation_still_stores_it():
+    async def scenario():
+        cache = ResponseCache(100)
+        compute = SlowComputation({"page": 1})
+        caller = asyncio.create_task(cache.get_or_compute("key", compute, tagged("prompts"), 60))
+        await asyncio.sleep(0.01)
+        await cache.invalidate("leaderboards")
+        compute.release.set()
+
+        await caller
+        assert (await cache.get("key"))["value"] == {"page": 1}
+
+    asyncio.run(scenario())
+
+
+def test_stale_entries_are_served_while_one_refresh_runs():
+    async def scenario():
+        cache = ResponseCache(100)
+        # Fresh for no time at all, then kept for RESPONSE_CACHE_STALE_SECONDS
+        await cache.set("key", {"page": "old"}, ["prompts"], ttl=0)
+        compute = SlowComputation({"page": "new"})
+
+        results = [await cache.get_or_compute("key", compute, tagged("prompts"), 60) for _ in range(5)]
+        assert results == [({"page": "old"}, True)] * 5
+
+        await asyncio.sleep(0.01)
+        assert compute.calls == 1
+        compute.release.set()
+        await asyncio.sleep(0.01)
+
+        assert await cache.get_or_compute("key", compute, tagged("prompts"), 60) == ({"page": "new"}, True)
+        assert compute.calls == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,123 @@
+import pytest
+
+from app.core.database import SessionLocal
+from app.prompts import search
+from app.prompts.models import Prompt, PromptTagEnum, PromptTypeEnum
+
+
+@pytest.fixture(autouse=True)
+def search_index(monkeypatch):
+    """A fresh in-memory index per test, as SQLite searches use it instead of the GIN indexes."""
+    index = search.SearchIndex()
+    monkeypatch.setattr(search, "search_index", index)
+    return index
+
+
+def add_public_prompt(client, post_name, prompt, prompt_tag="Anime"):
+    response = client.post("/prompts/add-public-prompts/", json={
+        "ipfs_image_url": "ipfs://image",
+        "prompt": prompt,
+        "account_address": "0xcreator",
+        "post_name": post_name,
+        "public": True,
+        "prompt_tag": prompt_tag,
+    })
+    assert response.status_code == 200, response.text
+
+
+def add_premium_prompt(client, post_name, prompt, prompt_tag="Fantasy", collection_name="Collection"):
+    response = client.post("/marketplace/add-premium-prompts/", json={
+        "ipfs_image_url": "ipfs://image",
+        "prompt": prompt,
+        "account_address": "0xseller",
+        "post_name": post_name,
+        "collection_name": collection_name,
+        "cid": "cid",
+        "prompt_tag": prompt_tag,
+        "max_supply": 5,
+        "prompt_nft_price": 1.0,
+        "ai_model": "model",
+        "chain": "chain",
+    })
+    assert response.status_code == 200, response.text
+
+
+def search_names(client, **params) -> list:
+    response = client.get("/prompts/search/", params=params)
+    assert response.status_code == 200, response.text
+    return [result["post_name"] for result in response.json()["results"]]
+
+
+def test_every_word_must_match_and_names_rank_first(client):
+    add_public_prompt(client, "Sunset Dragon", "a red dragon over the sea")
+    add_public_prompt(client, "Forest Spirit", "glowing dragon eyes in a dark forest")
+    add_public_prompt(client, "Red Fox", "a fox in the snow")
+
+    body = client.get("/prompts/search/", params={"q": "dragon"}).json()
+    assert [result["post_name"] for result in body["results"]] == ["Sunset Dragon", "Forest Spirit"]
+    assert body["total"] == 2
+    assert search_names(client, q="red dragon") == ["Sunset Dragon"]
+    assert search_names(client, q="glowing dragon eyes") == ["Forest Spirit"]
+
+
+def test_misspelled_names_match_fuzzily(client):
+    add_public_prompt(client, "Mountain Lake", "calm water, snowy peaks")
+    add_public_prompt(client, "Desert Road", "dunes at noon")
+    add_premium_prompt(client, "Harbor", "boats at dawn", collection_name="Seaside Landscapes")
+
+    assert search_names(client, q="mountin lak") == ["Mountain Lake"]
+    assert search_names(client, q="seaside landscape") == ["Harbor"]
+
+
+def test_catches_up_on_prompts_added_by_other_workers(client, search_index):
+    add_public_prompt(client, "Sunset Dragon", "a red dragon over the sea")
+    # Committed without going through this worker's add route, so not indexed yet
+    with SessionLocal() as db:
+        db.add(Prompt(
+            ipfs_image_url="ipfs://image", prompt="a neon dragon at night", account_address="0xother",
+            post_name="Cyberpunk Alley", public=True, prompt_tag=PromptTagEnum.SCIFI, prompt_type=PromptTypeEnum.PUBLIC,
+        ))
+        db.commit()
+
+    assert sorted(search_names(client, q="dragon")) == ["Cyberpunk Alley", "Sunset Dragon"]
+    assert search_names(client, q="neon") == ["Cyberpunk Alley"]
+    assert search_index._loaded_through == 2
+
+
+def test_filters_by_type_and_tag(client):
+    add_public_prompt(client, "Sunset Dragon", "a red dragon over the sea", prompt_tag="Anime")
+    add_public_prompt(client, "Forest Dragon", "a green dragon among trees", prompt_tag="Fantasy")
+    add_premium_prompt(client, "Dragon Hoard", "gold under a dragon", prompt_tag="Fantasy")
+
+    assert search_names(client, q="dragon", prompt_type="premium") == ["Dragon Hoard"]
+    assert sorted(search_names(client, q="dragon", prompt_type="public")) == ["Forest Dragon", "Sunset Dragon"]
+    assert search_names(client, q="dragon", prompt_tag="Anime") == ["Sunset Dragon"]
+    assert search_names(client, q="dragon", prompt_type="public", prompt_tag="Fantasy") == ["Forest Dragon"]
+    body = client.get("/prompts/search/", params={"q": "dragon", "prompt_tag": "Fantasy"}).json()
+    assert body["total"] == 2
+
+
+def test_cursor_pages_through_every_match_once(client):
+    for i in range(5):
+        add_public_prompt(client, f"Dragon {i}", "a dragon")
+
+    first = client.get("/prompts/search/", params={"q": "dragon", "page_size": 2}).json()
+    assert first["total"] == 5
+    names = [result["post_name"] for result in first["results"]]
+    cursor = first["next_cursor"]
+    pages = 1
+    while cursor:
+        body = client.get("/prompts/search/", params={"q": "dragon", "page_size": 2, "cursor": cursor}).json()
+        # Only the first page counts, unless include_total asks for it
+        assert body["total"] is None
+        names += [result["post_name"] for result in body["results"]]
+        cursor = body["next_cursor"]
+        pages += 1
+
+    assert pages == 3
+    assert sorted(names) == [f"Dragon {i}" for i in range(5)]
+
+
+def test_rejects_bad_cursors_and_empty_queries(client):
+    assert client.get("/prompts/search/", params={"q": "dragon", "cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/prompts/search/", params={"q": ""}).status_code == 422